@@ -4,8 +4,9 @@ Supports two roles: student and teacher
 """
 from enum import Enum
 from typing import Optional
-from fastapi import HTTPException, Header, Depends
+from fastapi import HTTPException, Header, Depends, Request
 from .db import SessionLocal, User
+from .timings import mark_auth_done
 
 class UserRole(str, Enum):
     """User role"""
@@ -41,7 +42,8 @@ def require_role(allowed_roles: list[UserRole]):
     Permission check decorator
     Only allows users with specified roles to access
     """
-    def role_checker(current_user: Optional[dict] = Depends(get_current_user)):
+    def role_checker(request: Request, current_user: Optional[dict] = Depends(get_current_user)):
+        mark_auth_done(request)
         if not current_user:
             raise HTTPException(status_code=401, detail="Login required")
         
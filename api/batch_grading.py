@@ -0,0 +1,328 @@
+"""
+Offline batch grading
+Streams (question_id, student_id, answer) rows from JSONL or CSV, resolves each
+question's rubric once via get_rubric, scores with bounded concurrency and appends
+one JSON line per row to the output file. The output doubles as the checkpoint:
+rerunning with resume skips every input line already recorded there.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from sqlalchemy import insert, select
+
+from .bulk_import import iter_records
+from .db import SessionLocal, AnswerEvaluation, Question, User
+from .prompt_cache import rubric_fingerprint
+from .rubric_service import get_rubric
+from .scoring import score_answer
+
+logger = logging.getLogger(__name__)
+
+ANSWER_FIELDS = ("answer", "student_answer")
+
+
+class BatchInputError(ValueError):
+    """Input row is malformed or missing a required field"""
+
+
+@dataclass
+class BatchOptions:
+    concurrency: int = 8
+    timeout: Optional[float] = None
+    write_db: bool = False
+    db_batch_size: int = 200
+    resume: bool = False
+    retry_errors: bool = False
+    limit: Optional[int] = None
+    progress_interval: float = 0.5
+
+
+@dataclass
+class BatchStats:
+    total: Optional[int] = None
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    persisted: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def progress_line(self) -> str:
+        remaining = (self.total - self.skipped - self.processed) if self.total is not None else None
+        rate = self.rate()
+        eta = f"{remaining / rate:,.0f}s" if remaining is not None and rate > 0 else "?"
+        total = f"/{self.total - self.skipped:,}" if self.total is not None else ""
+        return (f"graded {self.processed:,}{total}  ok {self.succeeded:,}  errors {self.failed:,}  "
+                f"{rate:,.1f} answers/s  eta {eta}")
+
+
+def detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Yield (line_number, row, parse_error); line numbers are 1-based data rows and identify rows across runs
+    A malformed row has row None and is recorded as an error instead of stopping the run
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from iter_records(f, fmt)
+
+
+def count_rows(path: str, fmt: Optional[str] = None) -> int:
+    fmt = fmt or detect_format(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            return sum(1 for _ in csv.DictReader(f))
+        return sum(1 for line in f if line.strip())
+
+
+def completed_lines(output_path: str, include_errors: bool = True) -> Set[int]:
+    """Input line numbers already recorded in the output; a torn last line is ignored"""
+    done: Set[int] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if include_errors or record.get("status") == "ok":
+                done.add(record["line"])
+    return done
+
+
+def parse_row(row: Dict[str, Any]) -> Tuple[str, Optional[str], str]:
+    """(question_id, student_id, answer) from an input row; BatchInputError when a required field is missing"""
+    question_id = (row.get("question_id") or "").strip()
+    answer = next((row[name] for name in ANSWER_FIELDS if row.get(name)), None)
+    if not question_id or not answer:
+        raise BatchInputError("question_id and answer are required")
+    return question_id, (row.get("student_id") or None), answer
+
+
+def load_question_and_rubric(question_id: str, timeout: Optional[float]):
+    """(question text, rubric, rubric version, rubric fingerprint) for a question; None when it does not exist"""
+    sess = SessionLocal()
+    try:
+        question = sess.query(Question).filter(Question.question_id == question_id).first()
+        if question is None:
+            return None
+        text, topic = question.text, question.topic
+    finally:
+        sess.close()
+    rubric, version = get_rubric(question_id, topic, question_text=text, timeout=timeout)
+    return text, rubric, version, rubric_fingerprint(rubric)
+
+
+def student_exists(student_id: str) -> bool:
+    """Whether a user with this id exists"""
+    sess = SessionLocal()
+    try:
+        return sess.execute(select(User.id).where(User.id == student_id)).first() is not None
+    finally:
+        sess.close()
+
+
+def insert_evaluations(rows: List[Dict[str, Any]]):
+    """Bulk-insert evaluation rows in one transaction"""
+    sess = SessionLocal()
+    try:
+        sess.execute(insert(AnswerEvaluation), rows)
+        sess.commit()
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+
+
+class BatchGrader:
+    """
+    One grading run; LLM scoring runs on a thread pool of `concurrency` workers while
+    database access (question/rubric/student lookups, inserts) is serialized and cached
+    """
+
+    def __init__(self, output: TextIO, options: BatchOptions, stats: Optional[BatchStats] = None,
+                 progress_stream: Optional[TextIO] = None):
+        self.output = output
+        self.options = options
+        self.stats = stats or BatchStats()
+        self.progress_stream = progress_stream
+        self._questions: Dict[str, Any] = {}
+        self._students: Dict[str, bool] = {}
+        self._db_lock = asyncio.Lock()
+        self._pending_rows: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        self._executor = ThreadPoolExecutor(max_workers=options.concurrency, thread_name_prefix="batch-grade")
+
+    async def _in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _question(self, question_id: str):
+        if question_id not in self._questions:
+            async with self._db_lock:
+                if question_id not in self._questions:
+                    self._questions[question_id] = await self._in_thread(
+                        load_question_and_rubric, question_id, self.options.timeout)
+        return self._questions[question_id]
+
+    async def _check_student(self, student_id: Optional[str]):
+        if student_id is None or not self.options.write_db:
+            return
+        if student_id not in self._students:
+            async with self._db_lock:
+                if student_id not in self._students:
+                    self._students[student_id] = await self._in_thread(student_exists, student_id)
+        if not self._students[student_id]:
+            raise BatchInputError(f"student_id {student_id} not found")
+
+    def _write(self, record: Dict[str, Any]):
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def _flush_db(self):
+        async with self._db_lock:
+            if not self._pending_rows:
+                return
+            pending, self._pending_rows = self._pending_rows, []
+            # Output lines are written only after their rows are committed, so a resumed run never inserts twice
+            await self._in_thread(insert_evaluations, [row for row, _ in pending])
+            self.stats.persisted += len(pending)
+            for _, record in pending:
+                self._write(record)
+
+    async def grade_row(self, line_no: int, row: Optional[Dict[str, Any]], parse_error: Optional[str] = None):
+        row = row or {}
+        record: Dict[str, Any] = {"line": line_no, "question_id": row.get("question_id"), "student_id": row.get("student_id")}
+        try:
+            if parse_error:
+                raise BatchInputError(parse_error)
+            question_id, student_id, answer = parse_row(row)
+            await self._check_student(student_id)
+            question = await self._question(question_id)
+            if question is None:
+                raise BatchInputError(f"question_id {question_id} not found")
+            text, rubric, rubric_version, fingerprint = question
+            scored = await self._in_thread(
+                lambda: score_answer(question_id, text, rubric, rubric_version, answer, timeout=self.options.timeout,
+                                     prompt_cache_key=(question_id, rubric_version, fingerprint)))
+        except Exception as exc:
+            self.stats.failed += 1
+            record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+            self._write(record)
+            return
+
+        self.stats.succeeded += 1
+        result = scored.result
+        record.update(
+            status="ok",
+            total_score=result.total_score,
+            dimension_breakdown=result.dimension_breakdown,
+            key_points_evaluation=result.key_points_evaluation,
+            improvement_recommendations=result.improvement_recommendations,
+            rubric_version=result.rubric_version,
+            model_version=result.model_version,
+            model_tier=result.model_tier,
+        )
+        if scored.llm_stats is not None:
+            record.update(latency_ms=round(scored.llm_stats.latency_ms, 1),
+                          prompt_tokens=scored.llm_stats.prompt_tokens,
+                          completion_tokens=scored.llm_stats.completion_tokens)
+        if not self.options.write_db:
+            self._write(record)
+            return
+        record["persisted"] = True
+        self._pending_rows.append((scored.evaluation_row(student_id, answer), record))
+        if len(self._pending_rows) >= self.options.db_batch_size:
+            await self._flush_db()
+
+    async def _report_progress(self):
+        interactive = self.progress_stream is not None and self.progress_stream.isatty()
+        interval = self.options.progress_interval if interactive else max(self.options.progress_interval, 10.0)
+        while True:
+            await asyncio.sleep(interval)
+            self._print_progress(interactive)
+
+    def _print_progress(self, interactive: bool, final: bool = False):
+        if self.progress_stream is None:
+            return
+        line = self.stats.progress_line()
+        if interactive:
+            self.progress_stream.write("\r" + line + ("\n" if final else ""))
+        else:
+            self.progress_stream.write(line + "\n")
+        self.progress_stream.flush()
+
+    async def run(self, rows, skip: Set[int]):
+        semaphore = asyncio.Semaphore(self.options.concurrency)
+        pending: Set[asyncio.Task] = set()
+        reporter = asyncio.create_task(self._report_progress())
+        try:
+            started = 0
+            for line_no, row, parse_error in rows:
+                if line_no in skip:
+                    self.stats.skipped += 1
+                    continue
+                if self.options.limit is not None and started >= self.options.limit:
+                    break
+                started += 1
+                # Read ahead only as far as there are free workers
+                await semaphore.acquire()
+                task = asyncio.create_task(self.grade_row(line_no, row, parse_error))
+                task.add_done_callback(lambda _: semaphore.release())
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+            if self.options.write_db:
+                await self._flush_db()
+        finally:
+            reporter.cancel()
+            self._executor.shutdown(wait=False)
+            self._print_progress(self.progress_stream is not None and self.progress_stream.isatty(), final=True)
+        return self.stats
+
+
+def grade_file(input_path: str, output_path: str, options: BatchOptions, fmt: Optional[str] = None,
+               progress_stream: Optional[TextIO] = sys.stderr) -> BatchStats:
+    """Grade every input row not yet in the output file"""
+    if os.path.exists(output_path) and not options.resume:
+        raise FileExistsError(f"{output_path} exists; resume it or choose another output file")
+    skip = completed_lines(output_path, include_errors=not options.retry_errors) if options.resume else set()
+    if skip and options.retry_errors:
+        # Failed rows are regraded; drop their old lines so each input line appears once
+        _drop_error_lines(output_path)
+    stats = BatchStats(total=count_rows(input_path, fmt))
+    with open(output_path, "a", encoding="utf-8") as output:
+        grader = BatchGrader(output, options, stats, progress_stream)
+        asyncio.run(grader.run(read_rows(input_path, fmt), skip))
+    return stats
+
+
+def _drop_error_lines(output_path: str):
+    tmp_path = output_path + ".tmp"
+    with open(output_path, encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            try:
+                if json.loads(line).get("status") == "ok":
+                    dst.write(line)
+            except json.JSONDecodeError:
+                continue
+    os.replace(tmp_path, output_path)
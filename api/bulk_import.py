@@ -0,0 +1,343 @@
+"""
+Streaming bulk import (upsert) of questions, rubrics and users
+Input is JSONL or CSV, parsed and validated row by row as it arrives. Valid rows
+are collected into batches; each batch costs one lookup of the existing unique
+keys plus one multi-row INSERT and one bulk UPDATE, committed as one transaction.
+When a batch fails in the database it is retried one row per transaction so the
+failing rows can be reported individually. Rows are applied in input order: a key
+seen twice in a batch starts a new batch.
+"""
+import codecs
+import csv
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+import anyio
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from .db import SessionLocal, Question, QuestionRubric, User
+from .models import QuestionImportRow, RubricImportRow, UserImportRow
+from .prompt_cache import prompt_prefix_cache
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("jsonl", "csv")
+ON_CONFLICT = ("update", "skip", "error")
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    errors_truncated: bool = False
+    # None keeps every error
+    max_errors: Optional[int] = MAX_REPORTED_ERRORS
+
+    def add_error(self, line: int, key: Optional[str], error: str):
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "key": key, "error": error})
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"total": self.total, "created": self.created, "updated": self.updated, "skipped": self.skipped,
+                "failed": self.failed, "errors": self.errors, "errors_truncated": self.errors_truncated}
+
+
+def format_from_content_type(content_type: Optional[str]) -> str:
+    return "csv" if content_type and "csv" in content_type.lower() else "jsonl"
+
+
+def iter_text_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """UTF-8 lines (newline kept) from arbitrary byte chunks; a BOM is dropped, invalid UTF-8 raises ValueError"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    (line, record, parse_error) per input row
+    Lines are JSONL line numbers or CSV data row numbers (header excluded); empty CSV cells count as missing
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for line_no, row in enumerate(reader, start=1):
+            if None in row:
+                yield line_no, None, f"Row has more fields than the header ({len(reader.fieldnames)})"
+                continue
+            yield line_no, {name: value for name, value in row.items() if value != ""}, None
+        return
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_no, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Each line must be a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def sync_body_chunks(request) -> Iterator[bytes]:
+    """Request body chunks for code running in a worker thread (run_in_threadpool), read as they arrive"""
+    stream = request.stream().__aiter__()
+
+    async def next_chunk():
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while True:
+        chunk = anyio.from_thread.run(next_chunk)
+        if chunk is None:
+            return
+        if chunk:
+            yield chunk
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors())
+
+
+class BulkImporter:
+    """Batched upsert of one entity keyed by its unique key; subclasses describe the entity"""
+
+    row_model = BaseModel
+    table = None
+    key_fields: Tuple[str, ...] = ()
+
+    def __init__(self, on_conflict: str = "update", batch_size: int = DEFAULT_BATCH_SIZE,
+                 created_by: Optional[str] = None, max_errors: Optional[int] = MAX_REPORTED_ERRORS):
+        if on_conflict not in ON_CONFLICT:
+            raise ValueError(f"on_conflict must be one of {', '.join(ON_CONFLICT)}")
+        self.on_conflict = on_conflict
+        self.batch_size = max(1, batch_size)
+        self.created_by = created_by
+        self.report = ImportReport(max_errors=max_errors)
+
+    # ----- entity hooks -----
+
+    def key_of(self, item) -> Hashable:
+        return tuple(getattr(item, name) for name in self.key_fields)
+
+    def key_label(self, key) -> str:
+        return "/".join(str(part) for part in key)
+
+    def batch_keys(self, item) -> Set[Hashable]:
+        """Keys that may appear only once per batch"""
+        return {self.key_of(item)}
+
+    def existing_ids(self, sess, keys: List[Hashable]) -> Dict[Hashable, int]:
+        """key -> primary key of rows that already exist"""
+        columns = [getattr(self.table, name) for name in self.key_fields]
+        if len(columns) == 1:
+            condition = columns[0].in_([key[0] for key in keys])
+        else:
+            condition = tuple_(*columns).in_(keys)
+        rows = sess.execute(select(self.table.id, *columns).where(condition)).all()
+        return {tuple(row[1:]): row[0] for row in rows}
+
+    def check(self, sess, batch) -> Dict[int, str]:
+        """line -> error for rows that are valid on their own but cannot be written"""
+        return {}
+
+    def insert_values(self, item) -> Dict[str, Any]:
+        return item.model_dump()
+
+    def update_values(self, item, pk: int) -> Dict[str, Any]:
+        return {**item.model_dump(exclude_unset=True), "id": pk}
+
+    def before_write(self, sess, items: List[Any]):
+        """Runs in the batch transaction before the rows to insert or update are written"""
+
+    def after_commit(self, items: List[Any]):
+        """Runs once the batch's written rows are committed"""
+
+    # ----- pipeline -----
+
+    def _key_from_record(self, record: Dict[str, Any]) -> Optional[str]:
+        parts = [record.get(name) for name in self.key_fields]
+        return "/".join(str(p) for p in parts) if all(p is not None for p in parts) else None
+
+    def run(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> ImportReport:
+        batch: List[Tuple[int, Hashable, Any]] = []
+        seen: Set[Hashable] = set()
+        for line_no, record, parse_error in records:
+            self.report.total += 1
+            if parse_error:
+                self.report.add_error(line_no, None, parse_error)
+                continue
+            try:
+                item = self.row_model(**record)
+            except ValidationError as exc:
+                self.report.add_error(line_no, self._key_from_record(record), _validation_message(exc))
+                continue
+            keys = self.batch_keys(item)
+            if len(batch) >= self.batch_size or keys & seen:
+                self._flush(batch)
+                batch, seen = [], set()
+            batch.append((line_no, self.key_of(item), item))
+            seen |= keys
+        self._flush(batch)
+        return self.report
+
+    def run_stream(self, chunks: Iterable[bytes], fmt: str) -> ImportReport:
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}")
+        return self.run(iter_records(iter_text_lines(chunks), fmt))
+
+    def _write(self, sess, batch) -> Tuple[List[Tuple[int, Hashable, str]], List[Any]]:
+        """
+        Write one batch in the open transaction
+        Returns (line, key, outcome) per row, outcome being a status or an error, and the rows written
+        """
+        existing = self.existing_ids(sess, list({key for _, key, _ in batch}))
+        problems = self.check(sess, batch)
+        outcomes, inserts, updates, written = [], [], [], []
+        for line_no, key, item in batch:
+            if line_no in problems:
+                outcomes.append((line_no, key, problems[line_no]))
+            elif key not in existing:
+                inserts.append(self.insert_values(item))
+                written.append(item)
+                outcomes.append((line_no, key, "created"))
+            elif self.on_conflict == "skip":
+                outcomes.append((line_no, key, "skipped"))
+            elif self.on_conflict == "error":
+                outcomes.append((line_no, key, f"{self.key_label(key)} already exists"))
+            else:
+                updates.append(self.update_values(item, existing[key]))
+                written.append(item)
+                outcomes.append((line_no, key, "updated"))
+        if written:
+            self.before_write(sess, written)
+        if inserts:
+            sess.execute(insert(self.table), inserts)
+        if updates:
+            sess.execute(update(self.table), updates)
+        return outcomes, written
+
+    def _record(self, outcomes):
+        for line_no, key, outcome in outcomes:
+            if outcome in ("created", "updated", "skipped"):
+                setattr(self.report, outcome, getattr(self.report, outcome) + 1)
+            else:
+                self.report.add_error(line_no, self.key_label(key), outcome)
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        sess = SessionLocal()
+        try:
+            try:
+                outcomes, written = self._write(sess, batch)
+                sess.commit()
+                self._record(outcomes)
+                self.after_commit(written)
+                return
+            except SQLAlchemyError as exc:
+                sess.rollback()
+                logger.warning(f"Bulk import batch of {len(batch)} rows failed, retrying row by row: {exc}")
+            for entry in batch:
+                try:
+                    outcomes, written = self._write(sess, [entry])
+                    sess.commit()
+                    self._record(outcomes)
+                    self.after_commit(written)
+                except SQLAlchemyError as exc:
+                    sess.rollback()
+                    line_no, key, _ = entry
+                    self.report.add_error(line_no, self.key_label(key),
+                                          f"Database error: {getattr(exc, 'orig', None) or exc}")
+        finally:
+            sess.close()
+
+
+class QuestionImporter(BulkImporter):
+    """Questions keyed by question_id"""
+
+    row_model = QuestionImportRow
+    table = Question
+    key_fields = ("question_id",)
+
+    def after_commit(self, items):
+        for item in items:
+            prompt_prefix_cache.invalidate(item.question_id)
+
+
+class RubricImporter(BulkImporter):
+    """
+    Rubrics keyed by (question_id, version); the question must exist
+    A row with is_active=true deactivates the question's other rubrics
+    """
+
+    row_model = RubricImportRow
+    table = QuestionRubric
+    key_fields = ("question_id", "version")
+
+    def batch_keys(self, item) -> Set[Hashable]:
+        keys = {self.key_of(item)}
+        if item.is_active:
+            # One activation per question per batch, so the last active row in the input wins
+            keys.add(("active", item.question_id))
+        return keys
+
+    def check(self, sess, batch) -> Dict[int, str]:
+        question_ids = {item.question_id for _, _, item in batch}
+        found = set(sess.execute(select(Question.question_id).where(Question.question_id.in_(question_ids))).scalars())
+        return {line_no: f"Question {item.question_id} not found"
+                for line_no, _, item in batch if item.question_id not in found}
+
+    def insert_values(self, item) -> Dict[str, Any]:
+        return {**item.model_dump(), "created_by": self.created_by}
+
+    def before_write(self, sess, items):
+        activated = {item.question_id for item in items if item.is_active}
+        if activated:
+            sess.execute(update(QuestionRubric)
+                         .where(QuestionRubric.question_id.in_(activated), QuestionRubric.is_active == True)
+                         .values(is_active=False))
+
+    def after_commit(self, items):
+        for question_id in {item.question_id for item in items}:
+            prompt_prefix_cache.invalidate(question_id)
+
+
+class UserImporter(BulkImporter):
+    """Users keyed by id; role defaults to student for new users and is left unchanged when a row omits it"""
+
+    row_model = UserImportRow
+    table = User
+    key_fields = ("id",)
+
+    def check(self, sess, batch) -> Dict[int, str]:
+        # A roster must not demote the teacher running the import
+        return {line_no: "Cannot change the role of the importing user"
+                for line_no, _, item in batch
+                if item.id == self.created_by and "role" in item.model_fields_set and item.role != "teacher"}
+
+
+IMPORTERS = {"questions": QuestionImporter, "rubrics": RubricImporter, "users": UserImporter}
@@ -0,0 +1,80 @@
+"""
+Compact scoring output protocol
+The LLM answers with short keys and bounded lists to cut output tokens;
+the client expands the result back into the full LLMScorePayload shape
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+DIMENSION_KEYS = {
+    "accuracy": "a",
+    "structure": "s",
+    "clarity": "c",
+    "business": "b",
+    "language": "l",
+}
+_DIMENSION_NAMES = {short: name for name, short in DIMENSION_KEYS.items()}
+
+KEY_POINT_STATUS = {"c": "covered", "p": "partial", "m": "missing"}
+
+DEFAULT_COMPACT_MAX_TOKENS = 256
+
+
+def output_format() -> str:
+    """Configured output protocol: full (default) or compact"""
+    fmt = os.getenv("LLM_OUTPUT_FORMAT", "full").lower()
+    return fmt if fmt in ("full", "compact") else "full"
+
+
+def max_recommendations() -> int:
+    try:
+        return max(1, int(os.getenv("COMPACT_MAX_RECOMMENDATIONS", "2")))
+    except ValueError:
+        return 2
+
+
+def max_tokens_for(fmt: str) -> Optional[int]:
+    """Explicit output token cap; compact output is capped by default"""
+    value = os.getenv("LLM_MAX_TOKENS")
+    if value:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return DEFAULT_COMPACT_MAX_TOKENS if fmt == "compact" else None
+
+
+def format_section(include_key_points: bool) -> str:
+    """OUTPUT FORMAT section of the prompt for the compact protocol"""
+    dims = ",".join(f'"{short}":{name} 0-2' for name, short in DIMENSION_KEYS.items())
+    key_points = ',"k":["c|p|m" per rubric key point in order: covered/partial/missing]' if include_key_points else ""
+    limit = max_recommendations()
+    return (
+        "OUTPUT FORMAT (compact JSON, no whitespace):\n"
+        f'{{"t":total 0-10,"d":{{{dims}}}{key_points},"r":[at most {limit} tips, each under 15 words]}}\n'
+        "Only return valid JSON, no extra text.\n"
+    )
+
+
+def expand_payload(compact: Dict[str, Any], rubric: dict) -> Dict[str, Any]:
+    """Expand a compact response into the full payload keys"""
+    if not isinstance(compact, dict) or "t" not in compact or "d" not in compact:
+        raise ValueError("Compact response must contain 't' and 'd'")
+
+    breakdown = {
+        _DIMENSION_NAMES.get(key, key): value
+        for key, value in (compact.get("d") or {}).items()
+    }
+
+    key_points: List[str] = [p for p in (rubric or {}).get("key_points") or [] if isinstance(p, str)]
+    evaluations = []
+    for point, status in zip(key_points, compact.get("k") or []):
+        evaluations.append(f"{point} -> {KEY_POINT_STATUS.get(str(status).lower()[:1], status)}")
+
+    return {
+        "total_score": compact["t"],
+        "dimension_breakdown": breakdown,
+        "key_points_evaluation": evaluations,
+        "improvement_recommendations": list(compact.get("r") or [])[:max_recommendations()],
+        "compact_output": compact,
+    }
@@ -2,13 +2,32 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, Column, Integer, String, Float, JSON, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.sql import func
+from . import metrics, tracing, query_log
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DB_URL", "sqlite:///./answer_eval.db")
-engine = create_engine(DATABASE_URL, future=True)
+
+
+def _engine_options(url: str) -> dict:
+    """In-memory SQLite keeps one shared connection so every thread sees the same database"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    return {}
+
+
+engine = create_engine(DATABASE_URL, future=True, **_engine_options(DATABASE_URL))
+if metrics.metrics_enabled():
+    metrics.instrument_engine(engine)
+if tracing.tracing_enabled():
+    tracing.instrument_engine(engine)
+if query_log.slow_query_log_enabled():
+    query_log.instrument_engine(engine)
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
 Base = declarative_base()
 
@@ -59,10 +78,18 @@ class AnswerEvaluation(Base):
     final_score = Column(Float, nullable=True)
     dimension_scores_json = Column(JSON)
     model_version = Column(String(50))
+    model_tier = Column(String(20), nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    cached_tokens = Column(Integer, nullable=True)
+    llm_latency_ms = Column(Float, nullable=True)
+    llm_retries = Column(Integer, nullable=True)
     rubric_version = Column(String(50))
     raw_llm_output = Column(JSON)
     reviewer_id = Column(String(100), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     review_notes = Column(Text, nullable=True)
+    # Set on rows written by a rescoring job: the original evaluation that was rescored
+    rescored_from_id = Column(Integer, ForeignKey("answer_evaluations.id", ondelete="SET NULL"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -70,5 +97,30 @@ class AnswerEvaluation(Base):
     user = relationship("User", foreign_keys=[student_id], back_populates="evaluations")
 
 
+class RescoreJob(Base):
+    __tablename__ = "rescore_jobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    question_id = Column(String(100), ForeignKey("questions.question_id", ondelete="CASCADE"), nullable=False, index=True)
+    rubric_id = Column(Integer, ForeignKey("question_rubrics.id", ondelete="CASCADE"), nullable=False)
+    rubric_version = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    concurrency = Column(Integer, nullable=False, default=4)
+    chunk_size = Column(Integer, nullable=False, default=100)
+    max_rate = Column(Float, nullable=True)
+    # Keyset checkpoint: every evaluation with id <= last_evaluation_id has been handled
+    last_evaluation_id = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    # Process running the job ("host:pid") and when it last committed a chunk
+    owner = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_by = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
 def init_db():
     Base.metadata.create_all(engine)
@@ -0,0 +1,111 @@
+"""
+Request deadline tracking for the evaluation pipeline
+A client deadline is budgeted across the pipeline stages so that work
+is cancelled once the caller has given up waiting
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .tracing import span
+
+DEADLINE_HEADER = "X-Request-Timeout"
+DEFAULT_DEADLINE_SECONDS = 55.0
+MIN_DEADLINE_SECONDS = 1.0
+MAX_DEADLINE_SECONDS = 300.0
+# Kept below MIN_DEADLINE_SECONDS so the shortest deadline still leaves time for the LLM call
+DEFAULT_PERSIST_RESERVE_SECONDS = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request deadline passes during a pipeline stage"""
+
+    def __init__(self, stage: str, budget: float, elapsed: float):
+        self.stage = stage
+        self.budget = budget
+        self.elapsed = elapsed
+        super().__init__(
+            f"Deadline exceeded during stage '{stage}' "
+            f"(elapsed {elapsed:.2f}s of {budget:.2f}s budget)"
+        )
+
+
+class Deadline:
+    """Monotonic deadline with per-stage timing records"""
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_seconds
+        self.stage_timings: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str, reserve: float = 0.0):
+        """
+        Raise DeadlineExceeded if the deadline has already passed
+        - reserve: also raise once no more than this many seconds remain, i.e. a budget
+          handed out by timeout_for with the same reserve is used up
+        """
+        if self.expired() or (reserve > 0 and self.remaining() <= reserve):
+            raise DeadlineExceeded(stage, self.budget, self.elapsed())
+
+    def timeout_for(self, stage: str, reserve: float = 0.0, share: float = 1.0) -> float:
+        """
+        Time budget available to a downstream call made by a stage
+        - reserve: seconds kept back for the stages that follow
+        - share: fraction of the remaining time this stage may use
+        """
+        available = (self.remaining() - reserve) * share
+        if available <= 0:
+            raise DeadlineExceeded(stage, self.budget, self.elapsed())
+        return available
+
+    @contextmanager
+    def stage(self, name: str, check_after: bool = True):
+        """
+        Time a stage, refusing to start it past the deadline
+        check_after=False for stages whose side effects must not be reported as failed once done
+        """
+        self.check(name)
+        start = time.monotonic()
+        try:
+            with span(f"stage.{name}"):
+                yield self
+        finally:
+            self.stage_timings[name] = time.monotonic() - start
+        if check_after:
+            self.check(name)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def persist_reserve_seconds() -> float:
+    """Seconds kept back from downstream calls for saving the result"""
+    return _env_float("EVALUATE_PERSIST_RESERVE_SECONDS", DEFAULT_PERSIST_RESERVE_SECONDS)
+
+
+def deadline_from_header(value: Optional[str]) -> Deadline:
+    """Build a deadline from the client-supplied timeout header (seconds) or the configured default"""
+    default_budget = _env_float("EVALUATE_TIMEOUT_SECONDS", DEFAULT_DEADLINE_SECONDS)
+    budget = default_budget
+    if value:
+        try:
+            budget = float(value)
+        except ValueError:
+            budget = default_budget
+    budget = min(max(budget, MIN_DEADLINE_SECONDS), _env_float("EVALUATE_MAX_TIMEOUT_SECONDS", MAX_DEADLINE_SECONDS))
+    return Deadline(budget)
@@ -0,0 +1,224 @@
+"""
+Streaming bulk export of answer evaluations
+Rows are read in id order through a server-side cursor (yield_per) and encoded
+chunk by chunk as CSV, NDJSON or Parquet, optionally gzip-compressed on the fly,
+so memory stays constant however many rows are exported
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from .db import SessionLocal, AnswerEvaluation
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    # format -> (media type, file extension)
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+EXPORT_COLUMNS = (
+    "id", "question_id", "student_id", "student_answer", "auto_score", "final_score", "dimension_scores_json",
+    "model_version", "model_tier", "rubric_version", "prompt_tokens", "completion_tokens", "cached_tokens",
+    "llm_latency_ms", "llm_retries", "reviewer_id", "review_notes", "rescored_from_id", "created_at", "updated_at",
+)
+JSON_COLUMNS = ("dimension_scores_json", "raw_llm_output")
+FETCH_SIZE = 1000
+# Encoded bytes buffered before a chunk is sent
+FLUSH_BYTES = 64 * 1024
+
+
+class ExportUnavailableError(RuntimeError):
+    """The requested export format needs an optional dependency that is not installed"""
+
+
+@dataclass
+class ExportFilters:
+    question_id: Optional[str] = None
+    student_id: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    # True: reviewed by a teacher, False: not yet reviewed
+    reviewed: Optional[bool] = None
+
+
+def export_columns(include_raw: bool = False) -> List[str]:
+    return list(EXPORT_COLUMNS) + (["raw_llm_output"] if include_raw else [])
+
+
+def export_statement(filters: ExportFilters, include_raw: bool = False):
+    ae = AnswerEvaluation
+    stmt = select(*(getattr(ae, name) for name in export_columns(include_raw)))
+    if filters.question_id:
+        stmt = stmt.where(ae.question_id == filters.question_id)
+    if filters.student_id:
+        stmt = stmt.where(ae.student_id == filters.student_id)
+    if filters.created_from:
+        stmt = stmt.where(ae.created_at >= filters.created_from)
+    if filters.created_to:
+        stmt = stmt.where(ae.created_at < filters.created_to)
+    if filters.reviewed is not None:
+        stmt = stmt.where(ae.reviewer_id.isnot(None) if filters.reviewed else ae.reviewer_id.is_(None))
+    return stmt.order_by(ae.id)
+
+
+def check_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportUnavailableError("Parquet export requires pyarrow (pip install pyarrow)") from None
+
+
+def export_filename(fmt: str, compress: bool) -> str:
+    name = f"evaluations-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{EXPORT_FORMATS[fmt][1]}"
+    # Parquet compresses its column chunks internally; the file itself is never gzipped
+    return name + ".gz" if compress and fmt != "parquet" else name
+
+
+def _rows(filters: ExportFilters, include_raw: bool, fetch_size: int) -> Iterator[Dict[str, Any]]:
+    sess = SessionLocal()
+    try:
+        result = sess.execute(export_statement(filters, include_raw).execution_options(yield_per=fetch_size))
+        for row in result:
+            yield row._mapping
+    finally:
+        sess.close()
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson_lines(rows) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps({name: _json_value(value) for name, value in row.items()}, ensure_ascii=False) + "\n"
+
+
+def _csv_lines(rows, columns: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([
+            json.dumps(value, ensure_ascii=False) if name in JSON_COLUMNS and value is not None
+            else _json_value(value) if value is not None else ""
+            for name, value in row.items()
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def _batched_text(lines: Iterator[str]) -> Iterator[bytes]:
+    parts, size = [], 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object for ParquetWriter; bytes written so far are drained after each row group"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parquet_schema(columns: List[str]):
+    import pyarrow as pa
+    types = {
+        "id": pa.int64(), "auto_score": pa.float64(), "final_score": pa.float64(), "prompt_tokens": pa.int64(),
+        "completion_tokens": pa.int64(), "cached_tokens": pa.int64(), "llm_latency_ms": pa.float64(),
+        "llm_retries": pa.int64(), "rescored_from_id": pa.int64(),
+        "created_at": pa.timestamp("us", tz="UTC"), "updated_at": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in columns])
+
+
+def _parquet_chunks(rows, columns: List[str], compress: bool, row_group_size: int) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="gzip" if compress else "snappy")
+
+    def write_group(group: Dict[str, list]):
+        writer.write_batch(pa.RecordBatch.from_pydict(group, schema=schema))
+
+    group: Dict[str, list] = {name: [] for name in columns}
+    count = 0
+    for row in rows:
+        for name, value in row.items():
+            if name in JSON_COLUMNS and value is not None:
+                value = json.dumps(value, ensure_ascii=False)
+            group[name].append(value)
+        count += 1
+        if count == row_group_size:
+            write_group(group)
+            group, count = {name: [] for name in columns}, 0
+            yield sink.drain()
+    if count:
+        write_group(group)
+    writer.close()
+    yield sink.drain()
+
+
+def _gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(filters: ExportFilters, fmt: str = "csv", compress: bool = False, include_raw: bool = False,
+                fetch_size: int = FETCH_SIZE) -> Iterator[bytes]:
+    """Encoded export as a stream of byte chunks"""
+    check_format(fmt)
+    columns = export_columns(include_raw)
+    rows = _rows(filters, include_raw, fetch_size)
+    if fmt == "parquet":
+        yield from _parquet_chunks(rows, columns, compress, row_group_size=fetch_size * 5)
+        return
+    lines = _csv_lines(rows, columns) if fmt == "csv" else _ndjson_lines(rows)
+    chunks = _batched_text(lines)
+    yield from (_gzipped(chunks) if compress else chunks)
@@ -0,0 +1,151 @@
+"""
+Local key point coverage scoring
+Rubric key points are indexed once per rubric version as TF-IDF vectors;
+answers are matched sentence by sentence with vectorized NumPy operations
+"""
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .prescreen import tokenize, content_tokens
+
+COVERED_THRESHOLD = 0.6
+PARTIAL_THRESHOLD = 0.25
+STEM_PREFIX_LENGTH = 7
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;。！？；])\s*|\n+")
+
+
+def key_point_mode() -> str:
+    """
+    How local coverage is used when scoring
+    - hints: coverage is added to the prompt as hints (default)
+    - local: the LLM does not write key_points_evaluation; it is filled from local coverage
+    - off: no local matching
+    """
+    mode = os.getenv("KEY_POINT_MODE", "hints").lower()
+    return mode if mode in ("hints", "local", "off") else "hints"
+
+
+def _stem(term: str) -> str:
+    """
+    Light suffix stripping plus prefix truncation, so 'retries'/'retry' and
+    'idempotent'/'idempotency' map to the same term
+    """
+    if len(term) <= 4 or not term.isascii():
+        return term
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            term = term[: len(term) - len(suffix)] + replacement
+            break
+    return term[:STEM_PREFIX_LENGTH]
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(t) for t in content_tokens(tokenize(text))]
+
+
+@dataclass
+class KeyPointCoverage:
+    point: str
+    score: float
+    status: str
+    evidence: Optional[str] = None
+
+    def as_evaluation(self) -> str:
+        return f"{self.point} -> {self.status}"
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"point": self.point, "score": round(self.score, 3), "status": self.status}
+
+
+class KeyPointIndex:
+    """TF-IDF vectors of a rubric's key points, built once and reused for every answer"""
+
+    def __init__(self, key_points: Tuple[str, ...]):
+        self.key_points = list(key_points)
+        point_terms = [_terms(p) for p in self.key_points]
+        self.vocab: Dict[str, int] = {}
+        for terms in point_terms:
+            for term in terms:
+                self.vocab.setdefault(term, len(self.vocab))
+
+        n_points, n_terms = len(self.key_points), len(self.vocab)
+        counts = np.zeros((n_points, n_terms), dtype=np.float32)
+        for row, terms in enumerate(point_terms):
+            for term in terms:
+                counts[row, self.vocab[term]] += 1
+
+        present = counts > 0
+        df = present.sum(axis=0)
+        self.idf = (np.log((1 + n_points) / (1 + df)) + 1.0).astype(np.float32)
+        # Per key point: idf mass of its terms, used for recall
+        self.term_weights = present * self.idf
+        self.weight_totals = self.term_weights.sum(axis=1)
+        vectors = np.where(present, 1.0 + np.log(np.maximum(counts, 1.0)), 0.0) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+    def _sentence_matrix(self, sentences: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(sentences), len(self.vocab)), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for term in _terms(sentence):
+                col = self.vocab.get(term)
+                if col is not None:
+                    matrix[row, col] += 1
+        return matrix
+
+    def match(self, answer: str) -> List[KeyPointCoverage]:
+        """Coverage of every key point by the answer"""
+        if not self.key_points:
+            return []
+        sentences = [s.strip() for s in _SENTENCE_SPLIT_RE.split(answer or "") if s and s.strip()]
+        if not sentences or not self.vocab:
+            return [KeyPointCoverage(p, 0.0, "missing") for p in self.key_points]
+
+        counts = self._sentence_matrix(sentences)
+        tfidf = np.where(counts > 0, 1.0 + np.log(np.maximum(counts, 1.0)), 0.0) * self.idf
+        norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+        tfidf = tfidf / np.where(norms == 0, 1.0, norms)
+
+        # (sentences x key points) cosine similarity; best sentence is the evidence
+        similarity = tfidf @ self.vectors.T
+        best_sentence = similarity.argmax(axis=0)
+        best_similarity = similarity.max(axis=0)
+
+        # idf-weighted share of each key point's terms found anywhere in the answer
+        answer_terms = (counts.sum(axis=0) > 0).astype(np.float32)
+        recall = (self.term_weights @ answer_terms) / np.where(self.weight_totals == 0, 1.0, self.weight_totals)
+
+        scores = np.maximum(recall, best_similarity)
+        results = []
+        for i, point in enumerate(self.key_points):
+            score = float(scores[i])
+            if score >= COVERED_THRESHOLD:
+                status = "covered"
+            elif score >= PARTIAL_THRESHOLD:
+                status = "partial"
+            else:
+                status = "missing"
+            evidence = sentences[int(best_sentence[i])] if best_similarity[i] > 0 else None
+            results.append(KeyPointCoverage(point, score, status, evidence))
+        return results
+
+
+@lru_cache(maxsize=256)
+def _cached_index(version: str, key_points: Tuple[str, ...]) -> KeyPointIndex:
+    return KeyPointIndex(key_points)
+
+
+def get_index(rubric: dict) -> KeyPointIndex:
+    """Index for a rubric, cached per (rubric version, key points)"""
+    key_points = tuple(p for p in (rubric or {}).get("key_points") or [] if isinstance(p, str))
+    return _cached_index(str((rubric or {}).get("version", "")), key_points)
+
+
+def match_key_points(rubric: dict, student_answer: str) -> List[KeyPointCoverage]:
+    return get_index(rubric).match(student_answer)
@@ -0,0 +1,406 @@
+"""
+Provider batch-API scoring for bulk, non-interactive grading
+Answers are turned into one chat-completion request per line of a batch file
+(same prompt as call_llm), submitted to the provider's asynchronous batch API,
+polled until the batch finishes and the responses are decoded, validated and
+stored as AnswerEvaluation rows. Batch results can take hours, so every step
+works from a manifest file and can run in a separate process.
+
+Backends (LLM_BATCH_BACKEND):
+- openai: OpenAI Batch API (files + batches endpoints)
+- local: file-based stand-in that runs the batch file through the configured
+  client (LLM_PROVIDER=stub, cassette replay) when polled; default for LLM_PROVIDER=stub
+
+The cascade is not used in batch mode: every request goes to the configured MODEL_ID.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from .batch_grading import BatchInputError, insert_evaluations, load_question_and_rubric, parse_row, read_rows, student_exists
+from .compact_output import max_tokens_for, output_format
+from .keypoint_matcher import key_point_mode
+from .llm_client import (
+    LLMCallStats, configured_model, detect_provider, get_env, invoke_llm, make_llm, prepare_prompt,
+    usage_from_response,
+)
+from .scoring import model_metadata, prescreen_score, scored_payload
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchNotReadyError(RuntimeError):
+    """The provider batch has not finished yet"""
+
+
+class BatchFailedError(RuntimeError):
+    """The provider batch failed, expired or was cancelled; the manifest can be submitted again"""
+
+
+@dataclass
+class BatchInfo:
+    id: str
+    status: str
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    output_file: Optional[str] = None
+    error_file: Optional[str] = None
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for a provider batch API backed by a directory
+    Each batch is <LLM_BATCH_DIR>/<batch_id>/ with input.jsonl, state.json and, once
+    polled, output.jsonl / errors.jsonl in the provider's result format
+    """
+
+    name = "local"
+
+    def __init__(self, directory: Optional[str] = None, concurrency: Optional[int] = None):
+        self.directory = directory or os.getenv("LLM_BATCH_DIR", "batches")
+        self.concurrency = concurrency or int(os.getenv("LLM_BATCH_LOCAL_CONCURRENCY", "8"))
+
+    def _path(self, batch_id: str, name: str) -> str:
+        return os.path.join(self.directory, batch_id, name)
+
+    def _read_state(self, batch_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._path(batch_id, "state.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise LookupError(f"Batch {batch_id} not found") from None
+
+    def _write_state(self, batch_id: str, state: Dict[str, Any]):
+        _write_json(self._path(batch_id, "state.json"), state)
+
+    def _info(self, batch_id: str, state: Dict[str, Any]) -> BatchInfo:
+        return BatchInfo(id=batch_id, status=state["status"], total=state.get("total", 0),
+                         completed=state.get("completed", 0), failed=state.get("failed", 0),
+                         output_file=state.get("output_file"), error_file=state.get("error_file"))
+
+    def submit(self, requests_path: str) -> BatchInfo:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:16]}"
+        os.makedirs(os.path.join(self.directory, batch_id))
+        shutil.copyfile(requests_path, self._path(batch_id, "input.jsonl"))
+        with open(requests_path, encoding="utf-8") as f:
+            total = sum(1 for line in f if line.strip())
+        state = {"status": "in_progress", "total": total, "created_at": time.time()}
+        self._write_state(batch_id, state)
+        return self._info(batch_id, state)
+
+    def retrieve(self, batch_id: str) -> BatchInfo:
+        state = self._read_state(batch_id)
+        if state["status"] == "in_progress":
+            state = self._execute(batch_id, state)
+        return self._info(batch_id, state)
+
+    def cancel(self, batch_id: str) -> BatchInfo:
+        state = self._read_state(batch_id)
+        if state["status"] not in TERMINAL_STATUSES:
+            state["status"] = "cancelled"
+            self._write_state(batch_id, state)
+        return self._info(batch_id, state)
+
+    def _execute(self, batch_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        with open(self._path(batch_id, "input.jsonl"), encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="local-batch") as executor:
+            results = list(executor.map(_run_local_request, requests))
+        outputs = [r for r in results if r.get("error") is None]
+        errors = [r for r in results if r.get("error") is not None]
+        _write_jsonl(self._path(batch_id, "output.jsonl"), outputs)
+        _write_jsonl(self._path(batch_id, "errors.jsonl"), errors)
+        state.update(status="completed", completed=len(outputs), failed=len(errors),
+                     output_file=self._path(batch_id, "output.jsonl"), error_file=self._path(batch_id, "errors.jsonl"),
+                     completed_at=time.time())
+        self._write_state(batch_id, state)
+        return state
+
+    def results(self, info: BatchInfo) -> Iterator[Dict[str, Any]]:
+        for path in (info.output_file, info.error_file):
+            if path and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+
+
+def _run_local_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    body = request["body"]
+    model = body["model"]
+    result = {"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": request["custom_id"], "response": None, "error": None}
+    try:
+        llm = make_llm(model=model, max_tokens=body.get("max_tokens"))
+        resp = invoke_llm(llm, body["messages"][-1]["content"], model)
+    except Exception as exc:
+        result["error"] = {"code": type(exc).__name__, "message": str(exc)}
+        return result
+    prompt_tokens, completion_tokens, cached_tokens = usage_from_response(resp)
+    result["response"] = {
+        "status_code": 200,
+        "body": {
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": resp.content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+        },
+    }
+    return result
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API; results are billed at the provider's batch discount and arrive within 24h"""
+
+    name = "openai"
+
+    def __init__(self, client=None):
+        if client is None:
+            if detect_provider() != "openai":
+                raise RuntimeError(f"LLM provider {detect_provider()} has no batch API; set LLM_BATCH_BACKEND=local")
+            from openai import OpenAI
+            api_key = get_env("OPENAI_API_KEY")
+            if not api_key:
+                raise RuntimeError("Missing OPENAI_API_KEY; please configure your LLM credentials.")
+            client = OpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
+        self.client = client
+
+    def _info(self, batch) -> BatchInfo:
+        counts = batch.request_counts
+        return BatchInfo(id=batch.id, status=batch.status,
+                         total=counts.total if counts else 0,
+                         completed=counts.completed if counts else 0,
+                         failed=counts.failed if counts else 0,
+                         output_file=batch.output_file_id, error_file=batch.error_file_id)
+
+    def submit(self, requests_path: str) -> BatchInfo:
+        with open(requests_path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=CHAT_COMPLETIONS_ENDPOINT,
+                                           completion_window="24h")
+        return self._info(batch)
+
+    def retrieve(self, batch_id: str) -> BatchInfo:
+        return self._info(self.client.batches.retrieve(batch_id))
+
+    def cancel(self, batch_id: str) -> BatchInfo:
+        return self._info(self.client.batches.cancel(batch_id))
+
+    def results(self, info: BatchInfo) -> Iterator[Dict[str, Any]]:
+        for file_id in (info.output_file, info.error_file):
+            if file_id:
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def get_backend(name: Optional[str] = None):
+    name = (name or os.getenv("LLM_BATCH_BACKEND") or ("local" if detect_provider() == "stub" else "openai")).lower()
+    if name == "local":
+        return LocalBatchBackend()
+    if name == "openai":
+        return OpenAIBatchBackend()
+    raise ValueError(f"Unknown LLM_BATCH_BACKEND: {name}")
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _write_jsonl(path: str, rows: List[Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prepare_batch(input_path: str, manifest_path: str, fmt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the batch request file and its manifest from a JSONL/CSV answer file
+    Rows the pre-screen can score, and rows that cannot be scored (unknown question or
+    student), are resolved now and never sent to the provider
+    """
+    if os.path.exists(manifest_path):
+        raise FileExistsError(f"{manifest_path} exists; choose another manifest path")
+    model = configured_model()
+    mode, output_fmt = key_point_mode(), output_format()
+    requests_path = os.path.splitext(manifest_path)[0] + ".requests.jsonl"
+    manifest: Dict[str, Any] = {
+        "status": "prepared", "backend": None, "batch_id": None, "input": input_path,
+        "requests_file": requests_path, "model": model, "model_metadata": list(model_metadata(model)),
+        "key_point_mode": mode, "output_format": output_fmt,
+        "questions": {}, "rows": {}, "local_results": {},
+    }
+    questions: Dict[str, Any] = {}
+    students: Dict[str, bool] = {}
+    max_tokens = max_tokens_for(output_fmt)
+    with open(requests_path, "w", encoding="utf-8") as requests_file:
+        for line_no, row, parse_error in read_rows(input_path, fmt):
+            custom_id = f"line-{line_no}"
+            row = row or {}
+            record = {"line": line_no, "question_id": row.get("question_id"), "student_id": row.get("student_id")}
+            try:
+                if parse_error:
+                    raise BatchInputError(parse_error)
+                question_id, student_id, answer = parse_row(row)
+                if student_id is not None:
+                    if student_id not in students:
+                        students[student_id] = student_exists(student_id)
+                    if not students[student_id]:
+                        raise LookupError(f"student_id {student_id} not found")
+                if question_id not in questions:
+                    questions[question_id] = load_question_and_rubric(question_id, None)
+                if questions[question_id] is None:
+                    raise LookupError(f"question_id {question_id} not found")
+                text, rubric, rubric_version, fingerprint = questions[question_id]
+                manifest["questions"][question_id] = {"text": text, "rubric": rubric, "rubric_version": rubric_version}
+                manifest["rows"][custom_id] = {**record, "question_id": question_id, "student_id": student_id,
+                                               "answer": answer}
+                screened = prescreen_score(question_id, text, rubric, rubric_version, answer)
+                if screened is not None:
+                    manifest["local_results"][custom_id] = screened.evaluation_row(student_id, answer)
+                    continue
+                prepared = prepare_prompt(text, rubric, answer, prompt_cache_key=(question_id, rubric_version, fingerprint),
+                                          mode=mode, fmt=output_fmt)
+            except Exception as exc:
+                manifest["rows"][custom_id] = {**record, "error": f"{type(exc).__name__}: {exc}"}
+                continue
+            body = {"model": model, "temperature": 0, "messages": [{"role": "user", "content": prepared.prompt}]}
+            if max_tokens:
+                body["max_tokens"] = max_tokens
+            request = {"custom_id": custom_id, "method": "POST", "url": CHAT_COMPLETIONS_ENDPOINT, "body": body}
+            requests_file.write(json.dumps(request, ensure_ascii=False) + "\n")
+    manifest["request_count"] = sum(1 for cid, row in manifest["rows"].items()
+                                    if "error" not in row and cid not in manifest["local_results"])
+    _write_json(manifest_path, manifest)
+    return manifest
+
+
+def submit_batch(manifest_path: str, backend=None) -> BatchInfo:
+    """Upload the request file; a manifest is submitted at most once unless its batch failed"""
+    manifest = load_manifest(manifest_path)
+    if manifest["batch_id"]:
+        raise RuntimeError(f"Manifest already submitted as batch {manifest['batch_id']}")
+    backend = backend or get_backend()
+    if manifest["request_count"]:
+        info = backend.submit(manifest["requests_file"])
+    else:
+        info = BatchInfo(id="none", status="completed")
+    manifest.update(status="submitted", backend=backend.name, batch_id=info.id, submitted_at=time.time())
+    _write_json(manifest_path, manifest)
+    logger.info(f"Submitted {manifest['request_count']} requests as batch {info.id} ({backend.name})")
+    return info
+
+
+def poll_batch(manifest_path: str, backend=None, wait: bool = False, interval: float = 30.0,
+               timeout: Optional[float] = None) -> BatchInfo:
+    """Current batch status; with wait, poll every `interval` seconds until it is terminal"""
+    manifest = load_manifest(manifest_path)
+    if not manifest["batch_id"]:
+        raise RuntimeError("Manifest has not been submitted")
+    if manifest["batch_id"] == "none":
+        return BatchInfo(id="none", status="completed")
+    backend = backend or get_backend(manifest["backend"])
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        info = backend.retrieve(manifest["batch_id"])
+        if not wait or info.status in TERMINAL_STATUSES:
+            return info
+        if deadline is not None and time.monotonic() + interval > deadline:
+            raise BatchNotReadyError(f"Batch {info.id} still {info.status} after {timeout:.0f}s")
+        time.sleep(interval)
+
+
+def _response_content(result: Dict[str, Any]) -> Dict[str, Any]:
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        error = result.get("error") or (response.get("body") or {}).get("error") or {}
+        raise RuntimeError(f"{error.get('code', response.get('status_code'))}: {error.get('message', 'request failed')}")
+    return response["body"]
+
+
+def _stats_from_body(body: Dict[str, Any], model: str) -> LLMCallStats:
+    usage = body.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    return LLMCallStats(tier="batch", model_id=model, latency_ms=None,
+                        prompt_tokens=int(usage.get("prompt_tokens") or 0),
+                        completion_tokens=int(usage.get("completion_tokens") or 0),
+                        cached_tokens=int(details.get("cached_tokens") or 0))
+
+
+def ingest_batch(manifest_path: str, results_path: Optional[str] = None, backend=None) -> Dict[str, int]:
+    """
+    Decode a finished batch and store every scored answer as an AnswerEvaluation in one transaction
+    Writes one JSON line per input row to results_path (same record shape as offline batch grading);
+    requests that failed at the provider or returned invalid JSON are recorded as errors. A batch that
+    failed, expired or was cancelled stores nothing and leaves the manifest ready to be submitted again
+    """
+    manifest = load_manifest(manifest_path)
+    if manifest["status"] == "ingested":
+        raise RuntimeError("Batch results were already ingested")
+    info = poll_batch(manifest_path, backend)
+    if info.status not in TERMINAL_STATUSES:
+        raise BatchNotReadyError(f"Batch {info.id} is {info.status}")
+    if info.status != "completed":
+        manifest.update(status="failed", batch_id=None,
+                        failed_batches=manifest.get("failed_batches", []) + [{"id": info.id, "status": info.status}])
+        _write_json(manifest_path, manifest)
+        raise BatchFailedError(f"Batch {info.id} {info.status}; nothing was stored, submit the manifest again")
+    backend = backend or (get_backend(manifest["backend"]) if info.id != "none" else None)
+    responses = {r["custom_id"]: r for r in backend.results(info)} if backend is not None else {}
+    model, metadata = manifest["model"], tuple(manifest["model_metadata"])
+
+    rows, records = [], []
+    for custom_id, entry in manifest["rows"].items():
+        record = {"line": entry["line"], "question_id": entry["question_id"], "student_id": entry["student_id"]}
+        records.append(record)
+        if "error" in entry:
+            record.update(status="error", error=entry["error"])
+            continue
+        question = manifest["questions"][entry["question_id"]]
+        try:
+            if custom_id in manifest["local_results"]:
+                row = manifest["local_results"][custom_id]
+            else:
+                if custom_id not in responses:
+                    raise RuntimeError(f"No result in batch ({info.status})")
+                body = _response_content(responses[custom_id])
+                prepared = prepare_prompt(question["text"], question["rubric"], entry["answer"],
+                                          mode=manifest["key_point_mode"], fmt=manifest["output_format"])
+                llm_json = prepared.decode(body["choices"][0]["message"]["content"], question["rubric"])
+                scored = scored_payload(entry["question_id"], question["rubric_version"], llm_json, "batch",
+                                        _stats_from_body(body, model), model=metadata)
+                row = scored.evaluation_row(entry["student_id"], entry["answer"])
+        except Exception as exc:
+            record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+            continue
+        rows.append(row)
+        record.update(status="ok", total_score=row["auto_score"], rubric_version=row["rubric_version"],
+                      model_version=row["model_version"], model_tier=row["model_tier"], persisted=True)
+
+    if rows:
+        insert_evaluations(rows)
+    manifest.update(status="ingested", ingested_at=time.time())
+    _write_json(manifest_path, manifest)
+    if results_path:
+        _write_jsonl(results_path, sorted(records, key=lambda r: r["line"]))
+    failed = sum(1 for r in records if r["status"] == "error")
+    return {"succeeded": len(rows), "failed": failed, "batch_requests": manifest["request_count"],
+            "prescreened": len(manifest["local_results"])}
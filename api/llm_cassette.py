@@ -0,0 +1,178 @@
+"""
+Record/replay cassette for LLM calls
+LLM_CASSETTE_MODE=record wraps the real chat model and appends every response
+(or error) with its latency to a JSONL cassette keyed by a hash of model and
+prompt; LLM_CASSETTE_MODE=replay serves those responses without a provider,
+sleeping the recorded latency scaled by LLM_CASSETTE_LATENCY_SCALE. Both call_llm
+and generate_rubric_by_llm go through make_llm, so both are covered
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(RuntimeError):
+    """Replay found no recording for the prompt"""
+
+
+class RecordedLLMError(RuntimeError):
+    """Replayed provider failure that was captured while recording"""
+
+
+@dataclass
+class RecordedResponse:
+    content: str
+    usage_metadata: Dict[str, Any] = field(default_factory=dict)
+    response_metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def cassette_mode() -> str:
+    mode = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+    return mode if mode in CASSETTE_MODES else "off"
+
+
+def cassette_path() -> str:
+    return os.getenv("LLM_CASSETTE_PATH", "cassettes/llm.jsonl")
+
+
+def latency_scale() -> float:
+    """1.0 replays original timings, 0 replays instantly"""
+    try:
+        return max(0.0, float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "1.0")))
+    except ValueError:
+        return 1.0
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Recordings loaded from one JSONL file
+    A prompt recorded several times (retries, repeated answers) replays its
+    recordings in order and then wraps around
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]].append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, key: str, model: str, prompt: str, latency_ms: float,
+               response: Any = None, error: Optional[BaseException] = None):
+        entry: Dict[str, Any] = {
+            "key": key,
+            "model": model,
+            "prompt_chars": len(prompt),
+            "latency_ms": round(latency_ms, 3),
+            "recorded_at": time.time(),
+        }
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        else:
+            entry["content"] = response.content
+            entry["usage_metadata"] = dict(getattr(response, "usage_metadata", None) or {})
+            entry["response_metadata"] = dict(getattr(response, "response_metadata", None) or {})
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._entries[key].append(entry)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def next_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._cursor[key] % len(entries)
+            self._cursor[key] += 1
+            return entries[index]
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: Optional[str] = None) -> Cassette:
+    path = path or cassette_path()
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path)
+        return cassette
+
+
+def reset_cassettes():
+    """Forget loaded cassettes so the next call rereads the files"""
+    with _cassettes_lock:
+        _cassettes.clear()
+
+
+class RecordingChatModel:
+    """Wraps a chat model and appends each call to the cassette"""
+
+    def __init__(self, llm, model: str, cassette: Cassette):
+        self.llm = llm
+        self.model_name = model
+        self.cassette = cassette
+
+    def invoke(self, prompt: str):
+        key = prompt_key(self.model_name, prompt)
+        started = time.perf_counter()
+        try:
+            resp = self.llm.invoke(prompt)
+        except Exception as exc:
+            self.cassette.record(key, self.model_name, prompt, (time.perf_counter() - started) * 1000, error=exc)
+            raise
+        self.cassette.record(key, self.model_name, prompt, (time.perf_counter() - started) * 1000, response=resp)
+        return resp
+
+
+class ReplayChatModel:
+    """Serves recorded responses with the recorded latency times the scale"""
+
+    def __init__(self, model: str, cassette: Cassette, timeout: Optional[float] = None,
+                 scale: Optional[float] = None):
+        self.model_name = model
+        self.cassette = cassette
+        self.timeout = timeout
+        self.scale = latency_scale() if scale is None else scale
+
+    def invoke(self, prompt: str) -> RecordedResponse:
+        entry = self.cassette.next_entry(prompt_key(self.model_name, prompt))
+        if entry is None:
+            raise CassetteMissError(f"No recording for model {self.model_name} and this prompt in {self.cassette.path}")
+        delay = entry.get("latency_ms", 0.0) * self.scale / 1000
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"Replayed LLM call timed out after {self.timeout:.2f}s")
+        if delay > 0:
+            time.sleep(delay)
+        if "error" in entry:
+            raise RecordedLLMError(entry["error"])
+        return RecordedResponse(
+            content=entry["content"],
+            usage_metadata=entry.get("usage_metadata") or {},
+            response_metadata=entry.get("response_metadata") or {},
+        )
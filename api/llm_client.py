@@ -1,12 +1,23 @@
 import os, json
 import logging
+import threading
 import time
-from typing import Dict, Any, Optional
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_openai import ChatOpenAI
+from pydantic import ValidationError
+from . import compact_output
+from .llm_cassette import RecordingChatModel, ReplayChatModel, cassette_mode, get_cassette
+from .keypoint_matcher import KeyPointCoverage, key_point_mode, match_key_points
+from .prompt_cache import prompt_prefix_cache
+from .models import LLMScorePayload
+from .metrics import LLM_CALL_DURATION, LLM_CALLS, LLM_RETRIES, LLM_TOKENS
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
-def _get_env(*names: str, default: Optional[str] = None) -> Optional[str]:
+def get_env(*names: str, default: Optional[str] = None) -> Optional[str]:
+    """First non-empty value among the given environment variables"""
     for name in names:
         value = os.getenv(name)
         if value:
@@ -15,15 +26,16 @@ def _get_env(*names: str, default: Optional[str] = None) -> Optional[str]:
 
 def _build_headers_for_openrouter() -> dict:
     headers = {}
-    referer = _get_env("OPENROUTER_REFERER", "OR_HTTP_REFERER")
+    referer = get_env("OPENROUTER_REFERER", "OR_HTTP_REFERER")
     if referer:
         headers["HTTP-Referer"] = referer
-    title = _get_env("OPENROUTER_TITLE", "OR_X_TITLE")
+    title = get_env("OPENROUTER_TITLE", "OR_X_TITLE")
     if title:
         headers["X-Title"] = title
     return headers
 
-def _detect_provider() -> str:
+def detect_provider() -> str:
+    """LLM_PROVIDER, otherwise openrouter or openai depending on OPENAI_BASE_URL"""
     provider = os.getenv("LLM_PROVIDER")
     if provider:
         return provider.lower()
@@ -32,16 +44,54 @@ def _detect_provider() -> str:
         return "openrouter"
     return "openai"
 
-def _make_llm():
-    provider = _detect_provider()
-    model = _get_env("MODEL_ID", "MODEL_NAME", default="gpt-4o-mini")
-    api_key = _get_env("OPENAI_API_KEY", "OPENROUTER_API_KEY")
+def _default_timeout() -> float:
+    try:
+        return float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+    except ValueError:
+        return 30.0
+
+def configured_model() -> str:
+    """Model id from MODEL_ID / MODEL_NAME"""
+    return get_env("MODEL_ID", "MODEL_NAME", default="gpt-4o-mini")
+
+def make_llm(timeout: Optional[float] = None, model: Optional[str] = None, max_tokens: Optional[int] = None):
+    """
+    Build the chat model client
+    - timeout: per-request timeout in seconds; when bounded by a request deadline,
+      transport retries are disabled so a retry cannot outlive the deadline
+    - model: overrides the configured MODEL_ID (used by the cascade's small tier)
+    - max_tokens: cap on generated tokens
+    LLM_PROVIDER=stub returns the local StubChatModel (load tests, offline runs)
+    LLM_CASSETTE_MODE=record/replay records to or replays from the LLM cassette
+    """
+    model = model or configured_model()
+    mode = cassette_mode()
+    if mode == "replay":
+        return ReplayChatModel(model, get_cassette(), timeout=timeout if timeout is not None else _default_timeout())
+    llm = _build_client(timeout, model, max_tokens)
+    if mode == "record":
+        return RecordingChatModel(llm, model, get_cassette())
+    return llm
+
+def _build_client(timeout: Optional[float], model: str, max_tokens: Optional[int]):
+    provider = detect_provider()
+    if provider == "stub":
+        from .llm_stub import StubChatModel
+        return StubChatModel(model=model, timeout=timeout if timeout is not None else _default_timeout(),
+                             max_tokens=max_tokens)
+
+    api_key = get_env("OPENAI_API_KEY", "OPENROUTER_API_KEY")
     base_url = os.getenv("OPENAI_BASE_URL")
 
     if not api_key:
         raise RuntimeError("Missing OPENAI_API_KEY; please configure your LLM credentials.")
 
-    common_kwargs = dict(model=model, api_key=api_key, temperature=0, max_retries=2)
+    if timeout is None:
+        common_kwargs = dict(model=model, api_key=api_key, temperature=0, max_retries=2, timeout=_default_timeout())
+    else:
+        common_kwargs = dict(model=model, api_key=api_key, temperature=0, max_retries=0, timeout=timeout)
+    if max_tokens:
+        common_kwargs["max_tokens"] = max_tokens
 
     if provider == "openrouter":
         return ChatOpenAI(
@@ -54,20 +104,19 @@ def _make_llm():
         common_kwargs["base_url"] = base_url
     return ChatOpenAI(**common_kwargs)
 
-def build_prompt(question_text:str, rubric:dict, student_answer:str) -> str:
-    return f"""You are an experienced data interview evaluator.
-Score on multiple dimensions in one pass and OUTPUT JSON ONLY.
+def _format_key_point_hints(hints: List[KeyPointCoverage]) -> str:
+    return "\n".join(f"- {h.point} -> {h.status} ({h.score:.2f})" for h in hints)
 
-QUESTION
-{question_text}
-
-RUBRIC
-{json.dumps(rubric, ensure_ascii=False)}
-
-CANDIDATE ANSWER
-{student_answer}
-
-OUTPUT FORMAT (JSON):
+def _output_format_section(output_format: str, local_key_points: bool, with_hints: bool) -> str:
+    if output_format == "compact":
+        return compact_output.format_section(include_key_points=not local_key_points)
+    if local_key_points:
+        key_points_format = ""
+    elif with_hints:
+        key_points_format = '\n  "key_points_evaluation": ["point -> covered/partial/missing (no explanation)"],'
+    else:
+        key_points_format = '\n  "key_points_evaluation": ["point -> ok/missing/..."],'
+    return f"""OUTPUT FORMAT (JSON):
 {{
   "total_score": float (0-10),
   "dimension_breakdown": {{
@@ -76,29 +125,340 @@ OUTPUT FORMAT (JSON):
     "clarity": float (0-2),
     "business": float (0-2),
     "language": float (0-2)
-  }},
-  "key_points_evaluation": ["point -> ok/missing/..."],
+  }},{key_points_format}
   "improvement_recommendations": ["concrete action 1", "concrete action 2"]
 }}
 Only return valid JSON, no extra text.
 """
 
-def call_llm(question_text:str, rubric:dict, student_answer:str) -> Dict[str, Any]:
-    """Call LLM for scoring"""
+def compile_prompt_prefix(question_text: str, rubric: dict, output_format: str = "full",
+                          local_key_points: bool = False, with_hints: bool = False) -> str:
+    """
+    Answer-independent part of the prompt: static instructions first, then rubric and question.
+    The rubric is serialized with sorted keys so the prefix is byte-stable for the provider's prefix cache
+    """
+    return f"""You are an experienced data interview evaluator.
+Score on multiple dimensions in one pass and OUTPUT JSON ONLY.
+
+{_output_format_section(output_format, local_key_points, with_hints)}
+RUBRIC
+{json.dumps(rubric, ensure_ascii=False, sort_keys=True)}
+
+QUESTION
+{question_text}
+
+CANDIDATE ANSWER
+"""
+
+def build_prompt(question_text:str, rubric:dict, student_answer:str,
+                 key_point_hints: Optional[List[KeyPointCoverage]] = None,
+                 local_key_points: bool = False,
+                 output_format: str = "full",
+                 cache_key: Optional[Tuple[str, str, str]] = None) -> str:
+    """
+    Build the scoring prompt: precompiled prefix, then the answer-specific parts last
+    - key_point_hints: local lexical coverage of the rubric key points, given to the LLM to verify
+    - local_key_points: key_points_evaluation is computed locally, so the LLM is not asked to write it
+    - output_format: "full" JSON or the "compact" short-key protocol
+    - cache_key: (question_id, rubric_version, rubric_fingerprint); when given the prefix is reused from
+      the in-memory cache. The fingerprint is computed once by the caller when it loads the rubric
+    """
+    with_hints = bool(key_point_hints)
+
+    def compile_prefix() -> str:
+        return compile_prompt_prefix(question_text, rubric, output_format, local_key_points, with_hints)
+
+    if cache_key is None:
+        prefix = compile_prefix()
+    else:
+        key = (*cache_key, question_text, output_format, local_key_points, with_hints)
+        prefix = prompt_prefix_cache.get_or_build(key, compile_prefix)
+
+    parts = [prefix, student_answer, "\n"]
+    if with_hints:
+        parts.append(f"""
+LOCAL KEY POINT COVERAGE (lexical pre-check, verify against meaning)
+{_format_key_point_hints(key_point_hints)}
+""")
+    parts.append("\nScore the candidate answer above. Output JSON only.\n")
+    return "".join(parts)
+
+def _apply_key_point_coverage(result: Dict[str, Any], coverage: List[KeyPointCoverage], local_key_points: bool) -> Dict[str, Any]:
+    if coverage:
+        result["local_key_point_coverage"] = [c.as_dict() for c in coverage]
+        if local_key_points:
+            result["key_points_evaluation"] = [c.as_evaluation() for c in coverage]
+    return result
+
+@dataclass
+class LLMCallStats:
+    """Per-call metadata filled in by call_llm for the caller to persist"""
+    tier: Optional[str] = None
+    model_id: Optional[str] = None
+    escalation_reason: Optional[str] = None
+    latency_ms: Optional[float] = 0.0  # None when unknown, e.g. provider batch results
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+
+
+def usage_from_response(resp) -> Tuple[int, int, int]:
+    """(prompt, completion, cached) token counts reported by the provider, zeros when absent"""
+    usage = getattr(resp, "usage_metadata", None)
+    if isinstance(usage, dict):
+        details = usage.get("input_token_details")
+        cached = details.get("cache_read", 0) if isinstance(details, dict) else 0
+        return int(usage.get("input_tokens") or 0), int(usage.get("output_tokens") or 0), int(cached or 0)
+    metadata = getattr(resp, "response_metadata", None)
+    token_usage = metadata.get("token_usage") if isinstance(metadata, dict) else None
+    if isinstance(token_usage, dict):
+        details = token_usage.get("prompt_tokens_details")
+        cached = details.get("cached_tokens", 0) if isinstance(details, dict) else 0
+        return int(token_usage.get("prompt_tokens") or 0), int(token_usage.get("completion_tokens") or 0), int(cached or 0)
+    return 0, 0, 0
+
+
+def _record_usage(resp, stats: "LLMCallStats"):
+    prompt_tokens, completion_tokens, cached_tokens = usage_from_response(resp)
+    stats.prompt_tokens += prompt_tokens
+    stats.completion_tokens += completion_tokens
+    stats.cached_tokens += cached_tokens
+    if prompt_tokens:
+        prompt_prefix_cache.record_provider_usage(prompt_tokens, cached_tokens)
+        provider = detect_provider()
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+        LLM_TOKENS.inc(cached_tokens, provider=provider, kind="cached")
+
+
+def is_timeout_error(exc: BaseException) -> bool:
+    """TimeoutError or a provider timeout such as openai.APITimeoutError, which is not a TimeoutError"""
+    return isinstance(exc, TimeoutError) or "timeout" in type(exc).__name__.lower()
+
+def invoke_llm(llm, prompt: str, model: Optional[str] = None):
+    """Invoke a chat model, recording latency and outcome metrics per provider and model"""
+    provider = detect_provider()
+    model = model or configured_model()
+    started = time.perf_counter()
+    outcome = "error"
+    with span("llm.invoke", kind="CLIENT", **{"llm.provider": provider, "llm.model": model,
+                                              "llm.prompt_chars": len(prompt)}) as llm_span:
+        try:
+            resp = llm.invoke(prompt)
+            outcome = "ok"
+            if llm_span is not None:
+                prompt_tokens, completion_tokens, cached_tokens = usage_from_response(resp)
+                llm_span.set_attribute("llm.usage.prompt_tokens", prompt_tokens)
+                llm_span.set_attribute("llm.usage.completion_tokens", completion_tokens)
+                llm_span.set_attribute("llm.usage.cached_tokens", cached_tokens)
+            return resp
+        except Exception as exc:
+            if is_timeout_error(exc):
+                outcome = "timeout"
+            raise
+        finally:
+            LLM_CALL_DURATION.observe(time.perf_counter() - started, provider=provider, model=model)
+            LLM_CALLS.inc(provider=provider, model=model, outcome=outcome)
+            if llm_span is not None:
+                llm_span.set_attribute("llm.outcome", outcome)
+
+
+class CascadeStats:
+    """In-process escalation and latency counters for the model cascade"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.total_calls = 0
+            self.escalated_calls = 0
+            self.escalation_reasons: Dict[str, int] = {}
+            self.small_latency_ms = 0.0
+            self.large_latency_ms = 0.0
+            self.small_only_latency_ms = 0.0
+
+    def record(self, small_ms: float, large_ms: Optional[float], reason: Optional[str]):
+        with self._lock:
+            self.total_calls += 1
+            self.small_latency_ms += small_ms
+            if large_ms is None:
+                self.small_only_latency_ms += small_ms
+            else:
+                self.escalated_calls += 1
+                self.large_latency_ms += large_ms
+                self.escalation_reasons[reason] = self.escalation_reasons.get(reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            small_only = self.total_calls - self.escalated_calls
+            avg_small = self.small_latency_ms / self.total_calls if self.total_calls else 0.0
+            avg_large = self.large_latency_ms / self.escalated_calls if self.escalated_calls else 0.0
+            avg_small_only = self.small_only_latency_ms / small_only if small_only else 0.0
+            # Answers kept on the small tier would otherwise have waited for the large model
+            saved = small_only * (avg_large - avg_small_only) if self.escalated_calls else 0.0
+            return {
+                "total_calls": self.total_calls,
+                "escalated_calls": self.escalated_calls,
+                "escalation_rate": self.escalated_calls / self.total_calls if self.total_calls else 0.0,
+                "escalation_reasons": dict(self.escalation_reasons),
+                "avg_small_latency_ms": avg_small,
+                "avg_large_latency_ms": avg_large,
+                "estimated_latency_saved_ms": saved,
+            }
+
+
+cascade_stats = CascadeStats()
+
+
+def cascade_enabled() -> bool:
+    return os.getenv("LLM_CASCADE", "false").lower() == "true" and bool(os.getenv("CASCADE_SMALL_MODEL_ID"))
+
+def cascade_models() -> Tuple[str, str]:
+    """(small, large) model ids used by the cascade"""
+    return os.getenv("CASCADE_SMALL_MODEL_ID", ""), configured_model()
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def _escalation_reason(result: Dict[str, Any], coverage: List[KeyPointCoverage]) -> Optional[str]:
+    """Why a small-tier result should go to the large model, or None to accept it"""
     try:
-        llm = _make_llm()
-        prompt = build_prompt(question_text, rubric, student_answer)
-        resp = llm.invoke(prompt)
-        text = resp.content.strip()
-        
+        payload = LLMScorePayload(**result)
+    except (ValidationError, TypeError):
+        return "validation_failure"
+
+    margin = _env_float("CASCADE_BORDERLINE_MARGIN", 0.75)
+    thresholds = [float(t) for t in os.getenv("CASCADE_BORDERLINE_SCORES", "6.0").split(",") if t.strip()]
+    if any(abs(payload.total_score - t) <= margin for t in thresholds):
+        return "borderline_score"
+
+    if coverage:
+        # Local lexical coverage as a rough expected score
+        expected = 10.0 * sum(c.score for c in coverage) / len(coverage)
+        if abs(payload.total_score - expected) > _env_float("CASCADE_MAX_DISAGREEMENT", 4.0):
+            return "local_disagreement"
+    return None
+
+def _decode(text: str, fmt: str, rubric: dict) -> Dict[str, Any]:
+    result = json.loads(text)
+    if fmt == "compact":
+        return compact_output.expand_payload(result, rubric)
+    return result
+
+def score_with_model(prompt: str, model: Optional[str], expires_at: Optional[float],
+                     fmt: str, rubric: dict, stats: LLMCallStats) -> Dict[str, Any]:
+    """Invoke one model, retrying once with a stricter instruction when the output cannot be decoded"""
+    max_tokens = compact_output.max_tokens_for(fmt)
+    llm = make_llm(timeout=_remaining(expires_at), model=model, max_tokens=max_tokens)
+    resp = invoke_llm(llm, prompt, model)
+    _record_usage(resp, stats)
+    text = resp.content.strip()
+    try:
+        return _decode(text, fmt, rubric)
+    except Exception as parse_error:
+        if expires_at is not None:
+            llm = make_llm(timeout=_remaining(expires_at), model=model, max_tokens=max_tokens)
+        logger.warning(f"JSON parse failed, retrying: {parse_error}")
+        stats.retries += 1
+        LLM_RETRIES.inc(provider=detect_provider())
+        resp2 = invoke_llm(llm, prompt + "\nReturn JSON only.", model)
+        _record_usage(resp2, stats)
+        return _decode(resp2.content.strip(), fmt, rubric)
+
+@dataclass
+class PreparedPrompt:
+    """Scoring prompt plus the local state needed to decode its response"""
+    prompt: str
+    fmt: str
+    coverage: List[KeyPointCoverage]
+    local_key_points: bool
+
+    def decode(self, text: str, rubric: dict) -> Dict[str, Any]:
+        return _apply_key_point_coverage(_decode(text.strip(), self.fmt, rubric), self.coverage, self.local_key_points)
+
+def prepare_prompt(question_text: str, rubric: dict, student_answer: str,
+                   prompt_cache_key: Optional[Tuple[str, str, str]] = None,
+                   mode: Optional[str] = None, fmt: Optional[str] = None) -> PreparedPrompt:
+    """
+    Key point pre-check and prompt for one answer
+    - mode / fmt: KEY_POINT_MODE and LLM_OUTPUT_FORMAT overrides (the batch backend pins them at submission)
+    """
+    mode = mode or key_point_mode()
+    coverage = match_key_points(rubric, student_answer) if mode != "off" else []
+    local_key_points = mode == "local" and bool(coverage)
+    fmt = fmt or compact_output.output_format()
+    prompt = build_prompt(question_text, rubric, student_answer,
+                          key_point_hints=coverage or None, local_key_points=local_key_points,
+                          output_format=fmt, cache_key=prompt_cache_key)
+    return PreparedPrompt(prompt=prompt, fmt=fmt, coverage=coverage, local_key_points=local_key_points)
+
+def _remaining(expires_at: Optional[float]) -> Optional[float]:
+    if expires_at is None:
+        return None
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("LLM time budget exhausted")
+    return remaining
+
+def call_llm(question_text:str, rubric:dict, student_answer:str, timeout: Optional[float] = None,
+             stats: Optional[LLMCallStats] = None,
+             prompt_cache_key: Optional[Tuple[str, str, str]] = None) -> Dict[str, Any]:
+    """
+    Call LLM for scoring
+    - timeout: total time budget in seconds (from the request deadline); the JSON
+      retry and cascade escalation are only attempted while budget remains
+    - stats: filled with the tier, model, wall-clock latency, JSON retries and provider token usage of the call
+    - prompt_cache_key: (question_id, rubric_version, rubric_fingerprint) for reusing the precompiled prompt prefix
+    With LLM_CASCADE=true the small model scores first and only borderline, locally
+    disputed or invalid results are escalated to the configured MODEL_ID
+    """
+    stats = stats if stats is not None else LLMCallStats()
+    try:
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        prepared = prepare_prompt(question_text, rubric, student_answer, prompt_cache_key=prompt_cache_key)
+        prompt, fmt = prepared.prompt, prepared.fmt
+        coverage, local_key_points = prepared.coverage, prepared.local_key_points
+
+        if not cascade_enabled():
+            started = time.monotonic()
+            result = score_with_model(prompt, None, expires_at, fmt, rubric, stats)
+            stats.tier, stats.model_id = "single", configured_model()
+            stats.latency_ms = (time.monotonic() - started) * 1000
+            return _apply_key_point_coverage(result, coverage, local_key_points)
+
+        small_model, large_model = cascade_models()
+        started = time.monotonic()
         try:
-            result = json.loads(text)
-            return result
-        except Exception as parse_error:
-            logger.warning(f"JSON parse failed, retrying: {parse_error}")
-            resp2 = llm.invoke(prompt + "\nReturn JSON only.")
-            result = json.loads(resp2.content.strip())
+            result = _apply_key_point_coverage(score_with_model(prompt, small_model, expires_at, fmt, rubric, stats), coverage, local_key_points)
+            reason = _escalation_reason(result, coverage)
+        except Exception as small_error:
+            if is_timeout_error(small_error):
+                raise
+            # Output that cannot be decoded is a validation failure; anything else failed at the provider
+            decode_error = isinstance(small_error, (ValueError, KeyError, TypeError, ValidationError))
+            reason = "validation_failure" if decode_error else "small_model_error"
+            logger.warning(f"Cascade small model failed, escalating: reason={reason}, error={small_error}")
+        small_ms = (time.monotonic() - started) * 1000
+
+        if reason is None:
+            cascade_stats.record(small_ms, None, None)
+            stats.tier, stats.model_id, stats.latency_ms = "small", small_model, small_ms
             return result
+
+        logger.info(f"Cascade escalating to {large_model}: reason={reason}")
+        large_started = time.monotonic()
+        result = score_with_model(prompt, large_model, expires_at, fmt, rubric, stats)
+        large_ms = (time.monotonic() - large_started) * 1000
+        cascade_stats.record(small_ms, large_ms, reason)
+        stats.tier, stats.model_id, stats.escalation_reason = "large", large_model, reason
+        stats.latency_ms = small_ms + large_ms
+        return _apply_key_point_coverage(result, coverage, local_key_points)
     except Exception as e:
         logger.error(f"LLM call failed: {e}")
         raise
@@ -0,0 +1,133 @@
+"""
+Local stub chat model for load tests and offline runs (LLM_PROVIDER=stub)
+Returns well-formed scoring or rubric JSON after a simulated latency, with
+configurable failure and malformed-output rates; no network and no API key
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from . import compact_output
+
+DIMENSIONS = ("accuracy", "structure", "clarity", "business", "language")
+
+
+class StubLLMError(RuntimeError):
+    """Simulated provider failure"""
+
+
+@dataclass
+class StubResponse:
+    content: str
+    usage_metadata: Dict[str, Any] = field(default_factory=dict)
+    response_metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class LatencyDistribution:
+    """
+    Parsed from STUB_LLM_LATENCY
+    - fixed:<ms>
+    - uniform:<min_ms>:<max_ms>
+    - normal:<mean_ms>:<stddev_ms>
+    - lognormal:<median_ms>:<sigma> (default lognormal:800:0.4, long-tailed like real providers)
+    """
+
+    def __init__(self, spec: str = "lognormal:800:0.4"):
+        parts = spec.split(":")
+        self.kind = parts[0].lower()
+        self.params = [float(p) for p in parts[1:]]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency distribution: {spec}")
+
+    def sample_ms(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(0.0, sigma) * median
+
+
+_rng = random.Random(os.getenv("STUB_LLM_SEED"))
+_rng_lock = threading.Lock()
+
+
+class StubChatModel:
+    """Drop-in for ChatOpenAI.invoke with simulated latency, failures and malformed output"""
+
+    def __init__(self, model: str = "stub-model", timeout: Optional[float] = None, max_tokens: Optional[int] = None,
+                 latency: Optional[str] = None, failure_rate: Optional[float] = None,
+                 malformed_rate: Optional[float] = None, seed: Optional[int] = None):
+        self.model_name = model
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.latency = LatencyDistribution(latency or os.getenv("STUB_LLM_LATENCY", "lognormal:800:0.4"))
+        self.failure_rate = failure_rate if failure_rate is not None else _env_float("STUB_LLM_FAILURE_RATE", 0.0)
+        self.malformed_rate = malformed_rate if malformed_rate is not None else _env_float("STUB_LLM_MALFORMED_RATE", 0.0)
+        # A client is built per call, so draws come from one process-wide stream unless seeded explicitly
+        self._rng, self._lock = (random.Random(seed), threading.Lock()) if seed is not None else (_rng, _rng_lock)
+
+    def _draw(self):
+        with self._lock:
+            return self.latency.sample_ms(self._rng) / 1000, self._rng.random(), self._rng.random()
+
+    def invoke(self, prompt: str) -> StubResponse:
+        delay, failure_roll, malformed_roll = self._draw()
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"Stub LLM timed out after {self.timeout:.2f}s")
+        time.sleep(delay)
+        if failure_roll < self.failure_rate:
+            raise StubLLMError("Simulated LLM provider error")
+
+        content = self._render(prompt)
+        if malformed_roll < self.malformed_rate:
+            content = "Here is the evaluation: " + content[: len(content) // 2]
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return StubResponse(
+            content=content,
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+    def _render(self, prompt: str) -> str:
+        # Deterministic per prompt so identical inputs score identically
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        if "generate a detailed rubric" in prompt:
+            return json.dumps({
+                "version": "auto-gen-v1",
+                "dimensions": {name: 1 for name in DIMENSIONS},
+                "key_points": ["Core concepts", "Implementation steps", "Common pitfalls"],
+                "common_mistakes": ["Too general", "No examples"],
+            })
+        scores = [round(((digest >> (4 * i)) % 17) / 8, 1) for i in range(len(DIMENSIONS))]
+        total = round(sum(scores), 1)
+        if "compact JSON" in prompt:
+            return json.dumps({
+                "t": total,
+                "d": dict(zip(compact_output.DIMENSION_KEYS.values(), scores)),
+                "k": [],
+                "r": ["Add a concrete example"],
+            }, separators=(",", ":"))
+        return json.dumps({
+            "total_score": total,
+            "dimension_breakdown": dict(zip(DIMENSIONS, scores)),
+            "key_points_evaluation": [],
+            "improvement_recommendations": ["Add a concrete example", "Explain the trade-offs"],
+        })
@@ -1,38 +1,128 @@
 import os
 import logging
 import time
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import desc
+from sqlalchemy import desc, func, or_, select, update
+from datetime import datetime
 from typing import Optional, List
 
 logger = logging.getLogger(__name__)
 from .models import (
-    EvaluationRequest, EvaluationResult, LLMScorePayload,
-    ReviewSaveRequest, ReviewSaveResponse,
+    EvaluationRequest, EvaluationResult,
+    ReviewSaveRequest, ReviewSaveResponse, ReviewBatchRequest, ReviewBatchResponse, ReviewBatchItemResult,
     EvaluationListResponse, EvaluationListItem, EvaluationDetail,
     QuestionCreate, QuestionUpdate, QuestionItem, QuestionDetail, QuestionListResponse,
     RubricCreate, RubricUpdate, RubricItem, RubricDetail, RubricListResponse, RubricActivateResponse,
-    UserCreate, UserItem
+    UserCreate, UserItem, UserListResponse, CascadeStatsResponse, PromptCacheStatsResponse,
+    UsageStatsItem, UsageStatsResponse, ProfileItem, ProfileListResponse,
+    SlowQueryItem, SlowQueryResponse,
+    RescoreJobCreate, RescoreJobItem, RescoreJobListResponse,
+    BulkImportResponse
 )
 from .rubric_service import get_rubric
-from .llm_client import call_llm
+from .llm_client import call_llm, LLMCallStats, cascade_enabled, cascade_models, cascade_stats
+from .scoring import prescreen_score, scored_payload
+from . import rescoring
+from .bulk_import import DEFAULT_BATCH_SIZE, IMPORTERS, format_from_content_type, sync_body_chunks
+from .export import EXPORT_FORMATS, ExportFilters, ExportUnavailableError, check_format, export_filename, iter_export
+from .prompt_cache import prompt_prefix_cache, rubric_fingerprint
+from .pricing import load_pricing, estimate_cost
+from .prescreen import prescreen_enabled
 from .db import init_db, SessionLocal, AnswerEvaluation, Question, QuestionRubric, User
+from .deadline import Deadline, DeadlineExceeded, DEADLINE_HEADER, deadline_from_header, persist_reserve_seconds
+from .metrics import (
+    registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_REQUESTS, HTTP_REQUEST_DURATION, EVALUATIONS_IN_FLIGHT, update_threadpool_gauges
+)
+from .tracing import start_trace, TRACEPARENT_HEADER, TRACE_ID_HEADER
+from .query_log import query_log, slow_query_threshold_ms, bind_request as bind_query_request, unbind_request as unbind_query_request
+from .profiling import (
+    ProfiledRoute, ProfileSession, PROFILE_HEADER, PROFILE_QUERY_PARAM,
+    profiling_enabled, requested_modes, should_sample, profile_dir, activate as activate_profile,
+    deactivate as deactivate_profile
+)
+from .timings import (
+    TIMINGS_HEADER, timings_requested, mark_request_started, stage_breakdown, log_stage_timings
+)
 from .auth import require_teacher, require_student, require_any, get_current_user, UserRole
 
 load_dotenv()
 app = FastAPI(title="Answer Evaluation API")
+app.router.route_class = ProfiledRoute
+
+
+@app.middleware("http")
+async def stamp_request_start(request: Request, call_next):
+    mark_request_started(request)
+    started = time.perf_counter()
+    status = 500
+    scope_token = bind_query_request(request.scope)
+    with start_trace(f"{request.method} {request.url.path}", request.headers.get(TRACEPARENT_HEADER),
+                     **{"http.method": request.method, "http.target": request.url.path}) as root:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if root is not None:
+                response.headers[TRACE_ID_HEADER] = root.trace_id
+            return response
+        finally:
+            # Route templates keep label cardinality bounded; unmatched paths share one label
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, route=route, method=request.method)
+            HTTP_REQUESTS.inc(route=route, method=request.method, status=str(status))
+            if root is not None:
+                root.name = f"{request.method} {route}"
+                root.set_attribute("http.route", route)
+                root.set_attribute("http.status_code", status)
+                if status >= 500:
+                    root.status = "ERROR"
+            unbind_query_request(scope_token)
+
+
+def _is_teacher_token(token: Optional[str]) -> bool:
+    user = get_current_user(token) if token else None
+    return bool(user) and user["role"] == UserRole.TEACHER.value
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Run the endpoint under the profiler when a teacher asks for it (X-Profile / ?profile=)
+    or when the request is picked by PROFILE_SAMPLE_RATE
+    """
+    modes = set()
+    if profiling_enabled():
+        modes = requested_modes(request.headers.get(PROFILE_HEADER), request.query_params.get(PROFILE_QUERY_PARAM))
+        if modes and not await run_in_threadpool(_is_teacher_token, request.headers.get("X-User-Token")):
+            modes = set()
+    if not modes and should_sample():
+        modes = {"cpu"}
+    if not modes:
+        return await call_next(request)
+
+    session = ProfileSession(modes, route=f"{request.method} {request.url.path}")
+    token = activate_profile(session)
+    try:
+        response = await call_next(request)
+    finally:
+        deactivate_profile(token)
+    if session.skipped:
+        response.headers["X-Profile-Skipped"] = session.skipped
+        return response
+    try:
+        files = await run_in_threadpool(session.save)
+    except OSError as exc:
+        logger.warning(f"Failed to store profile {session.profile_id}: {exc}")
+        return response
+    response.headers["X-Profile-Id"] = session.profile_id
+    response.headers["X-Profile-Files"] = ",".join(files)
+    return response
 
-def _model_metadata():
-    provider = os.getenv("LLM_PROVIDER")
-    if not provider:
-        base_url = os.getenv("OPENAI_BASE_URL", "")
-        provider = "openrouter" if "openrouter" in base_url.lower() else "openai"
-    model_id = os.getenv("MODEL_ID") or os.getenv("MODEL_NAME", "gpt-4o-mini")
-    model_version = os.getenv("MODEL_VERSION") or f"{provider}:{model_id}"
-    return provider, model_id, model_version
 
 @app.on_event("startup")
 def on_startup():
@@ -40,6 +130,7 @@ def on_startup():
     if os.getenv("AUTO_MIGRATE", "false").lower() == "true":
         from .migrations import run_migrations
         run_migrations()
+    rescoring.pause_interrupted_jobs()
 
 def _get_question(question_id: str) -> dict:
     """Get question information from database"""
@@ -58,70 +149,111 @@ def _get_question(question_id: str) -> dict:
     finally:
         sess.close()
 
+def _deadline_exceeded(exc: DeadlineExceeded, deadline: Deadline) -> HTTPException:
+    logger.warning(f"Evaluation deadline exceeded: stage={exc.stage}, budget={exc.budget:.2f}s, stages={deadline.stage_timings}")
+    return HTTPException(status_code=504, detail=str(exc), headers={"X-Deadline-Stage": exc.stage})
+
+
 @app.post("/evaluate/short-answer", response_model=EvaluationResult)
-def evaluate(req: EvaluationRequest, current_user: dict = Depends(require_any)):
+def evaluate(
+    req: EvaluationRequest,
+    request: Request,
+    current_user: dict = Depends(require_any),
+    request_timeout: Optional[str] = Header(None, alias=DEADLINE_HEADER),
+    include_timings: Optional[str] = Header(None, alias=TIMINGS_HEADER)
+):
     """
     Evaluate student answer (student answering question)
     - Students: can answer questions, system automatically records student_id
     - Teachers: can also use this endpoint (for testing or answering on behalf)
+    - X-Request-Timeout (seconds) sets the deadline budgeted across the pipeline stages;
+      once it passes, downstream stages are cancelled and 504 reports the stage that blew it
+    - Degenerate answers caught by the local pre-screen are scored without an LLM call
+      and tagged with the pre-screen model_version
+    - X-Include-Timings: true returns per-stage latency (ms) in `timings`; every request
+      also logs one structured stage_timings line
     """
-    q = _get_question(req.question_id)
-    if not q:
-        raise HTTPException(404, "question_id not found")
-    
-    rubric, rubric_version = get_rubric(
-        req.question_id, 
-        q["topic"], 
-        req.rubric_json,
-        question_text=q["text"]
-    )
-    
-    try:
-        llm_json = call_llm(q["text"], rubric, req.student_answer)
-    except Exception as exc:
-        logger.error(f"LLM call failed: {exc}")
-        raise HTTPException(status_code=502, detail=f"LLM call failed: {exc}") from exc
+    deadline = deadline_from_header(request_timeout)
+    persist_reserve = persist_reserve_seconds()
+    status_code, model_tier = 500, None
+    EVALUATIONS_IN_FLIGHT.inc()
 
     try:
-        llm_payload = LLMScorePayload(**llm_json)
-    except ValidationError as exc:
-        logger.error(f"LLM response validation failed: {exc.errors()}")
-        raise HTTPException(status_code=502, detail=f"LLM returned invalid payload: {exc.errors()}") from exc
-
-    provider, model_id, model_version = _model_metadata()
-
-    result = EvaluationResult(
-        question_id=req.question_id,
-        rubric_version=rubric_version,
-        provider=provider,
-        model_id=model_id,
-        model_version=model_version,
-        raw_llm_output=llm_json,
-        **llm_payload.model_dump()
-    )
+        with deadline.stage("question_lookup"):
+            q = _get_question(req.question_id)
+        if not q:
+            raise HTTPException(404, "question_id not found")
 
-    sess = SessionLocal()
-    try:
-        student_id = current_user["id"] if current_user["role"] == "student" else None
-        
-        ae = AnswerEvaluation(
-            question_id=req.question_id,
-            student_id=student_id,
-            student_answer=req.student_answer,
-            auto_score=result.total_score,
-            final_score=None,
-            dimension_scores_json=result.dimension_breakdown,
-            model_version=result.model_version,
-            rubric_version=result.rubric_version,
-            raw_llm_output=result.raw_llm_output
-        )
-        sess.add(ae)
-        sess.commit()
-    except SQLAlchemyError as exc:
-        sess.rollback()
-        raise HTTPException(status_code=500, detail="Failed to persist evaluation result") from exc
+        with deadline.stage("rubric_resolution"):
+            rubric, rubric_version = get_rubric(
+                req.question_id,
+                q["topic"],
+                req.rubric_json,
+                question_text=q["text"],
+                # Only budgeted when a rubric has to be generated by the LLM
+                timeout=lambda: deadline.timeout_for("rubric_resolution", reserve=persist_reserve, share=0.5)
+            )
+
+        scored = None
+        if prescreen_enabled():
+            with deadline.stage("prescreen"):
+                scored = prescreen_score(req.question_id, q["text"], rubric, rubric_version, req.student_answer)
+
+        if scored is not None:
+            logger.info(f"Pre-screen scored answer locally: question_id={req.question_id}, "
+                        f"verdict={scored.result.raw_llm_output['prescreen']['verdict']}")
+            model_tier = "prescreen"
+        else:
+            llm_stats = LLMCallStats()
+            with deadline.stage("llm_scoring"):
+                try:
+                    llm_json = call_llm(
+                        q["text"], rubric, req.student_answer,
+                        timeout=deadline.timeout_for("llm_scoring", reserve=persist_reserve),
+                        stats=llm_stats,
+                        # Request-supplied rubrics are not versioned reliably, so only stored ones share a prefix
+                        prompt_cache_key=None if req.rubric_json else (req.question_id, rubric_version, rubric_fingerprint(rubric))
+                    )
+                except Exception as exc:
+                    # A timeout from the deadline's budget is a deadline failure, not a provider failure
+                    deadline.check("llm_scoring", reserve=persist_reserve)
+                    logger.error(f"LLM call failed: {exc}")
+                    raise HTTPException(status_code=502, detail=f"LLM call failed: {exc}") from exc
+            model_tier = llm_stats.tier
+
+            with deadline.stage("validation"):
+                try:
+                    scored = scored_payload(req.question_id, rubric_version, llm_json, model_tier, llm_stats)
+                except ValidationError as exc:
+                    logger.error(f"LLM response validation failed: {exc.errors()}")
+                    raise HTTPException(status_code=502, detail=f"LLM returned invalid payload: {exc.errors()}") from exc
+        result = scored.result
+
+        with deadline.stage("persistence", check_after=False):
+            sess = SessionLocal()
+            try:
+                student_id = current_user["id"] if current_user["role"] == "student" else None
+                sess.add(AnswerEvaluation(**scored.evaluation_row(student_id, req.student_answer)))
+                sess.commit()
+            except SQLAlchemyError as exc:
+                sess.rollback()
+                raise HTTPException(status_code=500, detail="Failed to persist evaluation result") from exc
+            finally:
+                sess.close()
+        status_code = 200
+    except DeadlineExceeded as exc:
+        status_code = 504
+        raise _deadline_exceeded(exc, deadline) from exc
+    except HTTPException as exc:
+        status_code = exc.status_code
+        raise
     finally:
-        sess.close()
+        EVALUATIONS_IN_FLIGHT.dec()
+        timings = stage_breakdown(request, deadline)
+        log_stage_timings("/evaluate/short-answer", status_code, timings,
+                          question_id=req.question_id, model_tier=model_tier)
+    if timings_requested(include_timings):
+        result.timings = timings
     return result
 
 
@@ -162,6 +294,48 @@ def save_review(req: ReviewSaveRequest, current_user: dict = Depends(require_tea
         sess.close()
 
 
+@app.post("/review/save-batch", response_model=ReviewBatchResponse)
+def save_review_batch(req: ReviewBatchRequest, current_user: dict = Depends(require_teacher)):
+    """
+    Save many reviews at once (Teacher)
+    - One lookup, one bulk UPDATE and one commit for the whole batch
+    - Unknown evaluation ids and repeated ids are reported per item; the other items are still saved
+    """
+    sess = SessionLocal()
+    try:
+        ids = {item.evaluation_id for item in req.items}
+        auto_scores = dict(sess.execute(
+            select(AnswerEvaluation.id, AnswerEvaluation.auto_score).where(AnswerEvaluation.id.in_(ids))
+        ).all())
+
+        results, updates, seen = [], [], set()
+        for item in req.items:
+            if item.evaluation_id not in auto_scores:
+                results.append(ReviewBatchItemResult(evaluation_id=item.evaluation_id, status="not_found",
+                                                     error=f"Evaluation {item.evaluation_id} not found"))
+            elif item.evaluation_id in seen:
+                results.append(ReviewBatchItemResult(evaluation_id=item.evaluation_id, status="duplicate",
+                                                     error=f"Evaluation {item.evaluation_id} appears more than once"))
+            else:
+                seen.add(item.evaluation_id)
+                updates.append({"id": item.evaluation_id, "final_score": item.final_score,
+                                "reviewer_id": current_user["id"], "review_notes": item.review_notes})
+                results.append(ReviewBatchItemResult(evaluation_id=item.evaluation_id, status="saved",
+                                                     auto_score=auto_scores[item.evaluation_id],
+                                                     final_score=item.final_score))
+        if updates:
+            sess.execute(update(AnswerEvaluation), updates)
+            sess.commit()
+
+        return ReviewBatchResponse(total=len(results), saved=len(updates), failed=len(results) - len(updates),
+                                   items=results)
+    except Exception as exc:
+        sess.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to save reviews: {exc}") from exc
+    finally:
+        sess.close()
+
+
 @app.get("/evaluations", response_model=EvaluationListResponse)
 def list_evaluations(
     question_id: Optional[str] = Query(None, description="Filter by question ID"),
@@ -199,7 +373,9 @@ def list_evaluations(
                 final_score=item.final_score,
                 created_at=item.created_at,
                 updated_at=item.updated_at,
-                reviewer_id=item.reviewer_id
+                reviewer_id=item.reviewer_id,
+                student_answer=item.student_answer,
+                review_notes=item.review_notes
             )
             for item in items
         ]
@@ -214,6 +390,40 @@ def list_evaluations(
         sess.close()
 
 
+@app.get("/evaluations/export")
+def export_evaluations(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson|parquet)$", description="csv, ndjson or parquet"),
+    gzip: bool = Query(False, description="Gzip the file (Parquet: gzip column compression instead of snappy)"),
+    question_id: Optional[str] = Query(None, description="Filter by question ID"),
+    student_id: Optional[str] = Query(None, description="Filter by student ID"),
+    created_from: Optional[datetime] = Query(None, description="Only evaluations created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Only evaluations created before this time"),
+    reviewed: Optional[bool] = Query(None, description="true: reviewed by a teacher, false: not yet reviewed"),
+    include_raw: bool = Query(False, description="Include raw_llm_output"),
+    current_user: dict = Depends(require_any)
+):
+    """
+    Export evaluations as a file download, streamed in id order
+    - Students: only their own evaluations
+    - Teachers: all evaluations
+    """
+    if current_user["role"] == "student":
+        student_id = current_user["id"]
+    try:
+        check_format(fmt)
+    except ExportUnavailableError as exc:
+        raise HTTPException(400, str(exc)) from exc
+    filters = ExportFilters(question_id=question_id, student_id=student_id, created_from=created_from,
+                            created_to=created_to, reviewed=reviewed)
+    filename = export_filename(fmt, gzip)
+    media_type = "application/gzip" if filename.endswith(".gz") else EXPORT_FORMATS[fmt][0]
+    return StreamingResponse(
+        iter_export(filters, fmt, compress=gzip, include_raw=include_raw),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @app.get("/evaluations/{evaluation_id}", response_model=EvaluationDetail)
 def get_evaluation_detail(evaluation_id: int, current_user: dict = Depends(require_any)):
     """
@@ -243,10 +453,16 @@ def get_evaluation_detail(evaluation_id: int, current_user: dict = Depends(requi
             final_score=evaluation.final_score,
             dimension_scores_json=evaluation.dimension_scores_json,
             model_version=evaluation.model_version,
+            model_tier=evaluation.model_tier,
             rubric_version=evaluation.rubric_version,
             review_notes=evaluation.review_notes,
             reviewer_id=evaluation.reviewer_id,
             raw_llm_output=evaluation.raw_llm_output,
+            prompt_tokens=evaluation.prompt_tokens,
+            completion_tokens=evaluation.completion_tokens,
+            cached_tokens=evaluation.cached_tokens,
+            llm_latency_ms=evaluation.llm_latency_ms,
+            llm_retries=evaluation.llm_retries,
             created_at=evaluation.created_at,
             updated_at=evaluation.updated_at
         )
@@ -386,6 +602,38 @@ def create_question(req: QuestionCreate, current_user: dict = Depends(require_te
         sess.close()
 
 
+async def _bulk_import(kind: str, request: Request, fmt: Optional[str], on_conflict: str, batch_size: int,
+                       current_user: dict) -> BulkImportResponse:
+    """Run an importer over the request body as it streams in; batches committed before an error are kept"""
+    importer = IMPORTERS[kind](on_conflict=on_conflict, batch_size=batch_size, created_by=current_user["id"])
+    fmt = fmt or format_from_content_type(request.headers.get("content-type"))
+    try:
+        report = await run_in_threadpool(importer.run_stream, sync_body_chunks(request), fmt)
+    except ValueError as exc:
+        raise HTTPException(400, f"Invalid {kind} file after {importer.report.total} rows: {exc}") from exc
+    logger.info(f"Imported {kind}: total={report.total}, created={report.created}, updated={report.updated}, "
+                f"skipped={report.skipped}, failed={report.failed}")
+    return BulkImportResponse(**report.as_dict())
+
+
+@app.post("/questions/import", response_model=BulkImportResponse)
+async def import_questions(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(jsonl|csv)$",
+                               description="jsonl or csv (default: from Content-Type)"),
+    on_conflict: str = Query("update", pattern="^(update|skip|error)$",
+                             description="Existing question_id: update it, skip the row or report an error"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000, description="Rows per transaction"),
+    current_user: dict = Depends(require_teacher)
+):
+    """
+    Bulk import questions from a JSONL or CSV request body (Teacher)
+    - Rows: question_id, text, topic (optional); upserted by question_id
+    - Invalid rows are reported per line and do not stop the import
+    """
+    return await _bulk_import("questions", request, fmt, on_conflict, batch_size, current_user)
+
+
 @app.put("/questions/{question_id}", response_model=QuestionItem)
 def update_question(question_id: str, req: QuestionUpdate, current_user: dict = Depends(require_teacher)):
     """
@@ -407,6 +655,7 @@ def update_question(question_id: str, req: QuestionUpdate, current_user: dict =
         
         sess.commit()
         sess.refresh(question)
+        prompt_prefix_cache.invalidate(question_id)
         
         return QuestionItem(
             id=question.id,
@@ -444,6 +693,7 @@ def delete_question(question_id: str, current_user: dict = Depends(require_teach
         
         sess.delete(question)
         sess.commit()
+        prompt_prefix_cache.invalidate(question_id)
         
         return None
     except HTTPException:
@@ -531,6 +781,7 @@ def create_rubric(question_id: str, req: RubricCreate, current_user: dict = Depe
         sess.add(rubric)
         sess.commit()
         sess.refresh(rubric)
+        prompt_prefix_cache.invalidate(question_id)
         
         return RubricDetail(
             id=rubric.id,
@@ -550,6 +801,25 @@ def create_rubric(question_id: str, req: RubricCreate, current_user: dict = Depe
         sess.close()
 
 
+@app.post("/rubrics/import", response_model=BulkImportResponse)
+async def import_rubrics(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(jsonl|csv)$",
+                               description="jsonl or csv (default: from Content-Type)"),
+    on_conflict: str = Query("update", pattern="^(update|skip|error)$",
+                             description="Existing (question_id, version): update it, skip the row or report an error"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000, description="Rows per transaction"),
+    current_user: dict = Depends(require_teacher)
+):
+    """
+    Bulk import rubrics from a JSONL or CSV request body (Teacher)
+    - Rows: question_id, version, rubric_json (a JSON string in CSV), is_active (optional)
+    - Upserted by (question_id, version); the question must exist
+    - is_active=true deactivates the question's other rubrics
+    """
+    return await _bulk_import("rubrics", request, fmt, on_conflict, batch_size, current_user)
+
+
 @app.put("/rubrics/{rubric_id}", response_model=RubricDetail)
 def update_rubric(rubric_id: int, req: RubricUpdate, current_user: dict = Depends(require_teacher)):
     """
@@ -577,6 +847,8 @@ def update_rubric(rubric_id: int, req: RubricUpdate, current_user: dict = Depend
         
         sess.commit()
         sess.refresh(rubric)
+        # rubric_json may change under the same version
+        prompt_prefix_cache.invalidate(rubric.question_id)
         
         return RubricDetail(
             id=rubric.id,
@@ -597,10 +869,15 @@ def update_rubric(rubric_id: int, req: RubricUpdate, current_user: dict = Depend
 
 
 @app.post("/rubrics/{rubric_id}/activate", response_model=RubricActivateResponse)
-def activate_rubric(rubric_id: int, current_user: dict = Depends(require_teacher)):
+def activate_rubric(
+    rubric_id: int,
+    rescore: bool = Query(False, description="Start a job rescoring the question's evaluations with this rubric"),
+    current_user: dict = Depends(require_teacher)
+):
     """
     Activate rubric (Teacher)
     - Teachers: can activate rubrics (while deactivating other active rubrics for the same question)
+    - rescore=true also starts a rescoring job with default settings (see /rubrics/{rubric_id}/rescore)
     """
     sess = SessionLocal()
     try:
@@ -617,13 +894,21 @@ def activate_rubric(rubric_id: int, current_user: dict = Depends(require_teacher
         
         rubric.is_active = True
         sess.commit()
+        prompt_prefix_cache.invalidate(rubric.question_id)
+        
+        rescore_job_id = None
+        if rescore:
+            job = rescoring.create_job(rubric.id, current_user["id"])
+            rescoring.start_job(job.id)
+            rescore_job_id = job.id
         
         return RubricActivateResponse(
             success=True,
             message=f"Rubric {rubric.version} activated successfully",
             rubric_id=rubric.id,
             question_id=rubric.question_id,
-            version=rubric.version
+            version=rubric.version,
+            rescore_job_id=rescore_job_id
         )
     except HTTPException:
         raise
@@ -689,13 +974,46 @@ def create_user(req: UserCreate, current_user: dict = Depends(require_teacher)):
     finally:
         sess.close()
 
-@app.get("/users", response_model=List[UserItem])
-def list_users(current_user: dict = Depends(require_teacher)):
+@app.post("/users/import", response_model=BulkImportResponse)
+async def import_users(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(jsonl|csv)$",
+                               description="jsonl or csv (default: from Content-Type)"),
+    on_conflict: str = Query("update", pattern="^(update|skip|error)$",
+                             description="Existing user id: update it, skip the row or report an error"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000, description="Rows per transaction"),
+    current_user: dict = Depends(require_teacher)
+):
+    """
+    Bulk import users from a JSONL or CSV roster (Teachers only)
+    - Rows: id, username, role (optional, student or teacher; new users default to student)
+    - Upserted by id; invalid rows are reported per line and do not stop the import
+    """
+    return await _bulk_import("users", request, fmt, on_conflict, batch_size, current_user)
+
+@app.get("/users", response_model=UserListResponse)
+def list_users(
+    role: Optional[str] = Query(None, pattern="^(student|teacher)$", description="Filter by role"),
+    search: Optional[str] = Query(None, min_length=1, description="Case-insensitive substring of id or username"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, description="Offset for pagination"),
+    current_user: dict = Depends(require_teacher)
+):
     """Get user list (Teachers only)"""
     sess = SessionLocal()
     try:
-        users = sess.query(User).order_by(User.created_at.desc()).all()
-        return [UserItem(id=u.id, username=u.username, role=u.role, created_at=u.created_at) for u in users]
+        query = sess.query(User)
+        if role:
+            query = query.filter(User.role == role)
+        if search:
+            query = query.filter(or_(User.id.icontains(search, autoescape=True),
+                                     User.username.icontains(search, autoescape=True)))
+        total = query.count()
+        users = query.order_by(User.created_at.desc(), User.id).offset(offset).limit(limit).all()
+        return UserListResponse(
+            total=total,
+            items=[UserItem(id=u.id, username=u.username, role=u.role, created_at=u.created_at) for u in users]
+        )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to list users: {exc}") from exc
     finally:
@@ -716,3 +1034,274 @@ def get_user(user_id: str, current_user: dict = Depends(require_teacher)):
         raise HTTPException(status_code=500, detail=f"Failed to get user: {exc}") from exc
     finally:
         sess.close()
+
+
+# ==================== Rescoring Endpoints ====================
+
+def _rescore_job_item(job) -> RescoreJobItem:
+    return RescoreJobItem(
+        id=job.id,
+        question_id=job.question_id,
+        rubric_id=job.rubric_id,
+        rubric_version=job.rubric_version,
+        status=job.status,
+        concurrency=job.concurrency,
+        chunk_size=job.chunk_size,
+        max_rate=job.max_rate,
+        total=job.total,
+        succeeded=job.succeeded,
+        failed=job.failed,
+        last_evaluation_id=job.last_evaluation_id,
+        last_error=job.last_error,
+        owner=job.owner,
+        heartbeat_at=job.heartbeat_at,
+        created_by=job.created_by,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        finished_at=job.finished_at
+    )
+
+
+def _rescore_transition(job_id: int, action):
+    try:
+        return _rescore_job_item(action(job_id))
+    except LookupError as exc:
+        raise HTTPException(404, str(exc)) from exc
+    except rescoring.RescoreJobError as exc:
+        raise HTTPException(409, str(exc)) from exc
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to update rescore job: {exc}") from exc
+
+
+@app.post("/rubrics/{rubric_id}/rescore", response_model=RescoreJobItem, status_code=202)
+def create_rescore_job(rubric_id: int, req: Optional[RescoreJobCreate] = None,
+                       current_user: dict = Depends(require_teacher)):
+    """
+    Rescore historical evaluations with a rubric (Teacher)
+    - Selects the question's original evaluations scored under another rubric version
+    - Writes a new evaluation row per answer (rubric_version of this rubric, rescored_from_id
+      pointing at the original); original rows are left unchanged
+    - Runs in the background in keyset-ordered chunks with bounded concurrency and an optional rate limit
+    """
+    req = req or RescoreJobCreate()
+    try:
+        job = rescoring.create_job(rubric_id, current_user["id"], concurrency=req.concurrency,
+                                   chunk_size=req.chunk_size, max_rate=req.max_rate)
+    except LookupError as exc:
+        raise HTTPException(404, str(exc)) from exc
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to create rescore job: {exc}") from exc
+    return _rescore_transition(job.id, rescoring.start_job)
+
+
+@app.get("/rescore-jobs", response_model=RescoreJobListResponse)
+def list_rescore_jobs(
+    question_id: Optional[str] = Query(None, description="Filter by question ID"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(require_teacher)
+):
+    """List rescoring jobs, newest first (Teacher)"""
+    try:
+        jobs = rescoring.list_jobs(question_id, limit)
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to list rescore jobs: {exc}") from exc
+    return RescoreJobListResponse(total=len(jobs), items=[_rescore_job_item(job) for job in jobs])
+
+
+@app.get("/rescore-jobs/{job_id}", response_model=RescoreJobItem)
+def get_rescore_job(job_id: int, current_user: dict = Depends(require_teacher)):
+    """Rescoring job progress (Teacher)"""
+    job = rescoring.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Rescore job {job_id} not found")
+    return _rescore_job_item(job)
+
+
+@app.post("/rescore-jobs/{job_id}/pause", response_model=RescoreJobItem)
+def pause_rescore_job(job_id: int, current_user: dict = Depends(require_teacher)):
+    """Pause a running job after its in-flight answers are checkpointed (Teacher)"""
+    return _rescore_transition(job_id, lambda i: rescoring.stop_job(i, "paused"))
+
+
+@app.post("/rescore-jobs/{job_id}/resume", response_model=RescoreJobItem)
+def resume_rescore_job(job_id: int, current_user: dict = Depends(require_teacher)):
+    """Resume a paused or failed job from its checkpoint (Teacher)"""
+    return _rescore_transition(job_id, rescoring.start_job)
+
+
+@app.post("/rescore-jobs/{job_id}/cancel", response_model=RescoreJobItem)
+def cancel_rescore_job(job_id: int, current_user: dict = Depends(require_teacher)):
+    """Cancel a job; rows already written are kept (Teacher)"""
+    return _rescore_transition(job_id, lambda i: rescoring.stop_job(i, "cancelled"))
+
+
+# ==================== Statistics Endpoints ====================
+
+@app.get("/stats/cascade", response_model=CascadeStatsResponse)
+def get_cascade_stats(current_user: dict = Depends(require_teacher)):
+    """
+    Model cascade statistics (Teacher)
+    - Escalation rate, reasons and latency savings since process start
+    - Persisted evaluation counts per model tier
+    """
+    sess = SessionLocal()
+    try:
+        rows = sess.query(AnswerEvaluation.model_tier, func.count(AnswerEvaluation.id)).group_by(
+            AnswerEvaluation.model_tier
+        ).all()
+        tier_counts = {tier or "unknown": count for tier, count in rows}
+        small_model, large_model = cascade_models()
+        return CascadeStatsResponse(
+            enabled=cascade_enabled(),
+            small_model_id=small_model or None,
+            large_model_id=large_model,
+            tier_counts=tier_counts,
+            **cascade_stats.snapshot()
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to get cascade stats: {exc}") from exc
+    finally:
+        sess.close()
+
+
+@app.get("/stats/prompt-cache", response_model=PromptCacheStatsResponse)
+def get_prompt_cache_stats(current_user: dict = Depends(require_teacher)):
+    """
+    Prompt prefix cache statistics (Teacher)
+    - Local prefix cache hit rate and provider-reported cached prompt tokens since process start
+    """
+    return PromptCacheStatsResponse(**prompt_prefix_cache.snapshot())
+
+
+@app.get("/stats/usage", response_model=UsageStatsResponse)
+def get_usage_stats(
+    question_id: Optional[str] = Query(None, description="Filter by question ID"),
+    created_from: Optional[datetime] = Query(None, description="Only evaluations created at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Only evaluations created before this time"),
+    current_user: dict = Depends(require_teacher)
+):
+    """
+    LLM token usage, latency and estimated cost (Teacher)
+    - Aggregated per question, rubric version and model_version
+    - Costs use the prices in api/pricing.py (override with LLM_PRICING_JSON)
+    """
+    sess = SessionLocal()
+    try:
+        ae = AnswerEvaluation
+        query = sess.query(
+            ae.question_id,
+            ae.rubric_version,
+            ae.model_version,
+            func.count(ae.id),
+            func.count(ae.prompt_tokens),
+            func.coalesce(func.sum(ae.prompt_tokens), 0),
+            func.coalesce(func.sum(ae.completion_tokens), 0),
+            func.coalesce(func.sum(ae.cached_tokens), 0),
+            func.coalesce(func.sum(ae.llm_retries), 0),
+            func.avg(ae.llm_latency_ms),
+            func.max(ae.llm_latency_ms)
+        )
+        if question_id:
+            query = query.filter(ae.question_id == question_id)
+        if created_from:
+            query = query.filter(ae.created_at >= created_from)
+        if created_to:
+            query = query.filter(ae.created_at < created_to)
+        rows = query.group_by(ae.question_id, ae.rubric_version, ae.model_version).all()
+
+        pricing = load_pricing()
+        items, unpriced = [], set()
+        for (q_id, rubric_version, model_version, evaluations, llm_calls,
+             prompt_tokens, completion_tokens, cached_tokens, retries, avg_ms, max_ms) in rows:
+            cost = None
+            if llm_calls:
+                cost = estimate_cost(model_version, int(prompt_tokens), int(completion_tokens), int(cached_tokens), pricing)
+                if cost is None:
+                    unpriced.add(model_version or "unknown")
+            items.append(UsageStatsItem(
+                question_id=q_id,
+                rubric_version=rubric_version,
+                model_version=model_version,
+                evaluations=evaluations,
+                llm_calls=llm_calls,
+                prompt_tokens=int(prompt_tokens),
+                completion_tokens=int(completion_tokens),
+                cached_tokens=int(cached_tokens),
+                retries=int(retries),
+                avg_latency_ms=float(avg_ms) if avg_ms is not None else None,
+                max_latency_ms=float(max_ms) if max_ms is not None else None,
+                estimated_cost_usd=cost
+            ))
+        items.sort(key=lambda item: item.estimated_cost_usd or 0.0, reverse=True)
+
+        return UsageStatsResponse(
+            total_evaluations=sum(item.evaluations for item in items),
+            total_prompt_tokens=sum(item.prompt_tokens for item in items),
+            total_completion_tokens=sum(item.completion_tokens for item in items),
+            total_cached_tokens=sum(item.cached_tokens for item in items),
+            total_estimated_cost_usd=sum(item.estimated_cost_usd or 0.0 for item in items),
+            unpriced_models=sorted(unpriced),
+            items=items
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Failed to get usage stats: {exc}") from exc
+    finally:
+        sess.close()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics in text exposition format
+    - Async so the thread pool gauges are sampled on the event loop thread
+    """
+    update_threadpool_gauges()
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+
+@app.get("/stats/slow-queries", response_model=SlowQueryResponse)
+def get_slow_query_stats(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of statements"),
+    slow_only: bool = Query(True, description="Only statements that exceeded the threshold"),
+    current_user: dict = Depends(require_teacher)
+):
+    """
+    SQL statements aggregated by normalized text, slowest total time first (Teacher)
+    - routes counts the endpoints that issued slow executions; plan is the captured EXPLAIN output
+    """
+    items = query_log.snapshot(limit=limit, slow_only=slow_only)
+    return SlowQueryResponse(
+        threshold_ms=slow_query_threshold_ms(),
+        items=[SlowQueryItem(**item) for item in items]
+    )
+
+# ==================== Profiling Endpoints ====================
+
+@app.get("/profiles", response_model=ProfileListResponse)
+def list_profiles(current_user: dict = Depends(require_teacher)):
+    """
+    List stored request profiles (Teacher)
+    - .prof: pstats (python -m pstats, snakeviz); .speedscope.json: https://www.speedscope.app
+    - .tracemalloc: tracemalloc.Snapshot.load(); .memory.txt: top allocation growth
+    """
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return ProfileListResponse(total=0, items=[])
+    items = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            items.append(ProfileItem(name=name, size_bytes=stat.st_size, created_at=datetime.fromtimestamp(stat.st_mtime)))
+    return ProfileListResponse(total=len(items), items=items)
+
+
+@app.get("/profiles/{name}")
+def download_profile(name: str, current_user: dict = Depends(require_teacher)):
+    """Download a stored profile file (Teacher)"""
+    directory = os.path.abspath(profile_dir())
+    path = os.path.abspath(os.path.join(directory, name))
+    if os.path.dirname(path) != directory or not os.path.isfile(path):
+        raise HTTPException(404, f"Profile {name} not found")
+    return FileResponse(path, filename=name)
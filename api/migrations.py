@@ -2,6 +2,7 @@
 """
 Database migration script: migrate hardcoded QUESTION_BANK to database
 """
+from sqlalchemy import inspect, text
 from sqlalchemy.exc import IntegrityError
 from .db import SessionLocal, Question, QuestionRubric, Base, engine
 from .rubric_service import TOPIC_DEFAULT
@@ -11,6 +12,35 @@ QUESTION_BANK = {
     "Q2105": {"text": "Briefly describe how to implement reliable dependency management and failure recovery in Airflow.", "topic": "airflow"}
 }
 
+# Columns added to existing tables after their creation (create_all does not alter tables)
+ADDED_COLUMNS = [
+    ("answer_evaluations", "model_tier", "VARCHAR(20)"),
+    ("answer_evaluations", "prompt_tokens", "INTEGER"),
+    ("answer_evaluations", "completion_tokens", "INTEGER"),
+    ("answer_evaluations", "cached_tokens", "INTEGER"),
+    ("answer_evaluations", "llm_latency_ms", "FLOAT"),
+    ("answer_evaluations", "llm_retries", "INTEGER"),
+    ("answer_evaluations", "rescored_from_id", "INTEGER"),
+    ("rescore_jobs", "owner", "VARCHAR(100)"),
+    ("rescore_jobs", "heartbeat_at", "TIMESTAMP"),
+]
+
+
+def migrate_add_columns():
+    """Add columns introduced after the initial schema to existing tables"""
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table, column, ddl_type in ADDED_COLUMNS:
+            if table not in existing_tables:
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table)}
+            if column in columns:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+            print(f"Added column {table}.{column}")
+    print("Column migration completed")
+
 
 def migrate_questions():
     """Migrate question data to database"""
@@ -82,6 +112,9 @@ def run_migrations():
     print("Database tables created/verified")
     print("-" * 50)
     
+    migrate_add_columns()
+    print("-" * 50)
+    
     migrate_questions()
     print("-" * 50)
     
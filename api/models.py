@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field, constr, model_validator
+import json
+from pydantic import BaseModel, Field, constr, field_validator, model_validator
 from typing import Dict, List, Optional
 from datetime import datetime
 
@@ -30,7 +31,9 @@ class EvaluationResult(LLMScorePayload):
     provider: str
     model_id: str
     model_version: str
+    model_tier: Optional[str] = None
     raw_llm_output: dict
+    timings: Optional[Dict[str, float]] = None
 
 class ReviewSaveRequest(BaseModel):
     evaluation_id: int
@@ -45,6 +48,28 @@ class ReviewSaveResponse(BaseModel):
     auto_score: Optional[float]
     final_score: float
 
+class ReviewBatchItem(BaseModel):
+    evaluation_id: int
+    final_score: float = Field(ge=0, le=10)
+    review_notes: Optional[str] = None
+
+class ReviewBatchRequest(BaseModel):
+    items: List[ReviewBatchItem] = Field(..., min_length=1, max_length=500)
+
+class ReviewBatchItemResult(BaseModel):
+    evaluation_id: int
+    # saved, not_found or duplicate
+    status: str
+    auto_score: Optional[float] = None
+    final_score: Optional[float] = None
+    error: Optional[str] = None
+
+class ReviewBatchResponse(BaseModel):
+    total: int
+    saved: int
+    failed: int
+    items: List[ReviewBatchItemResult]
+
 class EvaluationListItem(BaseModel):
     id: int
     question_id: str
@@ -54,19 +79,95 @@ class EvaluationListItem(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime]
     reviewer_id: Optional[str]
+    student_answer: Optional[str] = None
+    review_notes: Optional[str] = None
 
 class EvaluationDetail(EvaluationListItem):
     student_answer: str
     dimension_scores_json: Optional[Dict[str, float]]
     model_version: Optional[str]
+    model_tier: Optional[str] = None
     rubric_version: Optional[str]
     review_notes: Optional[str]
     raw_llm_output: Optional[dict]
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    llm_latency_ms: Optional[float] = None
+    llm_retries: Optional[int] = None
 
 class EvaluationListResponse(BaseModel):
     total: int
     items: List[EvaluationListItem]
 
+class CascadeStatsResponse(BaseModel):
+    enabled: bool
+    small_model_id: Optional[str]
+    large_model_id: str
+    total_calls: int
+    escalated_calls: int
+    escalation_rate: float
+    escalation_reasons: Dict[str, int]
+    avg_small_latency_ms: float
+    avg_large_latency_ms: float
+    estimated_latency_saved_ms: float
+    tier_counts: Dict[str, int]
+
+class PromptCacheStatsResponse(BaseModel):
+    entries: int
+    prefix_hits: int
+    prefix_misses: int
+    prefix_hit_rate: float
+    provider_prompt_tokens: int
+    provider_cached_tokens: int
+    provider_cached_ratio: float
+
+class UsageStatsItem(BaseModel):
+    question_id: Optional[str]
+    rubric_version: Optional[str]
+    model_version: Optional[str]
+    evaluations: int
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    retries: int
+    avg_latency_ms: Optional[float]
+    max_latency_ms: Optional[float]
+    estimated_cost_usd: Optional[float]
+
+class UsageStatsResponse(BaseModel):
+    total_evaluations: int
+    total_prompt_tokens: int
+    total_completion_tokens: int
+    total_cached_tokens: int
+    total_estimated_cost_usd: float
+    unpriced_models: List[str]
+    items: List[UsageStatsItem]
+
+class SlowQueryItem(BaseModel):
+    statement: str
+    count: int
+    slow_count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    routes: Dict[str, int]
+    plan: Optional[List[str]] = None
+
+class SlowQueryResponse(BaseModel):
+    threshold_ms: float
+    items: List[SlowQueryItem]
+
+class ProfileItem(BaseModel):
+    name: str
+    size_bytes: int
+    created_at: datetime
+
+class ProfileListResponse(BaseModel):
+    total: int
+    items: List[ProfileItem]
+
 
 # Question management models
 class QuestionCreate(BaseModel):
@@ -127,6 +228,84 @@ class RubricActivateResponse(BaseModel):
     rubric_id: int
     question_id: str
     version: str
+    rescore_job_id: Optional[int] = None
+
+
+# Bulk import models
+class QuestionImportRow(BaseModel):
+    question_id: constr(strip_whitespace=True, min_length=1, max_length=100)
+    text: str = Field(..., min_length=1)
+    topic: Optional[str] = Field(None, max_length=200)
+
+class RubricImportRow(BaseModel):
+    question_id: constr(strip_whitespace=True, min_length=1, max_length=100)
+    version: constr(strip_whitespace=True, min_length=1, max_length=50)
+    rubric_json: dict
+    is_active: bool = False
+
+    @field_validator("rubric_json", mode="before")
+    @classmethod
+    def parse_json_string(cls, value):
+        # CSV cells carry the rubric as a JSON string
+        return json.loads(value) if isinstance(value, str) else value
+
+class UserImportRow(BaseModel):
+    id: constr(strip_whitespace=True, min_length=1, max_length=100)
+    username: constr(strip_whitespace=True, min_length=1, max_length=200)
+    role: str = "student"
+
+    @field_validator("role")
+    @classmethod
+    def validate_role(cls, value):
+        if value not in ("student", "teacher"):
+            raise ValueError("Role must be 'student' or 'teacher'")
+        return value
+
+class BulkImportError(BaseModel):
+    line: int
+    key: Optional[str] = None
+    error: str
+
+class BulkImportResponse(BaseModel):
+    total: int
+    created: int
+    updated: int
+    skipped: int
+    failed: int
+    errors: List[BulkImportError]
+    errors_truncated: bool = False
+
+
+# Rescoring models
+class RescoreJobCreate(BaseModel):
+    concurrency: int = Field(4, ge=1, le=32)
+    chunk_size: int = Field(100, ge=1, le=1000)
+    max_rate: Optional[float] = Field(None, gt=0, description="Maximum answers scored per second")
+
+class RescoreJobItem(BaseModel):
+    id: int
+    question_id: str
+    rubric_id: int
+    rubric_version: str
+    status: str
+    concurrency: int
+    chunk_size: int
+    max_rate: Optional[float]
+    total: int
+    succeeded: int
+    failed: int
+    last_evaluation_id: int
+    last_error: Optional[str]
+    owner: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    created_by: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+class RescoreJobListResponse(BaseModel):
+    total: int
+    items: List[RescoreJobItem]
 
 
 # User models
@@ -143,3 +322,7 @@ class UserItem(BaseModel):
 
     class Config:
         from_attributes = True
+
+class UserListResponse(BaseModel):
+    total: int
+    items: List[UserItem]
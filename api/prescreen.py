@@ -0,0 +1,191 @@
+"""
+Local lexical pre-screening of student answers
+Degenerate answers (gibberish, copied question text, off-topic filler) are
+scored deterministically without paying for an LLM call
+"""
+import os
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+PRESCREEN_PROVIDER = "local"
+PRESCREEN_MODEL_ID = "prescreen-lexical-v1"
+PRESCREEN_MODEL_VERSION = "prescreen:lexical-v1"
+
+DEFAULT_DIMENSIONS = ["accuracy", "structure", "clarity", "business", "language"]
+
+# Latin words/numbers, or single CJK characters (CJK text has no word boundaries)
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+_LETTER_RE = re.compile(r"[^\W\d_]", re.UNICODE)
+# Digits and the symbols of numeric answers and formulas ("1024", "O(n^2)", "2^10 = 1024", "1, 2, 3")
+_FORMULA_CHARS = frozenset("0123456789+-*/^=<>()[]{}.,%:;|")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from had has have how i if in into is it its
+may more most my no not of on or our should so some such than that the their them then there these
+they this to too use used using very was we were what when where which while who why will with would
+you your about also just like one only other over out up
+""".split())
+
+CANNED_FEEDBACK = {
+    "gibberish": [
+        "The answer does not contain meaningful content; write complete sentences that address the question.",
+    ],
+    "copied_question": [
+        "The answer repeats the question; explain your own understanding instead of restating it.",
+    ],
+    "off_topic": [
+        "The answer does not address the question; focus on the concepts the question asks about.",
+    ],
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens (Latin words, single CJK characters)"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def content_tokens(tokens: List[str]) -> List[str]:
+    return [t for t in tokens if (t not in STOPWORDS and len(t) > 1) or _is_cjk(t)]
+
+
+def _is_cjk(token: str) -> bool:
+    return len(token) == 1 and "一" <= token <= "鿿"
+
+
+@dataclass
+class PrescreenResult:
+    verdict: Optional[str]
+    confidence: float
+    features: Dict[str, float] = field(default_factory=dict)
+    payload: Optional[dict] = None
+
+    @property
+    def should_skip_llm(self) -> bool:
+        return self.verdict is not None and self.confidence >= _min_confidence()
+
+
+def _min_confidence() -> float:
+    try:
+        return float(os.getenv("PRESCREEN_MIN_CONFIDENCE", "0.9"))
+    except ValueError:
+        return 0.9
+
+
+def prescreen_enabled() -> bool:
+    return os.getenv("PRESCREEN_ENABLED", "true").lower() == "true"
+
+
+def _duplicate_ngram_ratio(tokens: List[str], n: int = 3) -> float:
+    if len(tokens) < n + 1:
+        return 0.0
+    grams = [tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    return 1.0 - len(set(grams)) / len(grams)
+
+
+def _compression_ratio(text: str) -> float:
+    raw = text.encode("utf-8")
+    if not raw:
+        return 1.0
+    return len(zlib.compress(raw)) / len(raw)
+
+
+def _dominant_script(terms) -> Optional[str]:
+    if not terms:
+        return None
+    cjk = sum(1 for t in terms if _is_cjk(t))
+    return "cjk" if cjk * 2 > len(terms) else "latin"
+
+
+def _key_point_terms(rubric: dict) -> set:
+    terms = set()
+    for point in rubric.get("key_points") or []:
+        if isinstance(point, str):
+            terms.update(content_tokens(tokenize(point)))
+    return terms
+
+
+def extract_features(question_text: str, rubric: dict, student_answer: str) -> Dict[str, float]:
+    """Fast lexical features used by the pre-screen rules"""
+    text = student_answer.strip()
+    tokens = tokenize(text)
+    answer_terms = content_tokens(tokens)
+    answer_set = set(answer_terms)
+    question_set = set(content_tokens(tokenize(question_text or "")))
+    key_terms = _key_point_terms(rubric or {})
+
+    non_space = [c for c in text if not c.isspace()]
+    letters = sum(1 for c in non_space if _LETTER_RE.match(c))
+
+    return {
+        "char_count": float(len(text)),
+        "token_count": float(len(tokens)),
+        "content_token_count": float(len(answer_terms)),
+        "unique_ratio": len(set(tokens)) / len(tokens) if tokens else 0.0,
+        "duplicate_trigram_ratio": _duplicate_ngram_ratio(tokens),
+        "compression_ratio": _compression_ratio(text),
+        "letter_ratio": letters / len(non_space) if non_space else 0.0,
+        "formula_ratio": (letters + sum(1 for c in non_space if c in _FORMULA_CHARS)) / len(non_space)
+        if non_space else 0.0,
+        "question_overlap": len(answer_set & question_set) / len(answer_set) if answer_set else 0.0,
+        "question_coverage": len(answer_set & question_set) / len(question_set) if question_set else 0.0,
+        "novel_term_count": float(len(answer_set - question_set)),
+        "key_point_term_count": float(len(key_terms)),
+        "key_point_coverage": len(answer_set & key_terms) / len(key_terms) if key_terms else 0.0,
+        # Lexical overlap is meaningless when the answer and rubric are written in different scripts
+        "script_match": 1.0 if _dominant_script(answer_terms) == _dominant_script(key_terms) else 0.0,
+    }
+
+
+def _classify(features: Dict[str, float]):
+    """Return (verdict, confidence) for degenerate answers, (None, 0.0) otherwise"""
+    tokens = features["token_count"]
+
+    # Few letters is only noise when the rest is not digits or formula symbols either
+    if features["letter_ratio"] < 0.5 and features["formula_ratio"] < 0.8:
+        return "gibberish", 0.95
+    if tokens >= 12 and features["duplicate_trigram_ratio"] >= 0.6:
+        return "gibberish", 0.95
+    if features["char_count"] >= 80 and features["compression_ratio"] < 0.15:
+        return "gibberish", 0.95
+    if tokens >= 8 and features["unique_ratio"] < 0.2:
+        return "gibberish", 0.9
+
+    if features["question_coverage"] >= 0.8 and features["novel_term_count"] <= 3:
+        return "copied_question", 0.95
+
+    if (features["content_token_count"] >= 25 and features["key_point_term_count"] >= 3
+            and features["script_match"] and features["question_overlap"] == 0 and features["key_point_coverage"] == 0):
+        confidence = 0.9 if features["content_token_count"] >= 40 else 0.8
+        return "off_topic", confidence
+
+    return None, 0.0
+
+
+def _canned_payload(verdict: str, rubric: dict) -> dict:
+    dimensions = list((rubric or {}).get("dimensions") or DEFAULT_DIMENSIONS)
+    breakdown = {name: 0.0 for name in dimensions}
+    total = 0.0
+    if verdict == "off_topic" and "language" in breakdown:
+        # Coherent but irrelevant prose still earns minimal language credit
+        breakdown["language"] = 0.5
+        total = 0.5
+    key_points = [p for p in (rubric or {}).get("key_points") or [] if isinstance(p, str)]
+    return {
+        "total_score": total,
+        "dimension_breakdown": breakdown,
+        "key_points_evaluation": [f"{p} -> missing" for p in key_points],
+        "improvement_recommendations": list(CANNED_FEEDBACK[verdict]),
+    }
+
+
+def prescreen_answer(question_text: str, rubric: dict, student_answer: str) -> PrescreenResult:
+    """
+    Pre-screen an answer locally
+    The payload is only set for degenerate answers; callers skip the LLM when should_skip_llm is True
+    """
+    features = extract_features(question_text, rubric, student_answer)
+    verdict, confidence = _classify(features)
+    payload = _canned_payload(verdict, rubric) if verdict else None
+    return PrescreenResult(verdict=verdict, confidence=confidence, features=features, payload=payload)
@@ -0,0 +1,61 @@
+"""
+LLM pricing used to estimate the cost of persisted token usage
+Prices are USD per million tokens; override or extend them with LLM_PRICING_JSON, e.g.
+{"gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.6}}
+"""
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICING: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+}
+
+
+def load_pricing() -> Dict[str, Dict[str, float]]:
+    pricing = {model: dict(prices) for model, prices in DEFAULT_PRICING.items()}
+    raw = os.getenv("LLM_PRICING_JSON")
+    if raw:
+        try:
+            pricing.update(json.loads(raw))
+        except (ValueError, TypeError) as exc:
+            logger.warning(f"Ignoring invalid LLM_PRICING_JSON: {exc}")
+    return pricing
+
+
+def price_for(model: Optional[str], pricing: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[Dict[str, float]]:
+    """
+    Prices for a model id or model_version label
+    - "openai:gpt-4o-mini" and "openrouter:openai/gpt-4o-mini" resolve to "gpt-4o-mini"
+    """
+    if not model:
+        return None
+    pricing = pricing if pricing is not None else load_pricing()
+    candidates = [model, model.split(":", 1)[-1]]
+    candidates.append(candidates[-1].rsplit("/", 1)[-1])
+    for candidate in candidates:
+        if candidate in pricing:
+            return pricing[candidate]
+    return None
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0,
+                  pricing: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[float]:
+    """Estimated USD cost, None when the model has no configured price"""
+    prices = price_for(model, pricing)
+    if prices is None:
+        return None
+    cached = min(cached_tokens or 0, prompt_tokens or 0)
+    input_price = prices.get("input", 0.0)
+    cached_price = prices.get("cached_input", input_price)
+    return (
+        ((prompt_tokens or 0) - cached) * input_price
+        + cached * cached_price
+        + (completion_tokens or 0) * prices.get("output", 0.0)
+    ) / 1_000_000
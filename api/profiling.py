@@ -0,0 +1,238 @@
+"""
+On-demand request profiling
+Teachers request a profile with the X-Profile header or ?profile= query parameter
+(cpu, speedscope, memory; comma separated); PROFILE_SAMPLE_RATE additionally
+profiles a random share of all requests with cProfile. The endpoint function is
+run under the profiler in the thread that executes it, and results are stored
+in PROFILE_DIR for download through /profiles
+"""
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from fastapi.routing import APIRoute
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_MODES = ("cpu", "speedscope", "memory")
+
+
+def profiling_enabled() -> bool:
+    """Whether teachers may request profiles (PROFILING_ENABLED, default false)"""
+    return os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR", "profiles")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def sample_rate() -> float:
+    return min(1.0, max(0.0, _env_float("PROFILE_SAMPLE_RATE", 0.0)))
+
+
+def requested_modes(header_value: Optional[str], query_value: Optional[str]) -> Set[str]:
+    raw = ",".join(v for v in (header_value, query_value) if v)
+    modes = {m.strip().lower() for m in raw.split(",") if m.strip()}
+    if modes & {"1", "true", "yes"}:
+        modes = (modes - {"1", "true", "yes"}) | {"cpu"}
+    return modes & set(PROFILE_MODES)
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval (speedscope sampled profile)"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: List[tuple] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples.append(tuple(reversed(stack)))
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        frames: List[Dict[str, Any]] = []
+        index: Dict[tuple, int] = {}
+        samples = []
+        for stack in self.samples:
+            row = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                row.append(index[frame])
+            samples.append(row)
+        interval_ms = self.interval * 1000
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": len(samples) * interval_ms,
+                "samples": samples,
+                "weights": [interval_ms] * len(samples),
+            }],
+            "exporter": "semantic-scoring-agent",
+        }
+
+
+@dataclass
+class ProfileSession:
+    modes: Set[str]
+    route: str
+    profile_id: str = field(default_factory=lambda: f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+    profiler: Optional[cProfile.Profile] = None
+    sampler: Optional[StackSampler] = None
+    memory_before: Optional[tracemalloc.Snapshot] = None
+    memory_after: Optional[tracemalloc.Snapshot] = None
+    started_tracemalloc: bool = False
+    skipped: Optional[str] = None
+
+    def save(self) -> List[str]:
+        """Write the collected profiles; returns the stored file names"""
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        if self.profiler is not None:
+            name = f"{self.profile_id}.prof"
+            pstats.Stats(self.profiler).dump_stats(os.path.join(directory, name))
+            files.append(name)
+        if self.sampler is not None:
+            name = f"{self.profile_id}.speedscope.json"
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                json.dump(self.sampler.to_speedscope(self.route), f)
+            files.append(name)
+        if self.memory_after is not None:
+            name = f"{self.profile_id}.tracemalloc"
+            self.memory_after.dump(os.path.join(directory, name))
+            files.append(name)
+            top = self.memory_after.compare_to(self.memory_before, "lineno")[:25] if self.memory_before else []
+            summary = f"{self.profile_id}.memory.txt"
+            with open(os.path.join(directory, summary), "w", encoding="utf-8") as f:
+                f.write(f"Top allocation growth during {self.route}\n")
+                f.writelines(f"{stat}\n" for stat in top)
+            files.append(summary)
+        return files
+
+
+_active_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+# cProfile and tracemalloc are process-wide; one profiled request at a time
+_profile_lock = threading.Lock()
+
+
+def activate(session: ProfileSession):
+    return _active_session.set(session)
+
+
+def deactivate(token):
+    _active_session.reset(token)
+
+
+def should_sample() -> bool:
+    rate = sample_rate()
+    return rate > 0 and random.random() < rate
+
+
+def _start(session: ProfileSession) -> bool:
+    """Start the requested profilers; False when another request holds the profiler"""
+    if not _profile_lock.acquire(blocking=False):
+        session.skipped = "another request is being profiled"
+        return False
+    if "memory" in session.modes:
+        session.started_tracemalloc = not tracemalloc.is_tracing()
+        if session.started_tracemalloc:
+            tracemalloc.start(int(_env_float("PROFILE_TRACEMALLOC_FRAMES", 10)))
+        session.memory_before = tracemalloc.take_snapshot()
+    if "speedscope" in session.modes:
+        session.sampler = StackSampler(threading.get_ident(), _env_float("PROFILE_SAMPLE_INTERVAL_MS", 1.0) / 1000)
+        session.sampler.start()
+    if "cpu" in session.modes:
+        session.profiler = cProfile.Profile()
+        session.profiler.enable()
+    return True
+
+
+def _stop(session: ProfileSession):
+    try:
+        if session.profiler is not None:
+            session.profiler.disable()
+        if session.sampler is not None:
+            session.sampler.stop()
+        if "memory" in session.modes:
+            session.memory_after = tracemalloc.take_snapshot()
+            if session.started_tracemalloc:
+                tracemalloc.stop()
+    finally:
+        _profile_lock.release()
+
+
+def _profiled(endpoint: Callable) -> Callable:
+    """Wrap an endpoint so it runs under the request's profile session, if any"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            session = _active_session.get()
+            if session is None or not _start(session):
+                return await endpoint(*args, **kwargs)
+            # Runs on the event loop thread, so concurrent tasks show up in the profile too
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _stop(session)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = _active_session.get()
+        if session is None or not _start(session):
+            return endpoint(*args, **kwargs)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _stop(session)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route class running endpoints under the profiler when the request asked for it"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        super().__init__(path, _profiled(endpoint), **kwargs)
@@ -0,0 +1,95 @@
+"""
+In-memory cache of precompiled prompt prefixes
+Prefixes are byte-stable per (question, rubric version, output layout) so the
+provider-side prompt prefix cache can reuse them across answers. Keys carry a
+digest of the rubric content, computed once where the rubric is loaded, because
+different rubrics can share a version label
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def rubric_fingerprint(rubric: dict) -> str:
+    """Stable digest of the rubric content"""
+    return hashlib.sha1(json.dumps(rubric, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PromptPrefixCache:
+    """LRU cache with a TTL bounding staleness across worker processes"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size or _env_int("PROMPT_CACHE_SIZE", 1024)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else _env_int("PROMPT_CACHE_TTL_SECONDS", 300)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.provider_prompt_tokens = 0
+        self.provider_cached_tokens = 0
+
+    def get_or_build(self, key: Hashable, build: Callable[[], str]) -> str:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        prefix = build()
+        with self._lock:
+            self._entries[key] = (prefix, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return prefix
+
+    def invalidate(self, question_id: Optional[str] = None):
+        """Drop cached prefixes for one question (keys start with question_id), or all"""
+        with self._lock:
+            if question_id is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if isinstance(k, tuple) and k and k[0] == question_id]:
+                del self._entries[key]
+
+    def record_provider_usage(self, prompt_tokens: int, cached_tokens: int):
+        with self._lock:
+            self.provider_prompt_tokens += prompt_tokens
+            self.provider_cached_tokens += cached_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "prefix_hits": self.hits,
+                "prefix_misses": self.misses,
+                "prefix_hit_rate": self.hits / lookups if lookups else 0.0,
+                "provider_prompt_tokens": self.provider_prompt_tokens,
+                "provider_cached_tokens": self.provider_cached_tokens,
+                "provider_cached_ratio": (
+                    self.provider_cached_tokens / self.provider_prompt_tokens if self.provider_prompt_tokens else 0.0
+                ),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            self.provider_prompt_tokens = self.provider_cached_tokens = 0
+
+
+prompt_prefix_cache = PromptPrefixCache()
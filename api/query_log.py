@@ -0,0 +1,214 @@
+"""
+Slow-query log
+Every statement is timed through SQLAlchemy engine events and aggregated by
+normalized statement text. Statements slower than SLOW_QUERY_MS are logged with
+their parameters redacted, and the query plan (EXPLAIN / EXPLAIN QUERY PLAN) of
+slow SELECTs is captured once per statement and kept with the aggregate.
+Streamed results (stream_results / yield_per) are never explained: on drivers
+with unbuffered server-side cursors, such as pymysql, a second statement on the
+same connection first discards the rows the stream has not read yet
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("api.slow_query")
+
+MAX_TRACKED_STATEMENTS = 500
+
+_EXPLAIN_PREFIX = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "mysql": "EXPLAIN ",
+    "mariadb": "EXPLAIN ",
+    "postgresql": "EXPLAIN ",
+}
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# ASGI scope of the request being served, read at query time for the matched route
+_request_scope: ContextVar[Optional[dict]] = ContextVar("query_log_request_scope", default=None)
+
+
+def slow_query_log_enabled() -> bool:
+    return os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() == "true"
+
+
+def slow_query_threshold_ms() -> float:
+    try:
+        return float(os.getenv("SLOW_QUERY_MS", "200"))
+    except ValueError:
+        return 200.0
+
+
+def explain_enabled() -> bool:
+    return os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+
+
+def bind_request(scope: dict):
+    return _request_scope.set(scope)
+
+
+def unbind_request(token):
+    _request_scope.reset(token)
+
+
+def _current_route() -> str:
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "unknown")
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """Statement shape with literals and placeholders replaced by ? and IN lists collapsed"""
+    text = _STRING_LITERAL_RE.sub("?", statement)
+    text = _NUMBER_RE.sub("?", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("(?...)", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Parameter types and sizes only; values may contain student answers"""
+    if isinstance(parameters, dict):
+        return {key: redact_parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and all(isinstance(p, (list, tuple, dict)) for p in parameters):
+            return f"<{len(parameters)} parameter sets>"
+        return [redact_parameters(value) for value in parameters]
+    if parameters is None:
+        return None
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__} len={len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+
+class StatementStats:
+    __slots__ = ("statement", "count", "total_ms", "max_ms", "slow_count", "routes", "plan")
+
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slow_count = 0
+        self.routes: Dict[str, int] = {}
+        self.plan: Optional[List[str]] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "slow_count": self.slow_count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "routes": dict(self.routes),
+            "plan": self.plan,
+        }
+
+
+class QueryLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, StatementStats] = {}
+
+    def record(self, statement: str, elapsed_ms: float, slow: bool, route: str) -> StatementStats:
+        key = normalize_statement(statement)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= MAX_TRACKED_STATEMENTS:
+                    # Drop the cheapest statement to stay bounded
+                    cheapest = min(self._stats, key=lambda k: self._stats[k].total_ms)
+                    del self._stats[cheapest]
+                stats = self._stats[key] = StatementStats(key)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            if slow:
+                stats.slow_count += 1
+                stats.routes[route] = stats.routes.get(route, 0) + 1
+            return stats
+
+    def snapshot(self, limit: int = 50, slow_only: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [s.as_dict() for s in self._stats.values() if s.slow_count or not slow_only]
+        items.sort(key=lambda item: item["total_ms"], reverse=True)
+        return items[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_log = QueryLog()
+
+
+def _is_streamed(context) -> bool:
+    options = getattr(context, "execution_options", None) or {}
+    return bool(options.get("stream_results") or options.get("yield_per"))
+
+
+def _explain(conn, statement: str, parameters: Any) -> Optional[List[str]]:
+    """Query plan via a separate DBAPI cursor; only safe when the original result set is buffered"""
+    prefix = _EXPLAIN_PREFIX.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" | ".join(str(col) for col in row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def instrument_engine(engine):
+    """Time every statement on the engine and log/explain slow ones"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_log_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_log_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        threshold = slow_query_threshold_ms()
+        slow = elapsed_ms >= threshold
+        route = _current_route()
+        stats = query_log.record(statement, elapsed_ms, slow, route)
+        if not slow:
+            return
+        logger.warning(
+            f"Slow query {elapsed_ms:.1f}ms (threshold {threshold:.0f}ms) route={route} "
+            f"statement={stats.statement} params={redact_parameters(parameters)}"
+        )
+        is_select = statement.lstrip()[:6].upper() == "SELECT"
+        if stats.plan is None and is_select and not executemany and explain_enabled() and not _is_streamed(context):
+            try:
+                stats.plan = _explain(conn, statement, parameters)
+            except Exception as exc:
+                stats.plan = [f"EXPLAIN failed: {exc}"]
+            if stats.plan:
+                logger.warning(f"Query plan for slow query: {stats.plan}")
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        starts = context.connection.info.get("query_log_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
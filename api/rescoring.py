@@ -0,0 +1,404 @@
+"""
+Bulk re-scoring of historical evaluations after a rubric change
+A job walks a question's original evaluations (rows not produced by an earlier
+rescore) whose rubric_version differs from the job's rubric, in keyset-ordered
+chunks. Each chunk is scored with bounded concurrency and an optional rate limit,
+and its new evaluation rows are committed together with the checkpoint, so a
+paused, failed or interrupted job resumes exactly where it stopped. The checkpoint
+never moves past a row that failed to score: a run with failures ends "failed", and
+resuming it walks again from the first failure, retrying the failed rows while rows
+already rescored are excluded by the pending filter. Original rows are never
+modified; each rescore is a new row tagged with the new rubric_version and
+rescored_from_id.
+
+A running job records its owner process and a heartbeat per chunk. On startup,
+only running jobs whose owner is gone (a dead pid on this host) or whose
+heartbeat is older than RESCORE_HEARTBEAT_TIMEOUT_SECONDS are marked paused,
+so restarting one API worker does not stop jobs running in its siblings.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, insert, select
+from sqlalchemy.orm import aliased
+
+from .db import SessionLocal, AnswerEvaluation, Question, QuestionRubric, RescoreJob
+from .prompt_cache import rubric_fingerprint
+from .scoring import score_answer
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending", "running")
+RESUMABLE_STATUSES = ("paused", "failed")
+DEFAULT_HEARTBEAT_TIMEOUT_SECONDS = 600.0
+
+
+def heartbeat_timeout_seconds() -> float:
+    """A running job whose last chunk was committed longer ago than this is treated as orphaned"""
+    try:
+        return float(os.getenv("RESCORE_HEARTBEAT_TIMEOUT_SECONDS", DEFAULT_HEARTBEAT_TIMEOUT_SECONDS))
+    except ValueError:
+        return DEFAULT_HEARTBEAT_TIMEOUT_SECONDS
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: Optional[str]) -> Optional[bool]:
+    """Whether the owning process still exists; None when it runs on another host and cannot be checked"""
+    if not owner or ":" not in owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # EPERM: the process exists but belongs to another user
+        return True
+    return True
+
+
+class RescoreJobError(ValueError):
+    """Requested job transition is not allowed in the job's current state"""
+
+
+def _pending_filter(job: RescoreJob):
+    """Original evaluations of the question still scored under another rubric version"""
+    rescored = aliased(AnswerEvaluation)
+    already_rescored = exists().where(and_(
+        rescored.rescored_from_id == AnswerEvaluation.id,
+        rescored.rubric_version == job.rubric_version,
+    ))
+    return and_(
+        AnswerEvaluation.question_id == job.question_id,
+        AnswerEvaluation.rescored_from_id.is_(None),
+        AnswerEvaluation.rubric_version != job.rubric_version,
+        ~already_rescored,
+    )
+
+
+def create_job(rubric_id: int, created_by: Optional[str], concurrency: int = 4, chunk_size: int = 100,
+               max_rate: Optional[float] = None) -> RescoreJob:
+    """Create a pending job for the rubric's question; LookupError when the rubric does not exist"""
+    sess = SessionLocal()
+    try:
+        rubric = sess.get(QuestionRubric, rubric_id)
+        if rubric is None:
+            raise LookupError(f"Rubric {rubric_id} not found")
+        job = RescoreJob(
+            question_id=rubric.question_id,
+            rubric_id=rubric.id,
+            rubric_version=rubric.version,
+            status="pending",
+            concurrency=concurrency,
+            chunk_size=chunk_size,
+            max_rate=max_rate,
+            created_by=created_by,
+        )
+        job.total = sess.execute(select(func.count()).select_from(AnswerEvaluation).where(_pending_filter(job))).scalar()
+        sess.add(job)
+        sess.commit()
+        sess.refresh(job)
+        return job
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+
+
+def get_job(job_id: int) -> Optional[RescoreJob]:
+    sess = SessionLocal()
+    try:
+        return sess.get(RescoreJob, job_id)
+    finally:
+        sess.close()
+
+
+def list_jobs(question_id: Optional[str] = None, limit: int = 50) -> List[RescoreJob]:
+    sess = SessionLocal()
+    try:
+        query = sess.query(RescoreJob)
+        if question_id:
+            query = query.filter(RescoreJob.question_id == question_id)
+        return query.order_by(RescoreJob.id.desc()).limit(limit).all()
+    finally:
+        sess.close()
+
+
+def _set_status(job_id: int, status: str, allowed_from, **fields) -> RescoreJob:
+    sess = SessionLocal()
+    try:
+        job = sess.get(RescoreJob, job_id)
+        if job is None:
+            raise LookupError(f"Rescore job {job_id} not found")
+        if job.status not in allowed_from:
+            raise RescoreJobError(f"Cannot change job {job_id} from {job.status} to {status}")
+        job.status = status
+        for name, value in fields.items():
+            setattr(job, name, value)
+        sess.commit()
+        sess.refresh(job)
+        return job
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+
+
+class _RateLimiter:
+    """Spaces submissions to at most `rate` per second"""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+
+class RescoreRunner:
+    """Runs one job in the calling thread until it completes or is paused/cancelled"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.stop_requested: Optional[str] = None
+
+    def request_stop(self, status: str):
+        self.stop_requested = status
+
+    def _load(self):
+        sess = SessionLocal()
+        try:
+            job = sess.get(RescoreJob, self.job_id)
+            rubric = sess.get(QuestionRubric, job.rubric_id) if job else None
+            question = sess.query(Question).filter(Question.question_id == job.question_id).first() if job else None
+            return job, rubric, question
+        finally:
+            sess.close()
+
+    def _next_chunk(self, job: RescoreJob, after_id: int) -> List[Dict]:
+        sess = SessionLocal()
+        try:
+            rows = sess.execute(
+                select(AnswerEvaluation.id, AnswerEvaluation.student_id, AnswerEvaluation.student_answer)
+                .where(_pending_filter(job), AnswerEvaluation.id > after_id)
+                .order_by(AnswerEvaluation.id)
+                .limit(job.chunk_size)
+            ).all()
+            return [{"id": row.id, "student_id": row.student_id, "answer": row.student_answer or ""} for row in rows]
+        finally:
+            sess.close()
+
+    def _commit_chunk(self, job: RescoreJob, new_rows: List[Dict], last_id: int, failed: int, last_error: Optional[str]):
+        """New rows and the checkpoint in one transaction"""
+        sess = SessionLocal()
+        try:
+            if new_rows:
+                sess.execute(insert(AnswerEvaluation), new_rows)
+            stored = sess.get(RescoreJob, self.job_id)
+            stored.last_evaluation_id = last_id
+            stored.succeeded += len(new_rows)
+            stored.failed += failed
+            stored.heartbeat_at = datetime.now(timezone.utc)
+            if last_error:
+                stored.last_error = last_error
+            sess.commit()
+            job.last_evaluation_id = last_id
+        except Exception:
+            sess.rollback()
+            raise
+        finally:
+            sess.close()
+
+    def _should_stop(self) -> Optional[str]:
+        if self.stop_requested:
+            return self.stop_requested
+        # Another API worker may have changed the status
+        job = get_job(self.job_id)
+        if job is not None and job.status not in ACTIVE_STATUSES:
+            return job.status
+        return None
+
+    def run(self):
+        job, rubric, question = self._load()
+        if job is None:
+            return
+        if rubric is None or question is None:
+            _set_status(self.job_id, "failed", ACTIVE_STATUSES, last_error="Rubric or question no longer exists",
+                        finished_at=datetime.now(timezone.utc))
+            return
+        rubric_json, question_text = rubric.rubric_json, question.text
+        prompt_cache_key = (job.question_id, job.rubric_version, rubric_fingerprint(rubric_json))
+        limiter = _RateLimiter(job.max_rate)
+        logger.info(f"Rescore job {job.id} started: question_id={job.question_id}, rubric_version={job.rubric_version}, "
+                    f"from evaluation id {job.last_evaluation_id}")
+
+        def rescore(row):
+            scored = score_answer(job.question_id, question_text, rubric_json, job.rubric_version, row["answer"],
+                                  prompt_cache_key=prompt_cache_key)
+            new_row = scored.evaluation_row(row["student_id"], row["answer"])
+            new_row["rescored_from_id"] = row["id"]
+            return new_row
+
+        # The run walks past failed rows; the stored checkpoint stops before the first one
+        cursor, run_failed, last_error = job.last_evaluation_id, 0, None
+        try:
+            with ThreadPoolExecutor(max_workers=job.concurrency, thread_name_prefix=f"rescore-{job.id}") as executor:
+                while True:
+                    stop = self._should_stop()
+                    if stop:
+                        logger.info(f"Rescore job {job.id} stopped: {stop}")
+                        return
+                    chunk = self._next_chunk(job, cursor)
+                    if not chunk:
+                        break
+                    futures = []
+                    for row in chunk:
+                        if self.stop_requested:
+                            break
+                        limiter.wait()
+                        futures.append((row, executor.submit(rescore, row)))
+                    # Submitted rows are a prefix of the chunk, so the checkpoint stays contiguous
+                    new_rows, failed, checkpoint = [], 0, job.last_evaluation_id
+                    for row, future in futures:
+                        try:
+                            new_rows.append(future.result())
+                            if not run_failed and not failed:
+                                checkpoint = row["id"]
+                        except Exception as exc:
+                            failed += 1
+                            last_error = f"evaluation {row['id']}: {type(exc).__name__}: {exc}"
+                            logger.warning(f"Rescore job {job.id} failed on {last_error}")
+                    if futures:
+                        self._commit_chunk(job, new_rows, checkpoint, failed, last_error if failed else None)
+                        cursor = futures[-1][0]["id"]
+                        run_failed += failed
+            if run_failed:
+                _set_status(self.job_id, "failed", ACTIVE_STATUSES, finished_at=datetime.now(timezone.utc),
+                            last_error=f"{run_failed} evaluation(s) failed, resume to retry them; last: {last_error}")
+                logger.warning(f"Rescore job {job.id} finished with {run_failed} failed evaluation(s)")
+                return
+            _set_status(self.job_id, "completed", ACTIVE_STATUSES, finished_at=datetime.now(timezone.utc))
+            logger.info(f"Rescore job {job.id} completed")
+        except Exception as exc:
+            logger.error(f"Rescore job {job.id} failed: {exc}", exc_info=True)
+            try:
+                _set_status(self.job_id, "failed", ACTIVE_STATUSES, last_error=f"{type(exc).__name__}: {exc}")
+            except Exception:
+                pass
+
+
+_runners: Dict[int, RescoreRunner] = {}
+_threads: Dict[int, threading.Thread] = {}
+_runners_lock = threading.Lock()
+
+
+def _run_in_background(job_id: int):
+    runner = RescoreRunner(job_id)
+
+    def target():
+        try:
+            runner.run()
+        finally:
+            with _runners_lock:
+                _runners.pop(job_id, None)
+
+    thread = threading.Thread(target=target, name=f"rescore-job-{job_id}", daemon=True)
+    with _runners_lock:
+        _runners[job_id] = runner
+        _threads[job_id] = thread
+    thread.start()
+
+
+def start_job(job_id: int) -> RescoreJob:
+    """
+    Mark a pending, paused or failed job running and run it on a background thread
+    Rows that failed before are behind the checkpoint and are retried, so failed restarts from zero
+    """
+    with _runners_lock:
+        if job_id in _runners:
+            raise RescoreJobError(f"Job {job_id} is already running")
+    job = _set_status(job_id, "running", ("pending",) + RESUMABLE_STATUSES, finished_at=None, failed=0,
+                      owner=process_owner(), heartbeat_at=datetime.now(timezone.utc))
+    _run_in_background(job_id)
+    return job
+
+
+def stop_job(job_id: int, status: str) -> RescoreJob:
+    """Pause or cancel; the running chunk finishes its in-flight answers and is checkpointed"""
+    allowed = ACTIVE_STATUSES if status == "paused" else ACTIVE_STATUSES + RESUMABLE_STATUSES
+    fields = {"finished_at": datetime.now(timezone.utc)} if status == "cancelled" else {}
+    job = _set_status(job_id, status, allowed, **fields)
+    with _runners_lock:
+        runner = _runners.get(job_id)
+    if runner is not None:
+        runner.request_stop(status)
+    return job
+
+
+def wait_for_job(job_id: int, timeout: Optional[float] = None) -> bool:
+    """Block until the job's background thread exits; False on timeout"""
+    with _runners_lock:
+        thread = _threads.get(job_id)
+    if thread is None:
+        return True
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def _is_orphaned(job: RescoreJob, now: datetime, timeout: float) -> bool:
+    alive = _owner_alive(job.owner)
+    if alive is not None:
+        return not alive
+    heartbeat = job.heartbeat_at
+    if heartbeat is None:
+        return True
+    if heartbeat.tzinfo is None:
+        heartbeat = heartbeat.replace(tzinfo=timezone.utc)
+    return (now - heartbeat).total_seconds() > timeout
+
+
+def pause_interrupted_jobs():
+    """
+    Jobs left running by a process that is gone have no thread; mark them paused so they can be resumed
+    Jobs owned by a live process on this host, or with a recent heartbeat from another host, are left alone
+    """
+    sess = SessionLocal()
+    try:
+        now, timeout = datetime.now(timezone.utc), heartbeat_timeout_seconds()
+        running = sess.query(RescoreJob.id, RescoreJob.owner, RescoreJob.heartbeat_at).filter(
+            RescoreJob.status == "running").all()
+        updated = 0
+        for job in running:
+            if not _is_orphaned(job, now, timeout):
+                continue
+            owner_filter = RescoreJob.owner.is_(None) if job.owner is None else RescoreJob.owner == job.owner
+            # The owner check keeps a job resumed meanwhile by another worker running
+            updated += sess.query(RescoreJob).filter(
+                RescoreJob.id == job.id, RescoreJob.status == "running", owner_filter,
+            ).update({"status": "paused"}, synchronize_session=False)
+        sess.commit()
+        if updated:
+            logger.warning(f"Marked {updated} interrupted rescore job(s) as paused")
+    except Exception as exc:
+        sess.rollback()
+        logger.warning(f"Could not check for interrupted rescore jobs: {exc}")
+    finally:
+        sess.close()
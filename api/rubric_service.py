@@ -1,7 +1,9 @@
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple, Union
 import json
 import logging
 from .db import SessionLocal, QuestionRubric
+from .metrics import RUBRIC_RESOLUTIONS
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +29,15 @@ TOPIC_DEFAULT = {
 
 def load_manual_rubric(question_id: str) -> Optional[dict]:
     """Load rubric for question from database. Prioritize active rubric, otherwise return latest."""
+    stored = load_stored_rubric(question_id)
+    return stored[0] if stored else None
+
+
+def load_stored_rubric(question_id: str) -> Optional[Tuple[dict, str]]:
+    """
+    (rubric_json, version) of the question's active rubric, otherwise its latest one
+    The version is the QuestionRubric.version column, the label rescoring jobs compare against
+    """
     sess = SessionLocal()
     try:
         active_rubric = sess.query(QuestionRubric).filter(
@@ -35,14 +46,14 @@ def load_manual_rubric(question_id: str) -> Optional[dict]:
         ).first()
         
         if active_rubric:
-            return active_rubric.rubric_json
+            return active_rubric.rubric_json, active_rubric.version
         
         latest_rubric = sess.query(QuestionRubric).filter(
             QuestionRubric.question_id == question_id
         ).order_by(QuestionRubric.created_at.desc()).first()
         
         if latest_rubric:
-            return latest_rubric.rubric_json
+            return latest_rubric.rubric_json, latest_rubric.version
         
         return None
     except Exception as e:
@@ -52,9 +63,9 @@ def load_manual_rubric(question_id: str) -> Optional[dict]:
         sess.close()
 
 
-def generate_rubric_by_llm(question_text: str, topic: Optional[str] = None) -> dict:
-    """Automatically generate rubric using LLM"""
-    from .llm_client import _make_llm
+def generate_rubric_by_llm(question_text: str, topic: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+    """Automatically generate rubric using LLM (timeout bounds the LLM request, in seconds)"""
+    from .llm_client import make_llm, invoke_llm
     
     prompt = f"""You are an experienced educational assessment expert. Please generate a detailed rubric for the following question.
 
@@ -92,8 +103,8 @@ Requirements:
 """
     
     try:
-        llm = _make_llm()
-        resp = llm.invoke(prompt)
+        llm = make_llm(timeout=timeout)
+        resp = invoke_llm(llm, prompt)
         text = resp.content.strip()
         
         try:
@@ -160,18 +171,34 @@ def save_rubric_to_db(question_id: str, rubric: dict, created_by: Optional[str]
         sess.close()
 
 
-def get_rubric(question_id: str, topic: str, provided: Optional[dict] = None, question_text: Optional[str] = None) -> Tuple[dict, str]:
-    """Get rubric with priority fallback: user provided -> database -> topic default -> LLM auto-generated"""
+def get_rubric(question_id: str, topic: str, provided: Optional[dict] = None, question_text: Optional[str] = None,
+               timeout: Union[float, Callable[[], float], None] = None) -> Tuple[dict, str]:
+    """
+    Get rubric with priority fallback: user provided -> database -> topic default -> LLM auto-generated
+    timeout bounds the LLM generation step, in seconds; a callable is only evaluated when a rubric is generated
+    """
+    with span("get_rubric", **{"question.id": question_id}) as rubric_span:
+        rubric, version, source = _resolve_rubric(question_id, topic, provided, question_text, timeout)
+        RUBRIC_RESOLUTIONS.inc(source=source)
+        if rubric_span is not None:
+            rubric_span.set_attribute("rubric.source", source)
+            rubric_span.set_attribute("rubric.version", version)
+        return rubric, version
+
+
+def _resolve_rubric(question_id: str, topic: str, provided: Optional[dict], question_text: Optional[str],
+                    timeout: Union[float, Callable[[], float], None]) -> Tuple[dict, str, str]:
+    """(rubric, version, source) following the get_rubric fallback order"""
     if provided:
-        return provided, provided.get("version", "manual-provided")
+        return provided, provided.get("version", "manual-provided"), "provided"
     
-    manual = load_manual_rubric(question_id)
-    if manual:
-        return manual, manual.get("version", "manual-v1")
+    stored = load_stored_rubric(question_id)
+    if stored and stored[0]:
+        return stored[0], stored[1], "database"
     
     topic_rubric = TOPIC_DEFAULT.get(topic)
     if topic_rubric:
-        return topic_rubric, topic_rubric["version"]
+        return topic_rubric, topic_rubric["version"], "topic_default"
     
     if not question_text:
         auto = {
@@ -180,9 +207,11 @@ def get_rubric(question_id: str, topic: str, provided: Optional[dict] = None, qu
             "key_points": ["Core concepts", "Implementation steps", "Common pitfalls", "Business impact"],
             "common_mistakes": ["Too general", "Lack of examples", "No trade-offs mentioned"]
         }
-        return auto, auto["version"]
+        return auto, auto["version"], "static_default"
     
-    auto_rubric = generate_rubric_by_llm(question_text, topic)
+    if callable(timeout):
+        timeout = timeout()
+    auto_rubric = generate_rubric_by_llm(question_text, topic, timeout=timeout)
     save_rubric_to_db(question_id, auto_rubric, created_by="system")
     
-    return auto_rubric, auto_rubric.get("version", "auto-gen-v1")
+    return auto_rubric, auto_rubric.get("version", "auto-gen-v1"), "llm_generated"
@@ -0,0 +1,111 @@
+"""
+Scoring pipeline shared by /evaluate/short-answer and the offline jobs
+Pre-screen, LLM scoring and payload validation for one answer. The endpoint calls
+prescreen_score and scored_payload inside its deadline stages; offline jobs use score_answer
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from .llm_client import call_llm, LLMCallStats
+from .models import EvaluationResult, LLMScorePayload
+from .prescreen import (
+    prescreen_enabled, prescreen_answer,
+    PRESCREEN_PROVIDER, PRESCREEN_MODEL_ID, PRESCREEN_MODEL_VERSION,
+)
+
+
+def model_metadata(model_id_override: Optional[str] = None):
+    """(provider, model_id, model_version) recorded on evaluations"""
+    provider = os.getenv("LLM_PROVIDER")
+    if not provider:
+        base_url = os.getenv("OPENAI_BASE_URL", "")
+        provider = "openrouter" if "openrouter" in base_url.lower() else "openai"
+    model_id = os.getenv("MODEL_ID") or os.getenv("MODEL_NAME", "gpt-4o-mini")
+    if model_id_override and model_id_override != model_id:
+        # A cascade tier other than the configured model must not inherit its MODEL_VERSION label
+        return provider, model_id_override, f"{provider}:{model_id_override}"
+    model_version = os.getenv("MODEL_VERSION") or f"{provider}:{model_id}"
+    return provider, model_id, model_version
+
+
+@dataclass
+class ScoredAnswer:
+    result: EvaluationResult
+    llm_stats: Optional[LLMCallStats] = None
+
+    def evaluation_row(self, student_id: Optional[str], student_answer: str) -> Dict[str, Any]:
+        """Column values for an AnswerEvaluation row"""
+        row = {
+            "question_id": self.result.question_id,
+            "student_id": student_id,
+            "student_answer": student_answer,
+            "auto_score": self.result.total_score,
+            "final_score": None,
+            "dimension_scores_json": self.result.dimension_breakdown,
+            "model_version": self.result.model_version,
+            "model_tier": self.result.model_tier,
+            "rubric_version": self.result.rubric_version,
+            "raw_llm_output": self.result.raw_llm_output,
+        }
+        if self.llm_stats is not None:
+            row.update(
+                prompt_tokens=self.llm_stats.prompt_tokens,
+                completion_tokens=self.llm_stats.completion_tokens,
+                cached_tokens=self.llm_stats.cached_tokens,
+                llm_latency_ms=self.llm_stats.latency_ms,
+                llm_retries=self.llm_stats.retries,
+            )
+        return row
+
+
+def scored_payload(question_id: str, rubric_version: str, llm_json: Dict[str, Any], model_tier: Optional[str],
+                   llm_stats: Optional[LLMCallStats] = None,
+                   model: Optional[Tuple[str, str, str]] = None) -> ScoredAnswer:
+    """
+    Validate an LLM (or pre-screen) payload into a ScoredAnswer
+    - model: (provider, model_id, model_version); defaults to the model recorded in llm_stats
+    """
+    provider, model_id, model_version = model or model_metadata(llm_stats.model_id if llm_stats else None)
+    llm_payload = LLMScorePayload(**llm_json)
+    result = EvaluationResult(
+        question_id=question_id,
+        rubric_version=rubric_version,
+        provider=provider,
+        model_id=model_id,
+        model_version=model_version,
+        model_tier=model_tier,
+        raw_llm_output=llm_json,
+        **llm_payload.model_dump()
+    )
+    return ScoredAnswer(result=result, llm_stats=llm_stats)
+
+
+def prescreen_score(question_id: str, question_text: str, rubric: dict, rubric_version: str,
+                    student_answer: str) -> Optional[ScoredAnswer]:
+    """Result for answers the pre-screen scores without the LLM, None when the LLM is needed"""
+    screen = prescreen_answer(question_text, rubric, student_answer) if prescreen_enabled() else None
+    if screen is None or not screen.should_skip_llm:
+        return None
+    llm_json = {
+        **screen.payload,
+        "prescreen": {"verdict": screen.verdict, "confidence": screen.confidence, "features": screen.features}
+    }
+    return scored_payload(question_id, rubric_version, llm_json, "prescreen",
+                          model=(PRESCREEN_PROVIDER, PRESCREEN_MODEL_ID, PRESCREEN_MODEL_VERSION))
+
+
+def score_answer(question_id: str, question_text: str, rubric: dict, rubric_version: str, student_answer: str,
+                 timeout: Optional[float] = None,
+                 prompt_cache_key: Optional[Tuple[str, str, str]] = None) -> ScoredAnswer:
+    """
+    Score one answer; LLM failures and invalid payloads propagate to the caller
+    - prompt_cache_key: (question_id, rubric_version, rubric_fingerprint) for stored rubrics
+    """
+    screened = prescreen_score(question_id, question_text, rubric, rubric_version, student_answer)
+    if screened is not None:
+        return screened
+    llm_stats = LLMCallStats()
+    llm_json = call_llm(question_text, rubric, student_answer, timeout=timeout, stats=llm_stats,
+                        prompt_cache_key=prompt_cache_key)
+    return scored_payload(question_id, rubric_version, llm_json, llm_stats.tier, llm_stats)
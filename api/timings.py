@@ -0,0 +1,56 @@
+"""
+Per-request stage latency breakdown
+Request start and auth completion are stamped on request.state; pipeline stages
+come from Deadline.stage_timings. One structured log line is emitted per request
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+
+from .deadline import Deadline
+
+TIMINGS_HEADER = "X-Include-Timings"
+
+timing_logger = logging.getLogger("api.timings")
+
+
+def timings_requested(value: Optional[str]) -> bool:
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+def mark_request_started(request: Request):
+    request.state.started_at = time.monotonic()
+
+
+def mark_auth_done(request: Request):
+    request.state.auth_done_at = time.monotonic()
+
+
+def stage_breakdown(request: Optional[Request], deadline: Deadline) -> Dict[str, float]:
+    """
+    Stage durations in milliseconds
+    - auth: request parsing and user lookup, from middleware entry to the role check
+    - queue_wait: auth done to handler start (threadpool scheduling)
+    - pipeline stages as recorded by the deadline, then total
+    """
+    timings: Dict[str, float] = {}
+    state = getattr(request, "state", None)
+    started_at = getattr(state, "started_at", None)
+    auth_done_at = getattr(state, "auth_done_at", None)
+    if started_at is not None and auth_done_at is not None:
+        timings["auth"] = (auth_done_at - started_at) * 1000
+        timings["queue_wait"] = max(0.0, deadline.started_at - auth_done_at) * 1000
+    for name, seconds in deadline.stage_timings.items():
+        timings[name] = seconds * 1000
+    origin = started_at if started_at is not None else deadline.started_at
+    timings["total"] = (time.monotonic() - origin) * 1000
+    return {name: round(ms, 3) for name, ms in timings.items()}
+
+
+def log_stage_timings(route: str, status_code: int, timings: Dict[str, float], **fields: Any):
+    """Emit one JSON log line per request for charting stage percentiles"""
+    record = {"event": "stage_timings", "route": route, "status": status_code, **fields, "timings_ms": timings}
+    timing_logger.info(json.dumps(record, default=str, ensure_ascii=False))
@@ -0,0 +1,236 @@
+"""
+Lightweight OpenTelemetry-compatible tracing
+Spans carry W3C trace/span ids, honour an incoming traceparent header and are
+exported as OTLP-style JSON lines (one span per line) to a local file that a
+collector can tail. With TRACE_SAMPLE_RATE=0 (default) no spans are created
+and no database hooks are installed
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+def _env_rate() -> float:
+    try:
+        return min(1.0, max(0.0, float(os.getenv("TRACE_SAMPLE_RATE", "0"))))
+    except ValueError:
+        return 0.0
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str] = None
+    kind: str = "INTERNAL"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    status: str = "UNSET"
+    status_message: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, exc: BaseException):
+        self.status = "ERROR"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        record = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": self.attributes,
+            "status": {"code": f"STATUS_CODE_{self.status}"},
+        }
+        if self.parent_span_id:
+            record["parentSpanId"] = self.parent_span_id
+        if self.status_message:
+            record["status"]["message"] = self.status_message
+        return record
+
+
+class FileSpanExporter:
+    """Append finished spans as JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_otlp(), default=str, ensure_ascii=False)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as exc:
+            logger.warning(f"Failed to export span to {self.path}: {exc}")
+
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list (tests, ad-hoc inspection)"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class _Config:
+    def __init__(self):
+        self.sample_rate = _env_rate()
+        self.exporter = FileSpanExporter(os.getenv("TRACE_FILE", "traces.jsonl"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+
+config = _Config()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def configure(sample_rate: Optional[float] = None, exporter=None):
+    if sample_rate is not None:
+        config.sample_rate = min(1.0, max(0.0, sample_rate))
+    if exporter is not None:
+        config.exporter = exporter
+
+
+def tracing_enabled() -> bool:
+    return config.enabled
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _new_id(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8):0{nbytes * 2}x}"
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None"""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], sampled
+
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.set_error(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end_ns = time.time_ns()
+        config.exporter.export(span)
+
+
+@contextmanager
+def start_trace(name: str, traceparent: Optional[str] = None, kind: str = "SERVER",
+                **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Root span for a request or job
+    - An incoming traceparent continues the caller's trace and follows its sampled flag
+    - Otherwise the trace is sampled with probability TRACE_SAMPLE_RATE
+    Yields None when the trace is not sampled
+    """
+    if not config.enabled:
+        yield None
+        return
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_span_id, sampled = parent
+    else:
+        trace_id, parent_span_id = _new_id(16), None
+        sampled = random.random() < config.sample_rate
+    if not sampled:
+        yield None
+        return
+    span = Span(name, trace_id, _new_id(8), parent_span_id, kind=kind, attributes=dict(attributes))
+    with _activate(span):
+        yield span
+
+
+@contextmanager
+def span(name: str, kind: str = "INTERNAL", **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the active trace; a no-op yielding None outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, _new_id(8), parent.span_id, kind=kind, attributes=dict(attributes))
+    with _activate(child):
+        yield child
+
+
+def instrument_engine(engine):
+    """Record one CLIENT span per SQL statement executed inside a sampled trace"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        # Statement text only; bound parameters may contain student answers
+        db_span = Span("db.query", parent.trace_id, _new_id(8), parent.span_id, kind="CLIENT", attributes={
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:1000],
+            "db.operation": statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "",
+        })
+        conn.info.setdefault("trace_query_spans", []).append(db_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_query_spans")
+        if not spans:
+            return
+        db_span = spans.pop()
+        db_span.end_ns = time.time_ns()
+        config.exporter.export(db_span)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        conn = context.connection
+        spans = conn.info.get("trace_query_spans") if conn is not None else None
+        if spans:
+            db_span = spans.pop()
+            db_span.set_error(context.original_exception)
+            db_span.end_ns = time.time_ns()
+            config.exporter.export(db_span)
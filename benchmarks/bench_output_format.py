@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Compare the full and compact scoring output formats
+
+Usage:
+    python benchmarks/bench_output_format.py --runs 5      # live: calls the configured LLM
+    python benchmarks/bench_output_format.py --dry-run     # offline: token counts of prompts and sample outputs
+
+Reports prompt/completion token counts and, in live mode, generation time per format.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import compact_output
+from api.llm_client import build_prompt, make_llm
+from api.rubric_service import TOPIC_DEFAULT
+
+QUESTION = "Briefly describe how to implement reliable dependency management and failure recovery in Airflow."
+ANSWERS = [
+    "I define task dependencies in the DAG, set retries with exponential backoff and make each task idempotent so reruns are safe.",
+    "Airflow schedules DAGs. When a task fails it is retried. We also use SLAs and alerts to notice failures and pools to limit concurrency.",
+    "Use sensors for upstream data, trigger rules for branching, retries and on_failure_callback for recovery, and backfill for missed runs.",
+]
+
+# Representative responses used for offline token counts
+SAMPLE_FULL_OUTPUT = {
+    "total_score": 6.5,
+    "dimension_breakdown": {"accuracy": 1.5, "structure": 1.2, "clarity": 1.4, "business": 1.0, "language": 1.4},
+    "key_points_evaluation": [
+        "DAG/Task semantics and scheduling cycles -> ok, dependencies are defined in the DAG",
+        "Dependencies and retry strategies -> ok, retries with exponential backoff are mentioned",
+        "Idempotency and repeatable execution -> ok, idempotent tasks are described",
+        "Monitoring and alerting (SLAs/backfill) -> missing, no monitoring or SLA discussion",
+        "Resource/queue/concurrency control -> missing, pools and queues are not discussed",
+    ],
+    "improvement_recommendations": [
+        "Explain how SLAs, alerting and on_failure_callback surface failures to the on-call team",
+        "Describe how pools, queues and max_active_runs control resource usage and concurrency",
+        "Add a concrete business example showing the impact of a failed upstream dependency",
+    ],
+}
+SAMPLE_COMPACT_OUTPUT = {
+    "t": 6.5,
+    "d": {"a": 1.5, "s": 1.2, "c": 1.4, "b": 1.0, "l": 1.4},
+    "k": ["c", "c", "c", "m", "m"],
+    "r": ["Explain SLAs and failure alerting", "Describe pools and concurrency limits"],
+}
+
+
+def _token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken o200k_base"
+    except Exception:
+        # Offline without cached encodings: ~4 characters per token
+        return lambda text: max(1, round(len(text) / 4)), "chars/4 estimate"
+
+
+def _summary(values):
+    if not values:
+        return "n/a"
+    return f"mean={statistics.mean(values):.1f} p50={statistics.median(values):.1f} max={max(values):.1f}"
+
+
+def dry_run(count_tokens):
+    rubric = TOPIC_DEFAULT["airflow"]
+    rows = []
+    for fmt, sample in (("full", json.dumps(SAMPLE_FULL_OUTPUT, indent=2)),
+                        ("compact", json.dumps(SAMPLE_COMPACT_OUTPUT, separators=(",", ":")))):
+        prompt_tokens = [count_tokens(build_prompt(QUESTION, rubric, a, output_format=fmt)) for a in ANSWERS]
+        rows.append((fmt, statistics.mean(prompt_tokens), count_tokens(sample)))
+    return rows
+
+
+def live_run(runs, count_tokens):
+    rubric = TOPIC_DEFAULT["airflow"]
+    results = {}
+    for fmt in ("full", "compact"):
+        latencies, completion_tokens, prompt_tokens = [], [], []
+        llm = make_llm(max_tokens=compact_output.max_tokens_for(fmt))
+        for _ in range(runs):
+            for answer in ANSWERS:
+                prompt = build_prompt(QUESTION, rubric, answer, output_format=fmt)
+                started = time.perf_counter()
+                resp = llm.invoke(prompt)
+                latencies.append((time.perf_counter() - started) * 1000)
+                usage = getattr(resp, "usage_metadata", None) or {}
+                completion_tokens.append(usage.get("output_tokens") or count_tokens(resp.content))
+                prompt_tokens.append(usage.get("input_tokens") or count_tokens(prompt))
+        results[fmt] = (latencies, prompt_tokens, completion_tokens)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs compact scoring output")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions over the sample answers (live mode)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count tokens, do not call the LLM")
+    args = parser.parse_args()
+
+    count_tokens, counter_name = _token_counter()
+    print(f"Token counter: {counter_name}")
+    print("=" * 72)
+
+    if args.dry_run:
+        print(f"{'format':<10}{'prompt tokens':>16}{'completion tokens':>20}")
+        rows = dry_run(count_tokens)
+        for fmt, prompt_tokens, completion_tokens in rows:
+            print(f"{fmt:<10}{prompt_tokens:>16.0f}{completion_tokens:>20}")
+        full, compact = rows[0][2], rows[1][2]
+        print("-" * 72)
+        print(f"Compact output uses {compact / full:.0%} of the full output tokens")
+        return
+
+    results = live_run(args.runs, count_tokens)
+    for fmt, (latencies, prompt_tokens, completion_tokens) in results.items():
+        print(f"[{fmt}]")
+        print(f"  generation ms      {_summary(latencies)}")
+        print(f"  prompt tokens      {_summary(prompt_tokens)}")
+        print(f"  completion tokens  {_summary(completion_tokens)}")
+    full_ms = statistics.mean(results["full"][0])
+    compact_ms = statistics.mean(results["compact"][0])
+    print("-" * 72)
+    print(f"Compact generation time: {compact_ms / full_ms:.0%} of full")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Compare model configurations on latency, token usage and agreement with teacher scores
+
+Usage:
+    python benchmarks/compare_models.py --config gpt-4o-mini --config gpt-4.1-mini --config gpt-4.1-mini:compact
+    python benchmarks/compare_models.py --config gpt-4o-mini --config gpt-4.1-nano:compact:local --limit 200 --max-mae 1.0
+    LLM_PROVIDER=stub python benchmarks/compare_models.py --db-url sqlite:///bench.db --config a --config b   # offline dry run
+
+Replays answers whose final_score was set by a teacher review against every
+config, each config with its own pool of --concurrency workers, all configs at
+the same time. A config is MODEL_ID[:output_format[:key_point_mode]]
+(output_format full|compact, key_point_mode off|hints|local) on the configured
+provider. Agreement (MAE, RMSE, bias, Pearson r, share within 1 point) is
+computed against the teacher final scores; failed calls count as errors and are
+left out of the agreement statistics.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PERCENTILES = (50, 90, 95, 99)
+OUTPUT_FORMATS = ("full", "compact")
+KEY_POINT_MODES = ("off", "hints", "local")
+
+
+@dataclass
+class ModelConfig:
+    label: str
+    model: str
+    output_format: str = "full"
+    key_point_mode: str = "hints"
+
+
+def parse_config(spec: str) -> ModelConfig:
+    parts = spec.split(":")
+    if not parts[0] or len(parts) > 3:
+        raise argparse.ArgumentTypeError(f"Invalid config {spec!r}; expected MODEL_ID[:output_format[:key_point_mode]]")
+    config = ModelConfig(label=spec, model=parts[0])
+    if len(parts) > 1:
+        config.output_format = parts[1]
+    if len(parts) > 2:
+        config.key_point_mode = parts[2]
+    if config.output_format not in OUTPUT_FORMATS or config.key_point_mode not in KEY_POINT_MODES:
+        raise argparse.ArgumentTypeError(f"Invalid config {spec!r}; output_format is full|compact, "
+                                         f"key_point_mode is off|hints|local")
+    return config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare model configs against teacher-reviewed scores")
+    parser.add_argument("--config", dest="configs", type=parse_config, action="append", required=True,
+                        help="MODEL_ID[:output_format[:key_point_mode]]; repeat for each config")
+    parser.add_argument("--db-url", help="Database URL (default: DB_URL)")
+    parser.add_argument("--question-id", help="Only answers to this question")
+    parser.add_argument("--limit", type=int, default=100, help="Most recently reviewed answers to replay")
+    parser.add_argument("--concurrency", type=int, default=4, help="Calls in flight per config")
+    parser.add_argument("--timeout", type=float, help="Per-answer LLM time budget in seconds")
+    parser.add_argument("--max-mae", type=float, help="Recommend the fastest config (p95) with MAE at most this")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON")
+    return parser.parse_args()
+
+
+def load_reviewed_answers(question_id=None, limit=100):
+    """Reviewed answers with the rubric they were scored under; rows whose rubric cannot be found are skipped"""
+    from api.db import SessionLocal, AnswerEvaluation, Question, QuestionRubric
+    from api.prompt_cache import rubric_fingerprint
+    from api.rubric_service import TOPIC_DEFAULT
+
+    sess = SessionLocal()
+    try:
+        query = (sess.query(AnswerEvaluation.question_id, AnswerEvaluation.student_answer,
+                            AnswerEvaluation.rubric_version, AnswerEvaluation.final_score,
+                            Question.text, Question.topic)
+                 .join(Question, Question.question_id == AnswerEvaluation.question_id)
+                 .filter(AnswerEvaluation.final_score.isnot(None), AnswerEvaluation.student_answer.isnot(None)))
+        if question_id:
+            query = query.filter(AnswerEvaluation.question_id == question_id)
+        rows = query.order_by(AnswerEvaluation.id.desc()).limit(limit).all()
+
+        rubrics = {}
+        for q_id, version, topic in {(row.question_id, row.rubric_version, row.topic) for row in rows}:
+            stored = sess.query(QuestionRubric.rubric_json).filter(
+                QuestionRubric.question_id == q_id, QuestionRubric.version == version).first()
+            topic_rubric = TOPIC_DEFAULT.get(topic)
+            if stored is not None:
+                rubrics[(q_id, version)] = stored.rubric_json
+            elif topic_rubric is not None and topic_rubric["version"] == version:
+                rubrics[(q_id, version)] = topic_rubric
+    finally:
+        sess.close()
+
+    fingerprints = {key: rubric_fingerprint(rubric) for key, rubric in rubrics.items()}
+    answers = [
+        {"question_id": row.question_id, "question_text": row.text, "answer": row.student_answer,
+         "rubric_version": row.rubric_version, "rubric": rubrics[(row.question_id, row.rubric_version)],
+         "rubric_fingerprint": fingerprints[(row.question_id, row.rubric_version)],
+         "teacher_score": float(row.final_score)}
+        for row in rows if (row.question_id, row.rubric_version) in rubrics
+    ]
+    return answers, len(rows) - len(answers)
+
+
+def score_with_config(config: ModelConfig, item, timeout=None):
+    """(latency_ms, total_score or None, prompt, completion, cached tokens, retries, error)"""
+    from api.llm_client import LLMCallStats, score_with_model, prepare_prompt
+    from api.models import LLMScorePayload
+
+    stats = LLMCallStats()
+    started = time.perf_counter()
+    try:
+        prepared = prepare_prompt(item["question_text"], item["rubric"], item["answer"],
+                                  prompt_cache_key=(item["question_id"], item["rubric_version"], item["rubric_fingerprint"]),
+                                  mode=config.key_point_mode, fmt=config.output_format)
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        result = score_with_model(prepared.prompt, config.model, expires_at, prepared.fmt, item["rubric"], stats)
+        score, error = LLMScorePayload(**result).total_score, None
+    except Exception as exc:
+        score, error = None, f"{type(exc).__name__}: {exc}"
+    latency_ms = (time.perf_counter() - started) * 1000
+    return latency_ms, score, stats.prompt_tokens, stats.completion_tokens, stats.cached_tokens, stats.retries, error
+
+
+def run_config(config: ModelConfig, answers, concurrency: int, timeout=None):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"compare-{config.model}") as executor:
+        results = list(executor.map(lambda item: score_with_config(config, item, timeout), answers))
+    return results, time.perf_counter() - started
+
+
+def agreement(scores: np.ndarray, teacher: np.ndarray):
+    """
+    Per-config agreement with teacher scores, vectorized over configs
+    - scores: (configs, answers) with NaN for failed calls; teacher: (answers,)
+    """
+    valid = ~np.isnan(scores)
+    target = np.where(valid, teacher[None, :], np.nan)
+    diff = scores - target
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = valid.sum(axis=1)
+        mae = np.nanmean(np.abs(diff), axis=1)
+        rmse = np.sqrt(np.nanmean(diff ** 2, axis=1))
+        bias = np.nanmean(diff, axis=1)
+        within_1 = np.where(n > 0, np.nansum(np.abs(diff) <= 1.0, axis=1) / np.maximum(n, 1), np.nan)
+        centered_s = scores - np.nanmean(scores, axis=1, keepdims=True)
+        centered_t = target - np.nanmean(target, axis=1, keepdims=True)
+        pearson = np.nansum(centered_s * centered_t, axis=1) / np.sqrt(
+            np.nansum(centered_s ** 2, axis=1) * np.nansum(centered_t ** 2, axis=1))
+    return {"n": n, "mae": mae, "rmse": rmse, "bias": bias, "within_1": within_1, "pearson_r": pearson}
+
+
+def build_report(configs, answers, runs, skipped):
+    from api.pricing import estimate_cost
+
+    teacher = np.array([item["teacher_score"] for item in answers], dtype=float)
+    # (configs, answers) matrices; column j is answer j for every config
+    latency = np.array([[r[0] for r in results] for results, _ in runs], dtype=float).reshape(len(configs), -1)
+    scores = np.array([[np.nan if r[1] is None else r[1] for r in results] for results, _ in runs],
+                      dtype=float).reshape(len(configs), -1)
+    tokens = np.array([[r[2:6] for r in results] for results, _ in runs], dtype=float).reshape(len(configs), -1, 4)
+    stats = agreement(scores, teacher)
+    percentiles = np.percentile(latency, PERCENTILES, axis=1) if latency.size else np.full((len(PERCENTILES), len(configs)), np.nan)
+    token_totals = tokens.sum(axis=1)
+
+    def _num(value, digits=3):
+        value = float(value)
+        return None if np.isnan(value) else round(value, digits)
+
+    items = []
+    for i, config in enumerate(configs):
+        results, elapsed = runs[i]
+        prompt_tokens, completion_tokens, cached_tokens, retries = (int(v) for v in token_totals[i])
+        errors = [r[6] for r in results if r[6]]
+        items.append({
+            "config": config.label,
+            "model": config.model,
+            "output_format": config.output_format,
+            "key_point_mode": config.key_point_mode,
+            "answers": len(results),
+            "errors": len(errors),
+            "sample_error": errors[0] if errors else None,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+            "latency_ms": {f"p{p}": _num(percentiles[j, i], 1) for j, p in enumerate(PERCENTILES)},
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "json_retries": retries,
+            "estimated_cost_usd": estimate_cost(config.model, prompt_tokens, completion_tokens, cached_tokens),
+            "agreement": {name: (int(values[i]) if name == "n" else _num(values[i])) for name, values in stats.items()},
+        })
+    return {"answers": len(answers), "skipped_no_rubric": skipped,
+            "teacher_mean": _num(teacher.mean()) if teacher.size else None, "configs": items}
+
+
+def recommend(report, max_mae):
+    """Fastest config by p95 latency whose MAE is within max_mae"""
+    eligible = [item for item in report["configs"]
+                if item["agreement"]["mae"] is not None and item["agreement"]["mae"] <= max_mae
+                and item["latency_ms"]["p95"] is not None]
+    return min(eligible, key=lambda item: item["latency_ms"]["p95"], default=None)
+
+
+def print_report(report, args):
+    print(f"Replayed {report['answers']} reviewed answers ({report['skipped_no_rubric']} skipped without a stored rubric), "
+          f"concurrency {args.concurrency} per config")
+    print("=" * 128)
+    print(f"{'config':<32}{'errors':>7}{'p50 ms':>9}{'p90 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'tok in':>10}{'tok out':>9}{'cost $':>9}{'MAE':>7}{'RMSE':>7}{'bias':>7}{'r':>7}{'<=1pt':>7}")
+    for item in report["configs"]:
+        lat, agree = item["latency_ms"], item["agreement"]
+        cost = f"{item['estimated_cost_usd']:.4f}" if item["estimated_cost_usd"] is not None else "n/a"
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else "n/a"
+
+        print(f"{item['config'][:31]:<32}{item['errors']:>7}{fmt(lat['p50'], '>9.0f')}{fmt(lat['p90'], '>9.0f')}"
+              f"{fmt(lat['p95'], '>9.0f')}{fmt(lat['p99'], '>9.0f')}{item['prompt_tokens']:>10}{item['completion_tokens']:>9}"
+              f"{cost:>9}{fmt(agree['mae'], '>7.2f')}{fmt(agree['rmse'], '>7.2f')}{fmt(agree['bias'], '>+7.2f')}"
+              f"{fmt(agree['pearson_r'], '>7.2f')}{fmt(agree['within_1'], '>7.0%')}")
+    print("-" * 128)
+    for item in report["configs"]:
+        if item["sample_error"]:
+            print(f"{item['config']}: {item['errors']} errors, e.g. {item['sample_error'][:160]}")
+    if args.max_mae is not None:
+        best = recommend(report, args.max_mae)
+        if best is None:
+            print(f"No config has MAE <= {args.max_mae:g}")
+        else:
+            print(f"Fastest config with MAE <= {args.max_mae:g}: {best['config']} "
+                  f"(p95 {best['latency_ms']['p95']:.0f} ms, MAE {best['agreement']['mae']:.2f})")
+
+
+def main():
+    args = parse_args()
+    if args.db_url:
+        os.environ["DB_URL"] = args.db_url
+    answers, skipped = load_reviewed_answers(args.question_id, args.limit)
+    if not answers:
+        print("No reviewed answers (final_score set) with a known rubric to replay")
+        sys.exit(1)
+
+    # Every config runs at the same time so they see the same provider conditions
+    with ThreadPoolExecutor(max_workers=len(args.configs)) as executor:
+        futures = [executor.submit(run_config, config, answers, max(1, args.concurrency), args.timeout)
+                   for config in args.configs]
+        runs = [future.result() for future in futures]
+
+    report = build_report(args.configs, answers, runs, skipped)
+    print_report(report, args)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Load test the API with the local stub LLM
+
+Usage:
+    python benchmarks/load_test.py --rps 20 --duration 30                 # in-process (ASGI transport)
+    python benchmarks/load_test.py --server uvicorn --workers 2 --rps 50  # spawned uvicorn server
+    python benchmarks/load_test.py --base-url http://localhost:8000      # already running server
+
+With --base-url, detail/review requests use evaluation ids listed by the target
+(GET /evaluations as the bench teacher); a mix that needs them is rejected when
+the target has none.
+
+The app runs with LLM_PROVIDER=stub, so the full call_llm pipeline (prompt building,
+JSON parsing, retries) is exercised against a simulated provider. Requests are sent
+open-loop at the target rate; latency is measured from each request's scheduled
+start so client-side queueing is not hidden (no coordinated omission).
+Reports p50/p95/p99 latency, throughput and error rates per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEACHER_ID = "bench-teacher"
+STUDENT_ID = "bench-student"
+QUESTION_ID = "BENCH_Q1"
+QUESTION_TEXT = "Briefly describe how to implement reliable dependency management and failure recovery in Airflow."
+ANSWERS = [
+    "I define task dependencies in the DAG, set retries with exponential backoff and make each task idempotent so reruns are safe.",
+    "Airflow schedules DAGs. When a task fails it is retried. We also use SLAs and alerts to notice failures and pools to limit concurrency.",
+    "Use sensors for upstream data, trigger rules for branching, retries and on_failure_callback for recovery, and backfill for missed runs. "
+    "Keep tasks idempotent by writing to partitioned targets and use pools and queues so a backlog cannot starve other DAGs.",
+]
+DEFAULT_MIX = "evaluate=4,list=3,detail=2,review=1"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the answer evaluation API with a stub LLM")
+    parser.add_argument("--server", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--base-url", help="Target an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --server uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="Client-side concurrency cap")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted workload mix (default {DEFAULT_MIX})")
+    parser.add_argument("--db-url", help="Database URL (default: temporary SQLite file)")
+    parser.add_argument("--seed-evaluations", type=int, default=1000, help="Evaluations inserted before the run")
+    parser.add_argument("--skip-seed", action="store_true", help="Use the database as is (e.g. generated dataset)")
+    parser.add_argument("--stub-latency", default="lognormal:800:0.4", help="Stub LLM latency distribution")
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    parser.add_argument("--stub-malformed-rate", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, help="In-process worker thread limit for sync handlers")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show API log output (simulated failures log errors)")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Must run before importing the api package"""
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'bench.db')}"
+    os.environ["DB_URL"] = db_url
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["STUB_LLM_LATENCY"] = args.stub_latency
+    os.environ["STUB_LLM_FAILURE_RATE"] = str(args.stub_failure_rate)
+    os.environ["STUB_LLM_MALFORMED_RATE"] = str(args.stub_malformed_rate)
+    return db_url
+
+
+def prepare_database(seed_evaluations: int, skip_seed: bool):
+    """Create schema, benchmark users/question and seed evaluations; returns evaluation ids"""
+    from sqlalchemy import insert, select
+    from api.db import init_db, SessionLocal, User, Question, AnswerEvaluation
+
+    init_db()
+    sess = SessionLocal()
+    try:
+        if not skip_seed:
+            for user_id, role in ((TEACHER_ID, "teacher"), (STUDENT_ID, "student")):
+                if sess.get(User, user_id) is None:
+                    sess.add(User(id=user_id, username=user_id, role=role))
+            if sess.query(Question).filter(Question.question_id == QUESTION_ID).first() is None:
+                sess.add(Question(question_id=QUESTION_ID, text=QUESTION_TEXT, topic="airflow"))
+            sess.commit()
+            rows = [{
+                "question_id": QUESTION_ID,
+                "student_id": STUDENT_ID,
+                "student_answer": random.choice(ANSWERS),
+                "auto_score": round(random.uniform(3, 9), 1),
+                "dimension_scores_json": {"accuracy": 1.5},
+                "model_version": "stub:seed",
+                "rubric_version": "topic-airflow-v1",
+                "raw_llm_output": {},
+            } for _ in range(seed_evaluations)]
+            for start in range(0, len(rows), 1000):
+                sess.execute(insert(AnswerEvaluation), rows[start:start + 1000])
+            sess.commit()
+        return [row[0] for row in sess.execute(select(AnswerEvaluation.id).limit(100_000))]
+    finally:
+        sess.close()
+
+
+def fetch_evaluation_ids(base_url: str, max_ids: int = 1000):
+    """Evaluation ids listed by an already running server, as the benchmark teacher"""
+    import httpx
+    ids = []
+    with httpx.Client(base_url=base_url, headers={"X-User-Token": TEACHER_ID}, timeout=30) as client:
+        while len(ids) < max_ids:
+            response = client.get("/evaluations", params={"limit": 100, "offset": len(ids)})
+            if response.status_code != 200:
+                raise SystemExit(f"Could not list evaluations on {base_url} as {TEACHER_ID}: "
+                                 f"{response.status_code} {response.text[:200]}")
+            items = response.json()["items"]
+            ids.extend(item["id"] for item in items)
+            if len(items) < 100:
+                break
+    return ids
+
+
+def parse_mix(spec: str):
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("evaluate", "list", "detail", "review"):
+            raise SystemExit(f"Unknown workload '{name}' in --mix")
+        weights[name.strip()] = float(weight or 1)
+    return list(weights), list(weights.values())
+
+
+def check_mix(spec: str, evaluation_ids):
+    """detail/review need existing evaluations; refuse rather than measure a different mix"""
+    kinds, weights = parse_mix(spec)
+    needs_ids = [kind for kind, weight in zip(kinds, weights) if kind in ("detail", "review") and weight > 0]
+    if needs_ids and not evaluation_ids:
+        raise SystemExit(f"No evaluations available for {'/'.join(needs_ids)} requests; "
+                         f"seed the target or drop them from --mix")
+
+
+def build_request(kind: str, evaluation_ids):
+    teacher = {"X-User-Token": TEACHER_ID}
+    if kind == "evaluate":
+        body = {"question_id": QUESTION_ID, "student_answer": random.choice(ANSWERS)}
+        return "evaluate", "POST", "/evaluate/short-answer", {"X-User-Token": STUDENT_ID}, body
+    if kind == "list":
+        return kind, "GET", f"/evaluations?limit=20&offset={random.randint(0, 200)}", teacher, None
+    evaluation_id = random.choice(evaluation_ids)
+    if kind == "detail":
+        return kind, "GET", f"/evaluations/{evaluation_id}", teacher, None
+    body = {"evaluation_id": evaluation_id, "final_score": round(random.uniform(0, 10), 1), "review_notes": "load test"}
+    return kind, "POST", "/review/save", teacher, body
+
+
+async def run_load(client, args, evaluation_ids):
+    kinds, weights = parse_mix(args.mix)
+    results = defaultdict(list)  # kind -> [(latency_s, status)]
+    semaphore = asyncio.Semaphore(args.max_in_flight)
+    total = int(args.rps * args.duration)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def one(scheduled_at, request):
+        kind, method, url, headers, body = request
+        async with semaphore:
+            try:
+                response = await client.request(method, url, headers=headers, json=body)
+                status = response.status_code
+            except Exception as exc:
+                status = type(exc).__name__
+        results[kind].append((loop.time() - scheduled_at, status))
+
+    tasks = []
+    for i in range(total):
+        scheduled_at = started + i / args.rps
+        delay = scheduled_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = build_request(random.choices(kinds, weights)[0], evaluation_ids)
+        tasks.append(asyncio.create_task(one(scheduled_at, request)))
+    await asyncio.gather(*tasks)
+    return results, loop.time() - started
+
+
+def summarize(results, elapsed):
+    report = {"elapsed_s": round(elapsed, 2), "endpoints": {}}
+    total = 0
+    for kind, samples in sorted(results.items()):
+        latencies = np.array([latency for latency, _ in samples]) * 1000
+        errors = defaultdict(int)
+        for _, status in samples:
+            if not (isinstance(status, int) and status < 400):
+                errors[str(status)] += 1
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report["endpoints"][kind] = {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "error_rate": round(sum(errors.values()) / len(samples), 4),
+            "errors": dict(errors),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(float(latencies.max()), 1),
+        }
+        total += len(samples)
+    report["total_requests"] = total
+    report["throughput_rps"] = round(total / elapsed, 2) if elapsed else 0.0
+    return report
+
+
+def print_report(report, args):
+    print(f"Target {args.rps:g} rps for {args.duration:g}s, mix {args.mix}, stub latency {args.stub_latency}")
+    print("=" * 96)
+    print(f"{'endpoint':<10}{'requests':>9}{'rps':>8}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  error detail")
+    for kind, row in report["endpoints"].items():
+        detail = ", ".join(f"{k}: {v}" for k, v in row["errors"].items())
+        print(f"{kind:<10}{row['requests']:>9}{row['throughput_rps']:>8.1f}{row['error_rate']:>9.1%}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}  {detail}")
+    print("-" * 96)
+    print(f"Total {report['total_requests']} requests in {report['elapsed_s']}s, {report['throughput_rps']} rps achieved")
+
+
+def start_uvicorn(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(),
+    )
+    import httpx
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/docs", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("uvicorn did not become ready within 30s")
+
+
+async def main_async(args, evaluation_ids, base_url):
+    import httpx
+    timeout = httpx.Timeout(120.0)
+    limits = httpx.Limits(max_connections=args.max_in_flight)
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+            return await run_load(client, args, evaluation_ids)
+
+    from api.main import app
+    if args.threads:
+        from anyio.to_thread import current_default_thread_limiter
+        current_default_thread_limiter().total_tokens = args.threads
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+        return await run_load(client, args, evaluation_ids)
+
+
+def main():
+    args = parse_args()
+    if not args.verbose:
+        logging.getLogger().addHandler(logging.NullHandler())
+    db_url = configure_environment(args)
+    if args.base_url:
+        evaluation_ids = fetch_evaluation_ids(args.base_url)
+        print(f"Target: {args.base_url} ({len(evaluation_ids)} evaluations)")
+    else:
+        print(f"Database: {db_url}")
+        evaluation_ids = prepare_database(args.seed_evaluations, args.skip_seed)
+    check_mix(args.mix, evaluation_ids)
+
+    process, base_url = None, args.base_url
+    if not base_url and args.server == "uvicorn":
+        process, base_url = start_uvicorn(args)
+    try:
+        results, elapsed = asyncio.run(main_async(args, evaluation_ids, base_url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = summarize(results, elapsed)
+    print_report(report, args)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
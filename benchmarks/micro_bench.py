@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the CPU-bound per-request paths
+
+Usage:
+    python benchmarks/micro_bench.py                      # run and compare against the stored baseline
+    python benchmarks/micro_bench.py --save               # run and store the results as the new baseline
+    python benchmarks/micro_bench.py --filter prompt      # only benchmarks whose name contains "prompt"
+    python benchmarks/micro_bench.py --fail-on-regression # exit 1 when a benchmark is slower than the tolerance
+
+Each benchmark is calibrated to run about --target-ms per repeat; the median and
+best per-call times over --repeats are recorded; the comparison uses the best time,
+which is the least sensitive to scheduler noise. Baselines are machine specific,
+so regenerate them with --save on the machine that runs the comparison.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Importing api.main builds the app; keep it off any real database
+os.environ.setdefault("DB_URL", "sqlite://")
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "micro_bench.json")
+
+QUESTION = "Briefly describe how to implement reliable dependency management and failure recovery in Airflow."
+ANSWER = (
+    "Use sensors for upstream data, trigger rules for branching, retries and on_failure_callback for recovery, "
+    "and backfill for missed runs. Keep tasks idempotent by writing to partitioned targets and use pools and "
+    "queues so a backlog cannot starve other DAGs."
+)
+LLM_OUTPUT = {
+    "total_score": 6.5,
+    "dimension_breakdown": {"accuracy": 1.5, "structure": 1.2, "clarity": 1.4, "business": 1.0, "language": 1.4},
+    "key_points_evaluation": [
+        "DAG/Task semantics and scheduling cycles -> ok, dependencies are defined in the DAG",
+        "Dependencies and retry strategies -> ok, retries with exponential backoff are mentioned",
+        "Idempotency and repeatable execution -> ok, idempotent tasks are described",
+        "Monitoring and alerting (SLAs/backfill) -> missing, no monitoring or SLA discussion",
+        "Resource/queue/concurrency control -> missing, pools and queues are not discussed",
+    ],
+    "improvement_recommendations": [
+        "Explain how SLAs, alerting and on_failure_callback surface failures to the on-call team",
+        "Describe how pools, queues and max_active_runs control resource usage and concurrency",
+        "Add a concrete business example showing the impact of a failed upstream dependency",
+    ],
+}
+
+
+def build_benchmarks():
+    """name -> zero-argument callable exercising one hot path"""
+    from fastapi.responses import JSONResponse
+    from api.llm_client import build_prompt
+    from api.main import app
+    from api.scoring import model_metadata
+    from api.models import EvaluationListItem, EvaluationListResponse, EvaluationResult, LLMScorePayload
+    from api.prompt_cache import prompt_prefix_cache, rubric_fingerprint
+    from api.rubric_service import TOPIC_DEFAULT
+
+    rubric = TOPIC_DEFAULT["airflow"]
+    llm_text = json.dumps(LLM_OUTPUT, indent=2)
+    result_fields = {
+        **LLM_OUTPUT,
+        "question_id": "Q2105",
+        "rubric_version": rubric["version"],
+        "provider": "openai",
+        "model_id": "gpt-4o-mini",
+        "model_version": "openai:gpt-4o-mini",
+        "model_tier": "single",
+        "raw_llm_output": LLM_OUTPUT,
+    }
+
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    rows = [SimpleNamespace(
+        id=i, question_id="Q2105", student_id=f"student{i % 7:03d}", auto_score=6.5, final_score=7.0 if i % 3 else None,
+        created_at=now - timedelta(minutes=i), updated_at=now, reviewer_id="teacher001" if i % 3 else None,
+    ) for i in range(100)]
+    list_route = next(r for r in app.routes if getattr(r, "path", None) == "/evaluations"
+                      and "GET" in getattr(r, "methods", ()))
+    response_field = list_route.response_field
+
+    def evaluation_list_response_100():
+        # Mirrors list_evaluations plus FastAPI's response validation, serialization and rendering
+        items = [EvaluationListItem(
+            id=row.id, question_id=row.question_id, student_id=row.student_id, auto_score=row.auto_score,
+            final_score=row.final_score, created_at=row.created_at, updated_at=row.updated_at,
+            reviewer_id=row.reviewer_id,
+        ) for row in rows]
+        value, errors = response_field.validate(EvaluationListResponse(total=1000, items=items), {}, loc=("response",))
+        return JSONResponse(response_field.serialize(value, mode="json")).body
+
+    prompt_prefix_cache.reset()
+    cache_key = ("Q2105", rubric["version"], rubric_fingerprint(rubric))
+    return {
+        "build_prompt": lambda: build_prompt(QUESTION, rubric, ANSWER),
+        "build_prompt_cached_prefix": lambda: build_prompt(QUESTION, rubric, ANSWER, cache_key=cache_key),
+        "build_prompt_compact": lambda: build_prompt(QUESTION, rubric, ANSWER, output_format="compact"),
+        "json_loads_llm_output": lambda: json.loads(llm_text),
+        "llm_score_payload_validate": lambda: LLMScorePayload.model_validate(LLM_OUTPUT),
+        "evaluation_result_validate": lambda: EvaluationResult(**result_fields),
+        "model_metadata": model_metadata,
+        "evaluation_list_response_100": evaluation_list_response_100,
+    }
+
+
+def measure(func, repeats: int, target_ms: float):
+    """Per-call seconds for each repeat, with the loop count calibrated to target_ms"""
+    func()
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000 >= target_ms / 4 or loops >= 10_000_000:
+            break
+        loops *= 2
+    loops = max(1, int(loops * target_ms / 1000 / max(elapsed, 1e-9)))
+    timings = []
+    # Like timeit: collector pauses are not part of the measured path
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            timings.append((time.perf_counter() - started) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return loops, timings
+
+
+def run(benchmarks, repeats: int, target_ms: float):
+    results = {}
+    for name, func in benchmarks.items():
+        loops, timings = measure(func, repeats, target_ms)
+        results[name] = {
+            "median_us": round(statistics.median(timings) * 1e6, 3),
+            "best_us": round(min(timings) * 1e6, 3),
+            "loops": loops,
+        }
+    return results
+
+
+def load_baseline(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "benchmarks": results,
+        }, f, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, tolerance: float):
+    """Rows of (name, current, baseline, change, status); status is ok/faster/REGRESSION/new"""
+    rows = []
+    stored = (baseline or {}).get("benchmarks", {})
+    for name, result in results.items():
+        current = result["best_us"]
+        previous = stored.get(name, {}).get("best_us")
+        if previous is None:
+            rows.append((name, current, None, None, "new"))
+            continue
+        change = current / previous - 1
+        status = "REGRESSION" if change > tolerance else "faster" if change < -tolerance else "ok"
+        rows.append((name, current, previous, change, status))
+    return rows
+
+
+def print_report(rows, baseline, tolerance: float):
+    if baseline:
+        print(f"Baseline: python {baseline.get('python')} on {baseline.get('machine')}, saved {baseline.get('saved_at')}")
+    else:
+        print("No baseline stored; run with --save to create one")
+    print(f"Tolerance: {tolerance:.0%} on best time per call")
+    print("=" * 84)
+    print(f"{'benchmark':<32}{'best us':>12}{'baseline us':>14}{'change':>10}  status")
+    for name, current, previous, change, status in rows:
+        previous_text = f"{previous:>14.2f}" if previous is not None else f"{'-':>14}"
+        change_text = f"{change:>+10.1%}" if change is not None else f"{'-':>10}"
+        print(f"{name:<32}{current:>12.2f}{previous_text}{change_text}  {status}")
+    print("-" * 84)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark the hot pure-Python request paths")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--target-ms", type=float, default=200.0, help="Approximate time per repeat")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when any benchmark regressed")
+    parser.add_argument("--json", dest="json_path", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    benchmarks = build_benchmarks()
+    if args.filter:
+        benchmarks = {name: func for name, func in benchmarks.items() if args.filter in name}
+    results = run(benchmarks, args.repeats, args.target_ms)
+
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.tolerance)
+    print_report(rows, baseline, args.tolerance)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "comparison": [
+                {"name": name, "best_us": current, "baseline_us": previous, "change": change, "status": status}
+                for name, current, previous, change, status in rows
+            ]}, f, indent=2)
+    if args.save:
+        if args.filter and baseline:
+            baseline["benchmarks"].update(results)
+            results = baseline["benchmarks"]
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+    regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Offline batch grading without the HTTP API
+
+Usage:
+    python run_batch_grading.py answers.jsonl
+    python run_batch_grading.py answers.csv --output graded.jsonl --concurrency 16 --write-db
+    python run_batch_grading.py answers.jsonl --output graded.jsonl --resume   # continue after an interruption
+
+Each input row needs question_id and answer (or student_answer); student_id is optional.
+Questions must exist in the database; their rubrics are resolved like the API does.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.batch_grading import BatchOptions, grade_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Grade a JSONL/CSV file of answers offline")
+    parser.add_argument("input", help="JSONL or CSV file of (question_id, student_id, answer)")
+    parser.add_argument("--output", help="Results JSONL (default: <input>.graded.jsonl)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Input format (default: from the file extension)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Answers scored in parallel")
+    parser.add_argument("--timeout", type=float, help="Per-answer LLM time budget in seconds")
+    parser.add_argument("--write-db", action="store_true", help="Also store results as answer evaluations")
+    parser.add_argument("--db-batch-size", type=int, default=200, help="Rows per database insert")
+    parser.add_argument("--resume", action="store_true", help="Skip input lines already in the output file")
+    parser.add_argument("--retry-errors", action="store_true", help="With --resume, regrade rows that failed")
+    parser.add_argument("--limit", type=int, help="Grade at most this many rows in this run")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output = args.output or os.path.splitext(args.input)[0] + ".graded.jsonl"
+    options = BatchOptions(
+        concurrency=max(1, args.concurrency),
+        timeout=args.timeout,
+        write_db=args.write_db,
+        db_batch_size=max(1, args.db_batch_size),
+        resume=args.resume,
+        retry_errors=args.retry_errors,
+        limit=args.limit,
+    )
+    print("=" * 60)
+    print("Batch Grading")
+    print("=" * 60)
+    print(f"Input:  {args.input}")
+    print(f"Output: {output}")
+    try:
+        stats = grade_file(args.input, output, options, fmt=args.format)
+    except FileExistsError as exc:
+        print(f"{exc} (pass --resume)")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; rerun with --resume to continue from {output}")
+        sys.exit(130)
+    print(f"Graded {stats.succeeded} answers, {stats.failed} errors, {stats.skipped} skipped (already done)")
+    if options.write_db:
+        print(f"   Stored {stats.persisted} evaluations in the database")
+    if stats.failed:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Bulk import questions, rubrics or users from JSONL/CSV straight into the database
+
+Usage:
+    python run_bulk_import.py questions question_bank.jsonl
+    python run_bulk_import.py rubrics rubrics.csv --on-conflict skip --errors rubric_errors.jsonl
+    python run_bulk_import.py users roster.csv --on-conflict error
+
+Questions: question_id, text, topic (optional); upserted by question_id.
+Rubrics: question_id, version, rubric_json (JSON string in CSV), is_active (optional);
+upserted by (question_id, version).
+Users: id, username, role (optional, student or teacher; new users default to student); upserted by id.
+Invalid rows are reported and do not stop the import.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.bulk_import import DEFAULT_BATCH_SIZE, IMPORTERS, ON_CONFLICT
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk import questions, rubrics or users")
+    parser.add_argument("kind", choices=sorted(IMPORTERS), help="What the file contains")
+    parser.add_argument("input", help="JSONL or CSV file")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Input format (default: from the file extension)")
+    parser.add_argument("--on-conflict", choices=ON_CONFLICT, default="update",
+                        help="Rows whose key already exists: update (default), skip or report an error")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--created-by", default="import", help="created_by recorded on new rubrics")
+    parser.add_argument("--errors", help="Write every row error to this JSONL file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    importer = IMPORTERS[args.kind](on_conflict=args.on_conflict, batch_size=args.batch_size,
+                                    created_by=args.created_by, max_errors=None)
+    print("=" * 60)
+    print(f"Bulk import: {args.kind} from {args.input}")
+    print("=" * 60)
+    with open(args.input, "rb") as f:
+        try:
+            report = importer.run_stream(iter(lambda: f.read(CHUNK_SIZE), b""), fmt)
+        except ValueError as exc:
+            print(f"Stopped after {importer.report.total} rows: {exc}")
+            sys.exit(1)
+
+    print(f"Rows: {report.total}  created: {report.created}  updated: {report.updated}  "
+          f"skipped: {report.skipped}  errors: {report.failed}")
+    for error in report.errors[:20]:
+        print(f"   line {error['line']} ({error['key'] or '-'}): {error['error']}")
+    if report.failed > 20:
+        print(f"   ... {report.failed - 20} more")
+    if args.errors and report.errors:
+        with open(args.errors, "w", encoding="utf-8") as out:
+            for error in report.errors:
+                out.write(json.dumps(error, ensure_ascii=False) + "\n")
+        print(f"Errors written to {args.errors}")
+    if report.failed:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Bulk grading through the provider's asynchronous batch API
+
+Usage:
+    python run_llm_batch.py submit answers.jsonl --manifest regrade.manifest.json
+    python run_llm_batch.py status regrade.manifest.json
+    python run_llm_batch.py ingest regrade.manifest.json --wait      # poll until done, then store evaluations
+    python run_llm_batch.py resubmit regrade.manifest.json           # after the batch failed or expired
+    python run_llm_batch.py run answers.jsonl --manifest regrade.manifest.json   # all of the above
+
+Input rows are the same as run_batch_grading.py (question_id, answer, optional student_id).
+LLM_BATCH_BACKEND selects openai or the local file-based stand-in (default with LLM_PROVIDER=stub).
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.llm_batch import (
+    BatchNotReadyError, get_backend, ingest_batch, load_manifest, poll_batch, prepare_batch, submit_batch,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Grade answers with the provider batch API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("submit", "run"):
+        p = sub.add_parser(name, help="Build and submit a batch" if name == "submit" else "Submit, wait and ingest")
+        p.add_argument("input", help="JSONL or CSV file of (question_id, student_id, answer)")
+        p.add_argument("--manifest", help="Manifest path (default: <input>.manifest.json)")
+        p.add_argument("--format", choices=("jsonl", "csv"), help="Input format (default: from the file extension)")
+        p.add_argument("--backend", choices=("openai", "local"), help="Overrides LLM_BATCH_BACKEND")
+        if name == "run":
+            p.add_argument("--interval", type=float, default=30.0, help="Seconds between status polls")
+            p.add_argument("--results", help="Per-row results JSONL (default: <manifest>.results.jsonl)")
+
+    p = sub.add_parser("status", help="Show batch progress")
+    p.add_argument("manifest")
+
+    p = sub.add_parser("resubmit", help="Submit a manifest again after its batch failed or expired")
+    p.add_argument("manifest")
+    p.add_argument("--backend", choices=("openai", "local"), help="Overrides LLM_BATCH_BACKEND")
+
+    p = sub.add_parser("ingest", help="Store the results of a finished batch")
+    p.add_argument("manifest")
+    p.add_argument("--wait", action="store_true", help="Poll until the batch finishes")
+    p.add_argument("--interval", type=float, default=30.0, help="Seconds between status polls")
+    p.add_argument("--results", help="Per-row results JSONL (default: <manifest>.results.jsonl)")
+    return parser.parse_args()
+
+
+def _default_results(manifest: str) -> str:
+    return os.path.splitext(manifest)[0] + ".results.jsonl"
+
+
+def _print_info(info):
+    print(f"Batch {info.id}: {info.status} ({info.completed}/{info.total} done, {info.failed} failed)")
+
+
+def _submit(args) -> str:
+    manifest_path = args.manifest or os.path.splitext(args.input)[0] + ".manifest.json"
+    manifest = prepare_batch(args.input, manifest_path, fmt=args.format)
+    errors = sum(1 for row in manifest["rows"].values() if "error" in row)
+    print(f"Prepared {manifest['request_count']} requests, {len(manifest['local_results'])} pre-screened, "
+          f"{errors} invalid rows")
+    info = submit_batch(manifest_path, backend=get_backend(args.backend))
+    _print_info(info)
+    print(f"Manifest: {manifest_path}")
+    return manifest_path
+
+
+def _ingest(manifest_path: str, results_path: str, wait: bool, interval: float):
+    if wait:
+        _print_info(poll_batch(manifest_path, wait=True, interval=interval))
+    summary = ingest_batch(manifest_path, results_path)
+    print(f"Stored {summary['succeeded']} evaluations, {summary['failed']} errors -> {results_path}")
+    if summary["failed"]:
+        sys.exit(2)
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == "submit":
+            _submit(args)
+        elif args.command == "status":
+            _print_info(poll_batch(args.manifest))
+        elif args.command == "resubmit":
+            backend = get_backend(args.backend or load_manifest(args.manifest)["backend"])
+            _print_info(submit_batch(args.manifest, backend=backend))
+        elif args.command == "ingest":
+            _ingest(args.manifest, args.results or _default_results(args.manifest), args.wait, args.interval)
+        else:
+            manifest_path = _submit(args)
+            _ingest(manifest_path, args.results or _default_results(manifest_path), True, args.interval)
+    except (FileExistsError, BatchNotReadyError, RuntimeError) as exc:
+        print(exc)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted; the batch keeps running at the provider, use `status` / `ingest` to continue")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+测试题目与评分标准批量导入
+"""
+import csv
+import io
+import json
+import pytest
+from api.bulk_import import QuestionImporter, iter_records, iter_text_lines
+from api.db import Question, QuestionRubric
+
+
+def _jsonl(rows):
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows)
+
+
+class TestQuestionImport:
+    """测试 POST /questions/import"""
+
+    def test_upsert_and_row_errors(self, client, db_session, sample_question, auth_headers_teacher):
+        """测试新增、更新已有题目，并逐行报告错误"""
+        body = _jsonl([
+            {"question_id": "BULK1", "text": "What is a DAG?", "topic": "airflow"},
+            {"question_id": sample_question.question_id, "text": "Updated text"},
+            "{not json",
+            {"question_id": "BULK2"},
+            {"question_id": "BULK3", "text": "What is XCom?"},
+        ])
+        response = client.post("/questions/import?batch_size=2", content=body, headers=auth_headers_teacher)
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["total"], data["created"], data["updated"], data["failed"]) == (5, 2, 1, 2)
+        assert [(e["line"], e["key"]) for e in data["errors"]] == [(3, None), (4, "BULK2")]
+        assert "Invalid JSON" in data["errors"][0]["error"]
+        assert "text" in data["errors"][1]["error"]
+
+        db_session.expire_all()
+        updated = db_session.query(Question).filter(Question.question_id == sample_question.question_id).one()
+        assert updated.text == "Updated text" and updated.topic == "python"
+        assert db_session.query(Question).filter(Question.question_id.in_(["BULK1", "BULK3"])).count() == 2
+
+    def test_csv_and_conflict_modes(self, client, db_session, sample_question, auth_headers_teacher):
+        """测试 CSV 输入、同一批次重复键以及 skip / error 冲突模式"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["question_id", "text", "topic"])
+        writer.writerow(["CSV1", "First, with a comma", ""])
+        writer.writerow(["CSV1", "Second version\nacross lines", "spark"])
+        writer.writerow([sample_question.question_id, "Ignored", ""])
+        body = buffer.getvalue()
+
+        response = client.post("/questions/import", content=body,
+                               headers={**auth_headers_teacher, "Content-Type": "text/csv"})
+        data = response.json()
+        assert (data["created"], data["updated"], data["skipped"]) == (1, 2, 0)
+        db_session.expire_all()
+        row = db_session.query(Question).filter(Question.question_id == "CSV1").one()
+        assert (row.text, row.topic) == ("Second version\nacross lines", "spark")
+        assert db_session.get(Question, sample_question.id).topic == "python"
+
+        response = client.post("/questions/import?format=csv&on_conflict=skip", content=body,
+                               headers=auth_headers_teacher)
+        assert response.json()["skipped"] == 3
+
+        response = client.post("/questions/import?format=csv&on_conflict=error", content=body,
+                               headers=auth_headers_teacher)
+        data = response.json()
+        assert data["failed"] == 3
+        assert data["errors"][0]["error"] == "CSV1 already exists"
+
+    def test_requires_teacher_and_valid_utf8(self, client, auth_headers_student, auth_headers_teacher):
+        """测试权限与非法编码"""
+        assert client.post("/questions/import", content="", headers=auth_headers_student).status_code == 403
+        response = client.post("/questions/import", content=b"\xff\xfe{}", headers=auth_headers_teacher)
+        assert response.status_code == 400
+
+
+class TestRubricImport:
+    """测试 POST /rubrics/import"""
+
+    def test_rubric_upsert_and_activation(self, client, db_session, sample_question, sample_rubric,
+                                          auth_headers_teacher, test_teacher):
+        """测试评分标准按 (question_id, version) 更新，激活时停用其他版本，题目不存在报错"""
+        rubric = {"version": "x", "dimensions": {"accuracy": 1}, "key_points": ["DAG"]}
+        body = _jsonl([
+            {"question_id": sample_question.question_id, "version": "test-v1", "rubric_json": {**rubric, "key_points": ["New"]}},
+            {"question_id": sample_question.question_id, "version": "bulk-v2", "rubric_json": rubric, "is_active": True},
+            {"question_id": "MISSING", "version": "v1", "rubric_json": rubric},
+            {"question_id": sample_question.question_id, "version": "bulk-v3", "rubric_json": "not a dict"},
+        ])
+        response = client.post("/rubrics/import", content=body, headers=auth_headers_teacher)
+        data = response.json()
+        assert (data["created"], data["updated"], data["failed"]) == (1, 1, 2)
+        errors = {e["line"]: e for e in data["errors"]}
+        assert errors[3] == {"line": 3, "key": "MISSING/v1", "error": "Question MISSING not found"}
+        assert errors[4]["error"].startswith("rubric_json")
+
+        db_session.expire_all()
+        rubrics = {r.version: r for r in db_session.query(QuestionRubric).filter(
+            QuestionRubric.question_id == sample_question.question_id)}
+        assert rubrics["test-v1"].rubric_json["key_points"] == ["New"]
+        assert rubrics["test-v1"].is_active is False
+        assert rubrics["bulk-v2"].is_active is True
+        assert rubrics["bulk-v2"].created_by == test_teacher.id
+
+
+class TestStreamingParsing:
+    """测试分块输入的流式解析"""
+
+    def test_lines_split_across_chunks(self):
+        """测试跨分块的多字节字符与换行"""
+        data = _jsonl([{"question_id": "Q中文", "text": "题目"}, {"question_id": "Q2", "text": "t"}]).encode("utf-8")
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        records = list(iter_records(iter_text_lines(chunks), "jsonl"))
+        assert [r[1]["question_id"] for r in records] == ["Q中文", "Q2"]
+
+    def test_errors_are_capped(self, db_session):
+        """测试错误数量超过上限时截断"""
+        importer = QuestionImporter(max_errors=2)
+        report = importer.run((i, {"question_id": f"E{i}"}, None) for i in range(1, 6))
+        assert report.failed == 5 and len(report.errors) == 2 and report.errors_truncated
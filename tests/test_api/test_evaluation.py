@@ -1,6 +1,7 @@
 """
 测试评估接口
 """
+import json
 import pytest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
@@ -127,3 +128,283 @@ class TestEvaluateShortAnswer:
         # 验证使用了自定义评分标准
         assert mock_call_llm.called
 
+    
+    @patch('api.main.call_llm')
+    def test_deadline_exceeded_reports_stage(self, mock_call_llm, client, sample_question, auth_headers_student, monkeypatch):
+        """测试截止时间不足时取消 LLM 调用并报告超时阶段"""
+        monkeypatch.setenv("EVALUATE_PERSIST_RESERVE_SECONDS", "5")
+        
+        response = client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": "这是一个足够长的答案。"
+            },
+            headers={**auth_headers_student, "X-Request-Timeout": "2"}
+        )
+        
+        assert response.status_code == 504
+        assert response.headers["X-Deadline-Stage"] == "rubric_resolution"
+        assert not mock_call_llm.called
+    
+    def test_short_deadline_with_stored_rubric(self, client, stub_llm, sample_question, sample_rubric, auth_headers_student):
+        """测试最短截止时间下，已有评分标准无需生成，仍可完成评估"""
+        response = client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": "Python has int, float, str, bool, list, tuple, dict and set types."
+            },
+            headers={**auth_headers_student, "X-Request-Timeout": "1"}
+        )
+        
+        assert response.status_code == 200
+    
+    def test_llm_budget_timeout_is_504(self, client, stub_llm, sample_question, sample_rubric,
+                                       auth_headers_student, monkeypatch):
+        """测试 LLM 用尽截止时间分配的预算时返回 504 而不是 502"""
+        monkeypatch.setenv("STUB_LLM_LATENCY", "fixed:3000")
+        
+        response = client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": "Python has int, float, str, bool, list, tuple, dict and set types."
+            },
+            headers={**auth_headers_student, "X-Request-Timeout": "1.2"}
+        )
+        
+        assert response.status_code == 504
+        assert response.headers["X-Deadline-Stage"] == "llm_scoring"
+    
+    @patch('api.main.call_llm')
+    def test_prescreen_skips_llm(self, mock_call_llm, client, sample_question, auth_headers_student):
+        """测试复制题目的答案由本地预筛选评分，不调用 LLM"""
+        response = client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": sample_question.text
+            },
+            headers=auth_headers_student
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_score"] == 0.0
+        assert data["model_version"] == "prescreen:lexical-v1"
+        assert data["raw_llm_output"]["prescreen"]["verdict"] == "copied_question"
+        assert not mock_call_llm.called
+
+
+class TestCascadeStats:
+    """测试 GET /stats/cascade"""
+    
+    def test_cascade_stats(self, client, db_session, sample_evaluation, auth_headers_teacher):
+        """测试教师查看级联统计"""
+        response = client.get("/stats/cascade", headers=auth_headers_teacher)
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert "escalation_rate" in data
+        assert data["tier_counts"]["unknown"] == 1
+    
+    def test_cascade_stats_requires_teacher(self, client, auth_headers_student):
+        """测试学生无权查看级联统计"""
+        response = client.get("/stats/cascade", headers=auth_headers_student)
+        assert response.status_code == 403
+
+
+class TestUsageStats:
+    """测试 token 用量与成本统计"""
+    
+    @patch('api.main.call_llm')
+    def test_usage_persisted_and_aggregated(self, mock_call_llm, client, db_session, sample_question,
+                                            auth_headers_student, auth_headers_teacher, monkeypatch):
+        """测试评估记录保存 token 用量，并按题目/评分标准/模型汇总成本"""
+        monkeypatch.setenv("MODEL_ID", "gpt-4o-mini")
+        monkeypatch.delenv("MODEL_VERSION", raising=False)
+        monkeypatch.delenv("LLM_PROVIDER", raising=False)
+        
+        def fake_call_llm(question_text, rubric, student_answer, timeout=None, stats=None, prompt_cache_key=None):
+            stats.tier, stats.model_id, stats.latency_ms = "single", "gpt-4o-mini", 850.0
+            stats.prompt_tokens, stats.completion_tokens, stats.cached_tokens, stats.retries = 1200, 100, 1024, 1
+            return {
+                "total_score": 7.0,
+                "dimension_breakdown": {"accuracy": 1.5},
+                "key_points_evaluation": [],
+                "improvement_recommendations": []
+            }
+        mock_call_llm.side_effect = fake_call_llm
+        
+        response = client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": "这是一个足够长的答案，用于测试评估功能。"
+            },
+            headers=auth_headers_student
+        )
+        assert response.status_code == 200
+        
+        response = client.get("/stats/usage", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_prompt_tokens"] == 1200
+        item = data["items"][0]
+        assert item["question_id"] == sample_question.question_id
+        assert item["llm_calls"] == 1
+        assert item["cached_tokens"] == 1024
+        assert item["retries"] == 1
+        assert item["avg_latency_ms"] == pytest.approx(850.0)
+        # (176 * 0.15 + 1024 * 0.075 + 100 * 0.6) / 1e6
+        assert item["estimated_cost_usd"] == pytest.approx(0.0001632)
+    
+    def test_usage_stats_requires_teacher(self, client, auth_headers_student):
+        """测试学生无权查看用量统计"""
+        response = client.get("/stats/usage", headers=auth_headers_student)
+        assert response.status_code == 403
+
+
+class TestStageTimings:
+    """测试评估接口的分阶段耗时"""
+    
+    LLM_RESULT = {
+        "total_score": 7.0,
+        "dimension_breakdown": {"accuracy": 1.5},
+        "key_points_evaluation": [],
+        "improvement_recommendations": []
+    }
+    
+    @patch('api.main.call_llm')
+    def test_timings_returned_with_header(self, mock_call_llm, client, sample_question, auth_headers_student, caplog):
+        """测试请求头开启时返回各阶段耗时，并输出结构化日志"""
+        mock_call_llm.return_value = self.LLM_RESULT
+        
+        with caplog.at_level("INFO", logger="api.timings"):
+            response = client.post(
+                "/evaluate/short-answer",
+                json={
+                    "question_id": sample_question.question_id,
+                    "student_answer": "这是一个足够长的答案，用于测试评估功能。"
+                },
+                headers={**auth_headers_student, "X-Include-Timings": "true"}
+            )
+        
+        assert response.status_code == 200
+        timings = response.json()["timings"]
+        for stage in ("auth", "question_lookup", "rubric_resolution", "llm_scoring", "validation", "persistence", "total"):
+            assert stage in timings
+        assert timings["total"] >= timings["llm_scoring"]
+        
+        records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "api.timings"]
+        assert records[-1]["status"] == 200
+        assert records[-1]["question_id"] == sample_question.question_id
+    
+    @patch('api.main.call_llm')
+    def test_timings_omitted_by_default(self, mock_call_llm, client, sample_question, auth_headers_student):
+        """测试默认不返回耗时"""
+        mock_call_llm.return_value = self.LLM_RESULT
+        
+        response = client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": "这是一个足够长的答案，用于测试评估功能。"
+            },
+            headers=auth_headers_student
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["timings"] is None
+    
+    def test_timings_logged_on_error(self, client, auth_headers_student, caplog):
+        """测试失败请求也记录耗时日志"""
+        with caplog.at_level("INFO", logger="api.timings"):
+            response = client.post(
+                "/evaluate/short-answer",
+                json={"question_id": "NON_EXISTENT", "student_answer": "这是一个足够长的答案。"},
+                headers=auth_headers_student
+            )
+        
+        assert response.status_code == 404
+        records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "api.timings"]
+        assert records[-1]["status"] == 404
+
+
+class TestMetricsEndpoint:
+    """测试 GET /metrics"""
+    
+    @patch('api.main.call_llm')
+    def test_metrics_exposed(self, mock_call_llm, client, sample_question, auth_headers_student):
+        """测试评估请求后可以抓取到路由延迟与评分标准来源指标"""
+        mock_call_llm.return_value = TestStageTimings.LLM_RESULT
+        client.post(
+            "/evaluate/short-answer",
+            json={
+                "question_id": sample_question.question_id,
+                "student_answer": "这是一个足够长的答案，用于测试评估功能。"
+            },
+            headers=auth_headers_student
+        )
+        
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'http_request_duration_seconds_count{route="/evaluate/short-answer",method="POST"}' in body
+        assert "rubric_resolutions_total" in body
+        assert "evaluations_in_flight 0" in body
+        assert "threadpool_queue_depth" in body
+
+
+class TestTracing:
+    """测试评估请求的追踪 span"""
+    
+    @patch('api.main.call_llm')
+    def test_evaluate_trace(self, mock_call_llm, client, sample_question, sample_rubric, auth_headers_student):
+        """测试评估请求生成路由、评分标准与各阶段 span"""
+        from api import tracing
+        exporter = tracing.InMemorySpanExporter()
+        previous_rate, previous_exporter = tracing.config.sample_rate, tracing.config.exporter
+        tracing.configure(sample_rate=1.0, exporter=exporter)
+        mock_call_llm.return_value = TestStageTimings.LLM_RESULT
+        try:
+            response = client.post(
+                "/evaluate/short-answer",
+                json={
+                    "question_id": sample_question.question_id,
+                    "student_answer": "这是一个足够长的答案，用于测试评估功能。"
+                },
+                headers=auth_headers_student
+            )
+        finally:
+            tracing.configure(sample_rate=previous_rate, exporter=previous_exporter)
+        
+        assert response.status_code == 200
+        spans = {s.name: s for s in exporter.spans}
+        root = spans["POST /evaluate/short-answer"]
+        assert response.headers["X-Trace-Id"] == root.trace_id
+        assert root.attributes["http.status_code"] == 200
+        assert spans["get_rubric"].attributes["rubric.source"] == "database"
+        assert spans["stage.llm_scoring"].parent_span_id == root.span_id
+        assert all(s.trace_id == root.trace_id for s in exporter.spans)
+
+
+class TestSlowQueryStats:
+    """测试 GET /stats/slow-queries"""
+    
+    def test_slow_query_stats(self, client, auth_headers_teacher):
+        """测试教师查看慢查询聚合"""
+        response = client.get("/stats/slow-queries?slow_only=false", headers=auth_headers_teacher)
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert "threshold_ms" in data
+        assert isinstance(data["items"], list)
+    
+    def test_slow_query_stats_requires_teacher(self, client, auth_headers_student):
+        """测试学生无权查看慢查询"""
+        response = client.get("/stats/slow-queries", headers=auth_headers_student)
+        assert response.status_code == 403
@@ -0,0 +1,92 @@
+"""
+测试评估结果批量导出
+"""
+import csv
+import gzip
+import io
+import json
+import pytest
+from api import export
+from api.db import AnswerEvaluation
+
+
+@pytest.fixture
+def evaluations(db_session, sample_question, test_student, sample_student, test_teacher):
+    """五条评估记录：三条属于 test_student（其中一条已复核），两条属于其他学生"""
+    rows = [
+        AnswerEvaluation(
+            question_id=sample_question.question_id,
+            student_id=test_student.id if i < 3 else sample_student.id,
+            student_answer=f"Answer, with \"quotes\"\nand a newline {i}",
+            auto_score=5.0 + i,
+            final_score=8.0 if i == 0 else None,
+            reviewer_id=test_teacher.id if i == 0 else None,
+            dimension_scores_json={"accuracy": 1.0 + i / 10},
+            model_version="test-model-v1",
+            rubric_version="test-v1",
+            raw_llm_output={"total_score": 5.0 + i}
+        )
+        for i in range(5)
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+class TestExportEvaluations:
+    """测试导出格式、筛选与权限"""
+
+    def test_csv_export(self, client, evaluations, auth_headers_teacher):
+        """测试 CSV 导出包含全部记录，按 id 排序，JSON 列序列化为字符串"""
+        response = client.get("/evaluations/export?format=csv", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="evaluations-' in response.headers["content-disposition"]
+
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [int(r["id"]) for r in rows] == [e.id for e in evaluations]
+        assert rows[0]["student_answer"] == evaluations[0].student_answer
+        assert json.loads(rows[1]["dimension_scores_json"]) == {"accuracy": 1.1}
+        assert rows[1]["final_score"] == ""
+        assert "raw_llm_output" not in rows[0]
+
+    def test_ndjson_gzip_with_filters(self, client, evaluations, test_student, auth_headers_teacher):
+        """测试 gzip 压缩的 NDJSON 以及学生与复核状态筛选"""
+        response = client.get(f"/evaluations/export?format=ndjson&gzip=true&student_id={test_student.id}"
+                              f"&reviewed=false&include_raw=true", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+
+        records = [json.loads(line) for line in gzip.decompress(response.content).decode("utf-8").splitlines()]
+        assert [r["id"] for r in records] == [evaluations[1].id, evaluations[2].id]
+        assert records[0]["raw_llm_output"] == {"total_score": 6.0}
+        assert records[0]["created_at"] is not None
+
+    def test_parquet_export(self, client, evaluations, auth_headers_teacher):
+        """测试 Parquet 导出可被读取，列类型正确"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        response = client.get("/evaluations/export?format=parquet&reviewed=true", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        table = pq.read_table(io.BytesIO(response.content))
+        assert table.num_rows == 1
+        assert table.column("final_score").to_pylist() == [8.0]
+        assert str(table.schema.field("created_at").type) == "timestamp[us, tz=UTC]"
+
+    def test_student_only_exports_own(self, client, evaluations, sample_student, auth_headers_student):
+        """测试学生只能导出自己的记录，student_id 参数被忽略"""
+        response = client.get(f"/evaluations/export?format=ndjson&student_id={sample_student.id}",
+                              headers=auth_headers_student)
+        assert response.status_code == 200
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["id"] for r in records] == [e.id for e in evaluations[:3]]
+
+    def test_invalid_format_and_chunked_stream(self, client, evaluations, auth_headers_teacher, monkeypatch):
+        """测试不支持的格式返回 422，小批量读取时输出被分块发送"""
+        assert client.get("/evaluations/export?format=xlsx", headers=auth_headers_teacher).status_code == 422
+        assert client.get("/evaluations/export").status_code == 401
+
+        monkeypatch.setattr(export, "FLUSH_BYTES", 1)
+        chunks = list(export.iter_export(export.ExportFilters(), "ndjson", fetch_size=2))
+        assert len(chunks) == len(evaluations)
+        assert [json.loads(c)["id"] for c in chunks] == [e.id for e in evaluations]
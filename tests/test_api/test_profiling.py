@@ -0,0 +1,78 @@
+"""
+测试按需请求性能分析
+"""
+import json
+import pstats
+import pytest
+from api.profiling import requested_modes
+
+
+@pytest.fixture
+def profiling_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILING_ENABLED", "true")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    return tmp_path
+
+
+class TestRequestedModes:
+    """测试分析模式解析"""
+    
+    def test_header_and_query_combined(self):
+        """测试请求头与查询参数合并，未知模式被忽略"""
+        assert requested_modes("cpu", "memory,bogus") == {"cpu", "memory"}
+    
+    def test_true_means_cpu(self):
+        """测试 true 等价于 cpu"""
+        assert requested_modes("true", None) == {"cpu"}
+
+
+class TestProfilingHook:
+    """测试教师请求性能分析"""
+    
+    def test_teacher_cpu_profile_stored(self, client, sample_question, auth_headers_teacher, profiling_env):
+        """测试教师请求 cpu 分析后生成 pstats 文件并可下载"""
+        response = client.get(
+            "/questions",
+            headers={**auth_headers_teacher, "X-Profile": "cpu,speedscope"}
+        )
+        
+        assert response.status_code == 200
+        files = response.headers["X-Profile-Files"].split(",")
+        prof = next(f for f in files if f.endswith(".prof"))
+        stats = pstats.Stats(str(profiling_env / prof))
+        assert any(func[2] == "list_questions" for func in stats.stats)
+        speedscope = json.loads((profiling_env / next(f for f in files if f.endswith(".speedscope.json"))).read_text())
+        assert speedscope["profiles"][0]["type"] == "sampled"
+        
+        listing = client.get("/profiles", headers=auth_headers_teacher).json()
+        assert listing["total"] == len(files)
+        download = client.get(f"/profiles/{prof}", headers=auth_headers_teacher)
+        assert download.status_code == 200
+    
+    def test_memory_snapshot(self, client, auth_headers_teacher, profiling_env):
+        """测试 memory 模式生成 tracemalloc 快照与摘要"""
+        response = client.get("/questions?profile=memory", headers=auth_headers_teacher)
+        
+        files = response.headers["X-Profile-Files"].split(",")
+        assert any(f.endswith(".tracemalloc") for f in files)
+        assert any(f.endswith(".memory.txt") for f in files)
+    
+    def test_student_flag_ignored(self, client, auth_headers_student, profiling_env):
+        """测试学生的分析请求被忽略"""
+        response = client.get("/evaluations", headers={**auth_headers_student, "X-Profile": "cpu"})
+        
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        assert list(profiling_env.iterdir()) == []
+    
+    def test_disabled_by_default(self, client, auth_headers_teacher, monkeypatch, profiling_env):
+        """测试未开启时不分析"""
+        monkeypatch.setenv("PROFILING_ENABLED", "false")
+        response = client.get("/questions", headers={**auth_headers_teacher, "X-Profile": "cpu"})
+        assert "X-Profile-Id" not in response.headers
+    
+    def test_download_rejects_path_traversal(self, client, auth_headers_teacher, profiling_env):
+        """测试下载接口拒绝目录穿越"""
+        response = client.get("/profiles/..%2F..%2Fetc%2Fpasswd", headers=auth_headers_teacher)
+        assert response.status_code == 404
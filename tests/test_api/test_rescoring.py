@@ -0,0 +1,221 @@
+"""
+测试评分标准变更后的批量重新评分
+"""
+import subprocess
+import sys
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from api import rescoring
+from api.db import AnswerEvaluation, QuestionRubric
+
+
+@pytest.fixture
+def new_rubric(db_session, sample_question, sample_rubric):
+    """第二个版本的评分标准"""
+    rubric = QuestionRubric(
+        question_id=sample_question.question_id,
+        version="test-v2",
+        rubric_json={**sample_rubric.rubric_json, "version": "test-v2", "key_points": ["Data types", "Mutability"]},
+        is_active=False,
+        created_by="test"
+    )
+    db_session.add(rubric)
+    db_session.commit()
+    return rubric
+
+
+@pytest.fixture
+def old_evaluations(db_session, sample_question, test_student):
+    """四条使用旧评分标准的评估记录"""
+    rows = [
+        AnswerEvaluation(
+            question_id=sample_question.question_id,
+            student_id=test_student.id,
+            student_answer=f"Python has int, float, str and bool types; variant {i}",
+            auto_score=5.0,
+            dimension_scores_json={"accuracy": 1.0},
+            model_version="test-model-v1",
+            rubric_version="test-v1",
+            raw_llm_output={}
+        )
+        for i in range(4)
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+class TestRescoreJobAPI:
+    """测试重新评分任务接口"""
+
+    def test_activate_with_rescore(self, client, db_session, new_rubric, old_evaluations, auth_headers_teacher, stub_llm):
+        """测试激活评分标准时启动重新评分，原记录保持不变"""
+        response = client.post(f"/rubrics/{new_rubric.id}/activate?rescore=true", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        job_id = response.json()["rescore_job_id"]
+        assert job_id is not None
+        assert rescoring.wait_for_job(job_id, timeout=30)
+
+        job = client.get(f"/rescore-jobs/{job_id}", headers=auth_headers_teacher).json()
+        assert job["status"] == "completed"
+        assert job["total"] == 4 and job["succeeded"] == 4 and job["failed"] == 0
+        assert job["last_evaluation_id"] == old_evaluations[-1].id
+
+        db_session.expire_all()
+        new_rows = db_session.query(AnswerEvaluation).filter(AnswerEvaluation.rescored_from_id.isnot(None)).all()
+        assert sorted(r.rescored_from_id for r in new_rows) == [e.id for e in old_evaluations]
+        assert {r.rubric_version for r in new_rows} == {"test-v2"}
+        assert all(db_session.get(AnswerEvaluation, e.id).rubric_version == "test-v1" for e in old_evaluations)
+
+    def test_second_job_skips_rescored(self, client, new_rubric, old_evaluations, auth_headers_teacher, stub_llm):
+        """测试已重新评分的记录不会再次处理"""
+        first = client.post(f"/rubrics/{new_rubric.id}/rescore", json={"concurrency": 2, "chunk_size": 3},
+                            headers=auth_headers_teacher)
+        assert first.status_code == 202
+        assert rescoring.wait_for_job(first.json()["id"], timeout=30)
+
+        second = client.post(f"/rubrics/{new_rubric.id}/rescore", headers=auth_headers_teacher)
+        assert second.status_code == 202
+        assert second.json()["total"] == 0
+        assert rescoring.wait_for_job(second.json()["id"], timeout=30)
+
+        listing = client.get("/rescore-jobs", headers=auth_headers_teacher).json()
+        assert [item["status"] for item in listing["items"]] == ["completed", "completed"]
+
+    def test_invalid_transitions(self, client, new_rubric, old_evaluations, auth_headers_teacher,
+                                 auth_headers_student, stub_llm):
+        """测试状态转换校验与权限"""
+        assert client.post("/rubrics/99999/rescore", headers=auth_headers_teacher).status_code == 404
+        assert client.post("/rescore-jobs/99999/pause", headers=auth_headers_teacher).status_code == 404
+        assert client.post(f"/rubrics/{new_rubric.id}/rescore", headers=auth_headers_student).status_code == 403
+
+        job_id = client.post(f"/rubrics/{new_rubric.id}/rescore", headers=auth_headers_teacher).json()["id"]
+        assert rescoring.wait_for_job(job_id, timeout=30)
+        assert client.post(f"/rescore-jobs/{job_id}/pause", headers=auth_headers_teacher).status_code == 409
+        assert client.post(f"/rescore-jobs/{job_id}/resume", headers=auth_headers_teacher).status_code == 409
+
+
+class TestRescoreRunner:
+    """测试分块检查点与暂停后恢复"""
+
+    def test_pause_and_resume_from_checkpoint(self, db_session, new_rubric, old_evaluations, stub_llm):
+        """测试暂停时保存检查点，恢复后只处理剩余记录"""
+        job = rescoring.create_job(new_rubric.id, "test_teacher", concurrency=1, chunk_size=1)
+        rescoring._set_status(job.id, "running", ("pending",))
+        runner = rescoring.RescoreRunner(job.id)
+        real_score_answer = rescoring.score_answer
+        calls = []
+
+        def score_then_pause(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                rescoring.stop_job(job.id, "paused")
+            return real_score_answer(*args, **kwargs)
+
+        with patch("api.rescoring.score_answer", side_effect=score_then_pause):
+            runner.run()
+
+        paused = rescoring.get_job(job.id)
+        assert paused.status == "paused"
+        assert paused.succeeded == 2
+        assert paused.last_evaluation_id == old_evaluations[1].id
+
+        rescoring.start_job(job.id)
+        assert rescoring.wait_for_job(job.id, timeout=30)
+        done = rescoring.get_job(job.id)
+        assert done.status == "completed"
+        assert done.succeeded == 4
+        assert len(calls) == 2
+
+    def test_failures_are_counted_and_retried(self, db_session, new_rubric, old_evaluations, stub_llm):
+        """测试评分失败计入 failed 且不阻塞后续记录，检查点停在失败记录之前，恢复后重试"""
+        job = rescoring.create_job(new_rubric.id, "test_teacher", concurrency=2, chunk_size=10)
+        rescoring._set_status(job.id, "running", ("pending",))
+        real_score_answer = rescoring.score_answer
+
+        def fail_on_variant_1(question_id, question_text, rubric, version, answer, **kwargs):
+            if answer.endswith("variant 1"):
+                raise ValueError("LLM returned invalid payload")
+            return real_score_answer(question_id, question_text, rubric, version, answer, **kwargs)
+
+        with patch("api.rescoring.score_answer", side_effect=fail_on_variant_1):
+            rescoring.RescoreRunner(job.id).run()
+
+        done = rescoring.get_job(job.id)
+        assert done.status == "failed"
+        assert (done.succeeded, done.failed) == (3, 1)
+        assert "invalid payload" in done.last_error
+        assert done.last_evaluation_id == old_evaluations[0].id
+
+        rescoring.start_job(job.id)
+        assert rescoring.wait_for_job(job.id, timeout=30)
+        done = rescoring.get_job(job.id)
+        assert done.status == "completed"
+        assert (done.succeeded, done.failed) == (4, 0)
+        assert done.owner == rescoring.process_owner() and done.heartbeat_at is not None
+        rescored = db_session.query(AnswerEvaluation).filter(AnswerEvaluation.rescored_from_id.isnot(None)).all()
+        assert sorted(r.rescored_from_id for r in rescored) == [e.id for e in old_evaluations]
+
+
+class TestInterruptedJobs:
+    """测试启动时只暂停失去所属进程的任务"""
+
+    def test_only_orphaned_jobs_paused(self, db_session, new_rubric, monkeypatch):
+        """测试本机存活进程与心跳未过期的任务保持运行，进程已退出、心跳过期或无所属进程的任务被暂停"""
+        monkeypatch.setenv("RESCORE_HEARTBEAT_TIMEOUT_SECONDS", "60")
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        host = rescoring.socket.gethostname()
+        now = datetime.now(timezone.utc)
+        owners = {
+            "this_process": (rescoring.process_owner(), now - timedelta(hours=1)),
+            "exited_process": (f"{host}:{exited.pid}", now),
+            "other_host_recent": ("other-host:123", now - timedelta(seconds=10)),
+            "other_host_stale": ("other-host:123", now - timedelta(seconds=120)),
+            "no_owner": (None, None),
+        }
+        jobs = {}
+        for name, (owner, heartbeat_at) in owners.items():
+            job = rescoring.create_job(new_rubric.id, "test_teacher")
+            rescoring._set_status(job.id, "running", ("pending",), owner=owner, heartbeat_at=heartbeat_at)
+            jobs[name] = job.id
+
+        rescoring.pause_interrupted_jobs()
+
+        statuses = {name: rescoring.get_job(job_id).status for name, job_id in jobs.items()}
+        assert statuses == {
+            "this_process": "running",
+            "exited_process": "paused",
+            "other_host_recent": "running",
+            "other_host_stale": "paused",
+            "no_owner": "paused",
+        }
+
+
+class TestRubricVersionSource:
+    """测试评估与重新评分使用同一个评分标准版本来源"""
+
+    def test_evaluation_uses_column_version(self, client, db_session, sample_question, auth_headers_student,
+                                            auth_headers_teacher, stub_llm):
+        """测试评分标准 JSON 未写 version 时，评估记录使用数据库中的版本号，重新评分不会重复处理"""
+        rubric = QuestionRubric(
+            question_id=sample_question.question_id,
+            version="v2",
+            rubric_json={"dimensions": {"accuracy": 1}, "key_points": ["int", "float", "str"]},
+            is_active=True,
+            created_by="test"
+        )
+        db_session.add(rubric)
+        db_session.commit()
+
+        response = client.post("/evaluate/short-answer", json={
+            "question_id": sample_question.question_id,
+            "student_answer": "Python has int, float, str, bool, list, tuple, dict and set types."
+        }, headers=auth_headers_student)
+        assert response.status_code == 200
+        assert response.json()["rubric_version"] == "v2"
+
+        job = client.post(f"/rubrics/{rubric.id}/rescore", headers=auth_headers_teacher).json()
+        assert job["total"] == 0
+        assert rescoring.wait_for_job(job["id"], timeout=30)
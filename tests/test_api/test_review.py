@@ -59,6 +59,53 @@ class TestReviewSave:
         assert response.status_code == 422  # Validation error
 
 
+class TestReviewSaveBatch:
+    """测试 POST /review/save-batch"""
+
+    def test_save_batch(self, client, db_session, sample_evaluation, test_teacher, auth_headers_teacher):
+        """测试批量保存审核，不存在与重复的评估逐条返回状态"""
+        from api.db import AnswerEvaluation
+        second = AnswerEvaluation(question_id=sample_evaluation.question_id, student_id=sample_evaluation.student_id,
+                                  student_answer="Another answer about data types", auto_score=4.0)
+        db_session.add(second)
+        db_session.commit()
+
+        response = client.post(
+            "/review/save-batch",
+            json={"items": [
+                {"evaluation_id": sample_evaluation.id, "final_score": 8.5, "review_notes": "很好"},
+                {"evaluation_id": 99999, "final_score": 5.0},
+                {"evaluation_id": second.id, "final_score": 3.0},
+                {"evaluation_id": sample_evaluation.id, "final_score": 1.0},
+            ]},
+            headers=auth_headers_teacher
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["total"], data["saved"], data["failed"]) == (4, 2, 2)
+        assert [item["status"] for item in data["items"]] == ["saved", "not_found", "saved", "duplicate"]
+        assert data["items"][0]["auto_score"] == 7.5
+
+        db_session.expire_all()
+        first = db_session.get(AnswerEvaluation, sample_evaluation.id)
+        assert (first.final_score, first.review_notes, first.reviewer_id) == (8.5, "很好", test_teacher.id)
+        assert db_session.get(AnswerEvaluation, second.id).final_score == 3.0
+
+        listed = client.get("/evaluations", headers=auth_headers_teacher).json()["items"]
+        assert {item["id"]: item["review_notes"] for item in listed}[sample_evaluation.id] == "很好"
+
+    def test_validation_and_permission(self, client, auth_headers_teacher, auth_headers_student):
+        """测试空批次、分数越界与学生无权限"""
+        assert client.post("/review/save-batch", json={"items": []}, headers=auth_headers_teacher).status_code == 422
+        response = client.post("/review/save-batch", json={"items": [{"evaluation_id": 1, "final_score": 11}]},
+                               headers=auth_headers_teacher)
+        assert response.status_code == 422
+        response = client.post("/review/save-batch", json={"items": [{"evaluation_id": 1, "final_score": 5}]},
+                               headers=auth_headers_student)
+        assert response.status_code == 403
+
+
 class TestListEvaluations:
     """测试 GET /evaluations"""
     
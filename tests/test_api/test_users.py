@@ -0,0 +1,69 @@
+"""
+测试用户列表分页搜索与批量导入
+"""
+import pytest
+from api.db import User
+
+
+@pytest.fixture
+def roster(db_session, test_teacher):
+    """二十五名学生与一名老师"""
+    users = [User(id=f"s{i:03d}", username=f"Student_{i}", role="student") for i in range(25)]
+    db_session.add_all(users)
+    db_session.commit()
+    return users
+
+
+class TestListUsers:
+    """测试 GET /users"""
+
+    def test_pagination_and_filters(self, client, roster, auth_headers_teacher):
+        """测试分页、角色筛选与搜索（通配符按字面匹配）"""
+        response = client.get("/users?role=student&limit=10&offset=20", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 25 and len(data["items"]) == 5
+
+        pages = [client.get(f"/users?limit=10&offset={o}", headers=auth_headers_teacher).json()["items"]
+                 for o in (0, 10, 20)]
+        ids = [u["id"] for page in pages for u in page]
+        assert len(ids) == len(set(ids)) == 26
+
+        data = client.get("/users?search=STUDENT_1", headers=auth_headers_teacher).json()
+        assert sorted(u["id"] for u in data["items"]) == ["s001"] + [f"s{i:03d}" for i in range(10, 20)]
+        assert client.get("/users?search=%25", headers=auth_headers_teacher).json()["total"] == 0
+
+    def test_requires_teacher(self, client, auth_headers_student):
+        """测试学生不能查看用户列表"""
+        assert client.get("/users", headers=auth_headers_student).status_code == 403
+
+
+class TestImportUsers:
+    """测试 POST /users/import"""
+
+    def test_roster_import(self, client, db_session, roster, test_teacher, auth_headers_teacher):
+        """测试新建、更新、角色校验以及不能降级导入者本人"""
+        body = ("id,username,role\n"
+                "n001,New Student,\n"
+                "s000,Renamed,\n"
+                "n002,Bad Role,admin\n"
+                f"{test_teacher.id},Demoted,student\n")
+        response = client.post("/users/import?format=csv", content=body, headers=auth_headers_teacher)
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["created"], data["updated"], data["failed"]) == (1, 1, 2)
+        errors = {e["line"]: e["error"] for e in data["errors"]}
+        assert "Role must be" in errors[3]
+        assert errors[4] == "Cannot change the role of the importing user"
+
+        db_session.expire_all()
+        assert db_session.get(User, "n001").role == "student"
+        assert db_session.get(User, "s000").username == "Renamed"
+        assert db_session.get(User, test_teacher.id).role == "teacher"
+
+    def test_conflicts_reported(self, client, roster, auth_headers_teacher):
+        """测试 on_conflict=error 时已存在的用户逐行报告"""
+        body = '{"id": "s001", "username": "x"}\n{"id": "n100", "username": "y", "role": "teacher"}\n'
+        data = client.post("/users/import?on_conflict=error", content=body, headers=auth_headers_teacher).json()
+        assert data["created"] == 1
+        assert data["errors"] == [{"line": 1, "key": "s001", "error": "s001 already exists"}]
@@ -123,13 +123,9 @@ class TestAPIAuth:
             assert response.status_code == 200
             assert response.json()["total_score"] == 7.5
     
-    def test_review_requires_teacher(self, client, db_session, sample_evaluation):
+    def test_review_requires_teacher(self, client, db_session, sample_evaluation, test_student):
         """测试判分接口需要老师权限"""
-        # 创建学生用户
-        student = User(id="test_student", username="测试学生", role="student")
-        db_session.add(student)
-        db_session.commit()
-        
+        # sample_evaluation 已创建学生用户 test_student
         # 学生尝试判分，应该被拒绝
         response = client.post(
             "/review/save",
@@ -137,7 +133,7 @@ class TestAPIAuth:
                 "evaluation_id": sample_evaluation.id,
                 "final_score": 8.5
             },
-            headers={"X-User-Token": "test_student"}
+            headers={"X-User-Token": test_student.id}
         )
         
         assert response.status_code == 403
@@ -175,3 +175,31 @@ class TestModelRelationships:
             AnswerEvaluation.id == evaluation_id
         ).first()
         assert evaluation.question_id is None
+
+
+@pytest.mark.mysql
+class TestMySQLIntegration:
+    """MySQL 集成测试（需设置 TEST_DB_URL）"""
+    
+    def test_tables_use_innodb(self, db_session):
+        """测试表使用 InnoDB（外键与保存点依赖它）"""
+        from sqlalchemy import text
+        engines = dict(db_session.execute(text(
+            "SELECT table_name, engine FROM information_schema.tables WHERE table_schema = DATABASE()"
+        )).all())
+        for table in ("questions", "question_rubrics", "answer_evaluations", "users"):
+            assert engines[table].lower() == "innodb"
+    
+    def test_json_roundtrip_unicode(self, db_session, sample_question):
+        """测试 JSON 字段保存中文内容"""
+        rubric = QuestionRubric(
+            question_id=sample_question.question_id,
+            version="mysql-v1",
+            rubric_json={"version": "mysql-v1", "key_points": ["数据类型", "使用场景"]}
+        )
+        db_session.add(rubric)
+        db_session.commit()
+        db_session.expire_all()
+        
+        stored = db_session.get(QuestionRubric, rubric.id)
+        assert stored.rubric_json["key_points"] == ["数据类型", "使用场景"]
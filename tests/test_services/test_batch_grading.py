@@ -0,0 +1,103 @@
+"""
+测试离线批量评分
+"""
+import csv
+import json
+import pytest
+from api.batch_grading import BatchOptions, completed_lines, grade_file
+from api.db import AnswerEvaluation
+
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+
+
+def _read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.fixture
+def answers(sample_question):
+    return [
+        {"question_id": sample_question.question_id, "student_id": "test_student",
+         "answer": f"Python has int, float, str, list and dict types; answer variant {i}."}
+        for i in range(5)
+    ]
+
+
+class TestBatchGrading:
+    """测试批量评分流程"""
+
+    def test_grade_jsonl(self, tmp_path, db_session, sample_rubric, answers, stub_llm):
+        """测试逐行写出评分结果，未知题目记为错误"""
+        source = tmp_path / "answers.jsonl"
+        _write_jsonl(source, answers + [{"question_id": "MISSING", "answer": "text"}])
+        output = tmp_path / "graded.jsonl"
+
+        stats = grade_file(str(source), str(output), BatchOptions(concurrency=3), progress_stream=None)
+
+        records = sorted(_read_output(output), key=lambda r: r["line"])
+        assert stats.succeeded == 5 and stats.failed == 1
+        assert [r["line"] for r in records] == [1, 2, 3, 4, 5, 6]
+        assert records[0]["status"] == "ok"
+        assert records[0]["rubric_version"] == "test-v1"
+        assert 0 <= records[0]["total_score"] <= 10
+        assert records[5]["status"] == "error"
+        assert "not found" in records[5]["error"]
+
+    def test_malformed_line_does_not_stop_run(self, tmp_path, db_session, sample_rubric, answers, stub_llm):
+        """测试格式错误的行记为错误，其余行照常评分"""
+        source = tmp_path / "answers.jsonl"
+        source.write_text(json.dumps(answers[0]) + "\n{not json\n" + json.dumps(answers[1]) + "\n", encoding="utf-8")
+        output = tmp_path / "graded.jsonl"
+
+        stats = grade_file(str(source), str(output), BatchOptions(concurrency=2), progress_stream=None)
+
+        records = sorted(_read_output(output), key=lambda r: r["line"])
+        assert stats.succeeded == 2 and stats.failed == 1
+        assert [r["status"] for r in records] == ["ok", "error", "ok"]
+        assert "Invalid JSON" in records[1]["error"]
+
+    def test_csv_input_with_student_answer_column(self, tmp_path, db_session, sample_rubric, answers, stub_llm):
+        """测试 CSV 输入及 student_answer 列名"""
+        source = tmp_path / "answers.csv"
+        with open(source, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["question_id", "student_id", "student_answer"])
+            writer.writeheader()
+            for row in answers[:2]:
+                writer.writerow({"question_id": row["question_id"], "student_id": row["student_id"],
+                                 "student_answer": row["answer"]})
+        output = tmp_path / "graded.jsonl"
+
+        stats = grade_file(str(source), str(output), BatchOptions(concurrency=2), progress_stream=None)
+        assert stats.succeeded == 2
+
+    def test_resume_skips_completed_lines(self, tmp_path, db_session, sample_rubric, answers, stub_llm):
+        """测试中断后从输出文件继续，已完成的行不重复评分"""
+        source = tmp_path / "answers.jsonl"
+        _write_jsonl(source, answers)
+        output = tmp_path / "graded.jsonl"
+
+        grade_file(str(source), str(output), BatchOptions(concurrency=1, limit=2), progress_stream=None)
+        assert completed_lines(str(output)) == {1, 2}
+        with pytest.raises(FileExistsError):
+            grade_file(str(source), str(output), BatchOptions(), progress_stream=None)
+
+        stats = grade_file(str(source), str(output), BatchOptions(concurrency=2, resume=True), progress_stream=None)
+        assert stats.skipped == 2 and stats.succeeded == 3
+        assert sorted(r["line"] for r in _read_output(output)) == [1, 2, 3, 4, 5]
+
+    def test_write_db(self, tmp_path, db_session, sample_rubric, test_student, answers, stub_llm):
+        """测试写入数据库，未知学生记为错误"""
+        source = tmp_path / "answers.jsonl"
+        _write_jsonl(source, answers[:3] + [{**answers[0], "student_id": "nobody"}])
+        output = tmp_path / "graded.jsonl"
+
+        stats = grade_file(str(source), str(output), BatchOptions(concurrency=2, write_db=True, db_batch_size=2),
+                           progress_stream=None)
+
+        assert stats.persisted == 3 and stats.failed == 1
+        rows = db_session.query(AnswerEvaluation).filter(AnswerEvaluation.student_id == "test_student").all()
+        assert len(rows) == 3
+        assert all(row.rubric_version == "test-v1" and row.prompt_tokens for row in rows)
+        assert all(r["persisted"] for r in _read_output(output) if r["status"] == "ok")
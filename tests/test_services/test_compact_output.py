@@ -0,0 +1,68 @@
+"""
+测试紧凑输出协议
+"""
+import json
+import pytest
+from unittest.mock import MagicMock
+from api import llm_client
+from api.compact_output import expand_payload, max_tokens_for
+from api.models import LLMScorePayload
+from api.rubric_service import TOPIC_DEFAULT
+
+RUBRIC = TOPIC_DEFAULT["airflow"]
+COMPACT = {"t": 6.5, "d": {"a": 1.5, "s": 1.2, "c": 1.4, "b": 1.0, "l": 1.4},
+           "k": ["c", "p", "m", "m", "c"], "r": ["tip 1", "tip 2", "tip 3"]}
+
+
+class TestExpandPayload:
+    """测试紧凑结果展开为完整结构"""
+    
+    def test_expand_to_full_payload(self, monkeypatch):
+        """测试展开后通过 LLMScorePayload 校验"""
+        monkeypatch.setenv("COMPACT_MAX_RECOMMENDATIONS", "2")
+        payload = expand_payload(COMPACT, RUBRIC)
+        
+        validated = LLMScorePayload(**payload)
+        assert validated.total_score == 6.5
+        assert validated.dimension_breakdown["accuracy"] == 1.5
+        assert validated.key_points_evaluation[1] == "Dependencies and retry strategies -> partial"
+        assert len(validated.improvement_recommendations) == 2
+    
+    def test_missing_required_keys(self):
+        """测试缺少必需字段时报错"""
+        with pytest.raises(ValueError):
+            expand_payload({"d": {}}, RUBRIC)
+    
+    def test_max_tokens(self, monkeypatch):
+        """测试紧凑格式默认限制输出 token 数"""
+        monkeypatch.delenv("LLM_MAX_TOKENS", raising=False)
+        assert max_tokens_for("compact") == 256
+        assert max_tokens_for("full") is None
+        monkeypatch.setenv("LLM_MAX_TOKENS", "400")
+        assert max_tokens_for("full") == 400
+
+
+class TestCompactCallLLM:
+    """测试 call_llm 使用紧凑协议"""
+    
+    def test_call_llm_compact(self, monkeypatch):
+        """测试紧凑格式请求并展开响应"""
+        monkeypatch.setenv("LLM_OUTPUT_FORMAT", "compact")
+        monkeypatch.setenv("KEY_POINT_MODE", "hints")
+        monkeypatch.delenv("LLM_MAX_TOKENS", raising=False)
+        captured = {}
+        
+        def make_llm(**kwargs):
+            captured.update(kwargs)
+            llm = MagicMock()
+            llm.invoke.return_value = MagicMock(content=json.dumps(COMPACT))
+            return llm
+        
+        monkeypatch.setattr(llm_client, "make_llm", make_llm)
+        
+        result = llm_client.call_llm("Q", RUBRIC, "Retries and dependencies are configured.")
+        
+        assert captured["max_tokens"] == 256
+        assert result["total_score"] == 6.5
+        assert result["compact_output"] == COMPACT
+        assert "dimension_breakdown" in result
@@ -0,0 +1,75 @@
+"""
+测试请求截止时间（deadline）预算逻辑
+"""
+import time
+import pytest
+from api.deadline import Deadline, DeadlineExceeded, deadline_from_header, MIN_DEADLINE_SECONDS
+
+
+class TestDeadline:
+    """测试 Deadline 阶段计时与超时"""
+    
+    def test_stage_records_timing(self):
+        """测试阶段耗时被记录"""
+        deadline = Deadline(5.0)
+        with deadline.stage("question_lookup"):
+            pass
+        assert "question_lookup" in deadline.stage_timings
+        assert deadline.stage_timings["question_lookup"] >= 0
+    
+    def test_stage_raises_after_expiry(self):
+        """测试阶段结束时已超时会报告该阶段"""
+        deadline = Deadline(0.01)
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            with deadline.stage("llm_scoring"):
+                time.sleep(0.02)
+        assert exc_info.value.stage == "llm_scoring"
+    
+    def test_expired_deadline_blocks_next_stage(self):
+        """测试超时后不再启动下游阶段"""
+        deadline = Deadline(0.0)
+        executed = []
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            with deadline.stage("persistence", check_after=False):
+                executed.append(True)
+        assert executed == []
+        assert exc_info.value.stage == "persistence"
+    
+    def test_timeout_for_reserve_and_share(self):
+        """测试下游调用的时间预算扣除预留并按比例分配"""
+        deadline = Deadline(10.0)
+        timeout = deadline.timeout_for("rubric_resolution", reserve=2.0, share=0.5)
+        assert 3.5 < timeout <= 4.0
+    
+    def test_check_with_reserve(self):
+        """测试扣除预留后预算已用尽时报告超时"""
+        deadline = Deadline(1.0)
+        deadline.check("llm_scoring", reserve=0.5)
+        with pytest.raises(DeadlineExceeded):
+            deadline.check("llm_scoring", reserve=2.0)
+    
+    def test_timeout_for_exhausted_budget(self):
+        """测试预算耗尽时直接报告超时"""
+        deadline = Deadline(1.0)
+        with pytest.raises(DeadlineExceeded):
+            deadline.timeout_for("llm_scoring", reserve=2.0)
+
+
+class TestDeadlineFromHeader:
+    """测试从请求头解析截止时间"""
+    
+    def test_header_value(self):
+        """测试使用客户端提供的超时"""
+        assert deadline_from_header("12.5").budget == 12.5
+    
+    def test_default_when_missing(self, monkeypatch):
+        """测试缺省时使用配置的默认值"""
+        monkeypatch.setenv("EVALUATE_TIMEOUT_SECONDS", "20")
+        assert deadline_from_header(None).budget == 20.0
+        assert deadline_from_header("abc").budget == 20.0
+    
+    def test_clamped(self, monkeypatch):
+        """测试超时值被限制在允许范围内"""
+        monkeypatch.setenv("EVALUATE_MAX_TIMEOUT_SECONDS", "60")
+        assert deadline_from_header("0").budget == MIN_DEADLINE_SECONDS
+        assert deadline_from_header("9999").budget == 60.0
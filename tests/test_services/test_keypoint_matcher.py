@@ -0,0 +1,71 @@
+"""
+测试本地要点覆盖匹配
+"""
+import pytest
+from unittest.mock import MagicMock
+from api.keypoint_matcher import match_key_points, get_index
+from api.llm_client import build_prompt
+from api.rubric_service import TOPIC_DEFAULT
+
+RUBRIC = TOPIC_DEFAULT["airflow"]
+
+
+class TestKeyPointMatcher:
+    """测试要点覆盖计算"""
+    
+    def test_coverage_statuses(self):
+        """测试覆盖/部分覆盖/缺失的判定"""
+        answer = ("Dependencies are declared between tasks and each task has a retry strategy. "
+                  "Tasks are idempotent so reruns are safe.")
+        coverage = {c.point: c for c in match_key_points(RUBRIC, answer)}
+        assert coverage["Dependencies and retry strategies"].status == "covered"
+        assert coverage["Idempotency and repeatable execution"].status in ("covered", "partial")
+        assert coverage["Resource/queue/concurrency control"].status == "missing"
+    
+    def test_evidence_sentence(self):
+        """测试返回最匹配的句子作为证据"""
+        answer = "We monitor runs and send alerts. Retries handle dependencies failing."
+        coverage = {c.point: c for c in match_key_points(RUBRIC, answer)}
+        assert coverage["Dependencies and retry strategies"].evidence == "Retries handle dependencies failing."
+    
+    def test_empty_answer(self):
+        """测试空答案全部缺失"""
+        coverage = match_key_points(RUBRIC, "")
+        assert len(coverage) == len(RUBRIC["key_points"])
+        assert all(c.status == "missing" for c in coverage)
+    
+    def test_rubric_without_key_points(self):
+        """测试评分标准没有要点时返回空列表"""
+        assert match_key_points({"version": "custom-v1"}, "Some answer text.") == []
+    
+    def test_index_cached_per_rubric_version(self):
+        """测试同一评分标准版本复用预计算索引"""
+        assert get_index(RUBRIC) is get_index(dict(RUBRIC))
+
+
+class TestKeyPointPrompt:
+    """测试要点覆盖提示写入 prompt"""
+    
+    def test_hints_in_prompt(self):
+        """测试提示出现在 prompt 中"""
+        coverage = match_key_points(RUBRIC, "Retries and dependencies are configured.")
+        prompt = build_prompt("Q", RUBRIC, "answer", key_point_hints=coverage)
+        assert "LOCAL KEY POINT COVERAGE" in prompt
+        assert "Dependencies and retry strategies -> " in prompt
+    
+    def test_local_mode_fills_evaluation(self, monkeypatch):
+        """测试 local 模式下由本地结果填充 key_points_evaluation"""
+        from api import llm_client
+        monkeypatch.setenv("KEY_POINT_MODE", "local")
+        mock_llm = MagicMock()
+        mock_llm.invoke.return_value = MagicMock(
+            content='{"total_score": 5, "dimension_breakdown": {"accuracy": 1}, "improvement_recommendations": []}'
+        )
+        monkeypatch.setattr(llm_client, "make_llm", lambda **kwargs: mock_llm)
+        
+        result = llm_client.call_llm("Q", RUBRIC, "Retries and dependencies are configured.")
+        
+        prompt = mock_llm.invoke.call_args[0][0]
+        assert '"key_points_evaluation"' not in prompt
+        assert len(result["key_points_evaluation"]) == len(RUBRIC["key_points"])
+        assert result["local_key_point_coverage"][0]["point"] == RUBRIC["key_points"][0]
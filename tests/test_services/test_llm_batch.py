@@ -0,0 +1,150 @@
+"""
+测试批量 API 评分（本地文件替身）
+"""
+import json
+import pytest
+from types import SimpleNamespace
+from api.db import AnswerEvaluation
+from api.llm_batch import (
+    BatchFailedError, LocalBatchBackend, OpenAIBatchBackend, get_backend, ingest_batch, load_manifest, poll_batch,
+    prepare_batch, submit_batch,
+)
+
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+
+
+@pytest.fixture
+def batch_env(tmp_path, monkeypatch, stub_llm):
+    monkeypatch.setenv("LLM_BATCH_BACKEND", "local")
+    monkeypatch.setenv("LLM_BATCH_DIR", str(tmp_path / "batches"))
+    monkeypatch.setenv("PRESCREEN_ENABLED", "false")
+    return tmp_path
+
+
+@pytest.fixture
+def answers_file(batch_env, sample_question, test_student):
+    source = batch_env / "answers.jsonl"
+    _write_jsonl(source, [
+        {"question_id": sample_question.question_id, "student_id": test_student.id,
+         "answer": f"Python has int, float, str, list and dict types; answer variant {i}."}
+        for i in range(3)
+    ] + [{"question_id": "MISSING", "answer": "text"}])
+    return source
+
+
+class TestLocalBatch:
+    """测试提交、轮询与结果入库"""
+
+    def test_submit_poll_ingest(self, batch_env, answers_file, db_session, sample_rubric):
+        """测试完整流程：请求文件、入库的评估记录与逐行结果"""
+        manifest_path = str(batch_env / "run.manifest.json")
+        manifest = prepare_batch(str(answers_file), manifest_path)
+        assert manifest["request_count"] == 3
+        requests = [json.loads(line) for line in open(manifest["requests_file"], encoding="utf-8")]
+        assert [r["custom_id"] for r in requests] == ["line-1", "line-2", "line-3"]
+        assert requests[0]["url"] == "/v1/chat/completions"
+
+        info = submit_batch(manifest_path)
+        assert info.status == "in_progress" and info.total == 3
+        info = poll_batch(manifest_path, wait=True, interval=0.01, timeout=30)
+        assert info.status == "completed" and info.completed == 3
+
+        results_path = batch_env / "results.jsonl"
+        summary = ingest_batch(manifest_path, str(results_path))
+        assert (summary["succeeded"], summary["failed"]) == (3, 1)
+
+        rows = db_session.query(AnswerEvaluation).filter(AnswerEvaluation.model_tier == "batch").all()
+        assert len(rows) == 3
+        assert all(r.rubric_version == "test-v1" and r.prompt_tokens and r.llm_latency_ms is None for r in rows)
+        records = [json.loads(line) for line in results_path.read_text(encoding="utf-8").splitlines()]
+        assert [r["status"] for r in records] == ["ok", "ok", "ok", "error"]
+        assert "not found" in records[3]["error"]
+
+        with pytest.raises(RuntimeError):
+            ingest_batch(manifest_path)
+
+    def test_invalid_output_and_provider_errors(self, batch_env, answers_file, db_session, sample_rubric):
+        """测试无法解析的输出与请求级错误记为错误，其余结果正常入库"""
+        manifest_path = str(batch_env / "run.manifest.json")
+        prepare_batch(str(answers_file), manifest_path)
+        submit_batch(manifest_path)
+        info = poll_batch(manifest_path)
+        output = [json.loads(line) for line in open(info.output_file, encoding="utf-8")]
+        output[0]["response"]["body"]["choices"][0]["message"]["content"] = "not json"
+        output[1] = {"custom_id": output[1]["custom_id"], "response": None,
+                     "error": {"code": "rate_limit_exceeded", "message": "Too many tokens"}}
+        with open(info.output_file, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in output))
+
+        summary = ingest_batch(manifest_path)
+        assert (summary["succeeded"], summary["failed"]) == (1, 3)
+        assert load_manifest(manifest_path)["status"] == "ingested"
+        assert db_session.query(AnswerEvaluation).filter(AnswerEvaluation.model_tier == "batch").count() == 1
+
+    def test_failed_batch_can_be_resubmitted(self, batch_env, answers_file, db_session, sample_rubric):
+        """测试批次被取消时不入库，清单可重新提交并正常入库"""
+        manifest_path = str(batch_env / "run.manifest.json")
+        prepare_batch(str(answers_file), manifest_path)
+        info = submit_batch(manifest_path)
+        get_backend("local").cancel(info.id)
+
+        with pytest.raises(BatchFailedError):
+            ingest_batch(manifest_path)
+        manifest = load_manifest(manifest_path)
+        assert (manifest["status"], manifest["batch_id"]) == ("failed", None)
+        assert manifest["failed_batches"] == [{"id": info.id, "status": "cancelled"}]
+        assert db_session.query(AnswerEvaluation).filter(AnswerEvaluation.model_tier == "batch").count() == 0
+
+        retry = submit_batch(manifest_path)
+        assert retry.id != info.id
+        summary = ingest_batch(manifest_path)
+        assert (summary["succeeded"], summary["failed"]) == (3, 1)
+        assert load_manifest(manifest_path)["status"] == "ingested"
+
+    def test_prepare_refuses_existing_manifest(self, batch_env, answers_file, sample_rubric):
+        """测试清单文件已存在时拒绝覆盖"""
+        manifest_path = str(batch_env / "run.manifest.json")
+        prepare_batch(str(answers_file), manifest_path)
+        with pytest.raises(FileExistsError):
+            prepare_batch(str(answers_file), manifest_path)
+
+
+class TestOpenAIBatchBackend:
+    """测试 OpenAI 批量接口调用参数"""
+
+    def test_submit_and_results(self, tmp_path):
+        """测试上传文件、创建批次与读取结果文件"""
+        calls = {}
+        batch = SimpleNamespace(id="batch_1", status="completed", output_file_id="file-out", error_file_id=None,
+                                request_counts=SimpleNamespace(total=1, completed=1, failed=0))
+
+        def create_file(file, purpose):
+            calls["purpose"] = purpose
+            return SimpleNamespace(id="file-in")
+
+        def create_batch(**kwargs):
+            calls["batch"] = kwargs
+            return batch
+
+        client = SimpleNamespace(
+            files=SimpleNamespace(create=create_file,
+                                  content=lambda file_id: SimpleNamespace(text='{"custom_id": "line-1"}\n')),
+            batches=SimpleNamespace(create=create_batch, retrieve=lambda batch_id: batch),
+        )
+        requests_path = tmp_path / "requests.jsonl"
+        requests_path.write_text('{"custom_id": "line-1"}\n', encoding="utf-8")
+
+        backend = OpenAIBatchBackend(client=client)
+        info = backend.submit(str(requests_path))
+        assert calls["purpose"] == "batch"
+        assert calls["batch"] == {"input_file_id": "file-in", "endpoint": "/v1/chat/completions",
+                                  "completion_window": "24h"}
+        assert info.status == "completed" and info.output_file == "file-out"
+        assert [r["custom_id"] for r in backend.results(backend.retrieve("batch_1"))] == ["line-1"]
+
+    def test_local_backend_unknown_batch(self, tmp_path):
+        """测试查询不存在的本地批次"""
+        with pytest.raises(LookupError):
+            LocalBatchBackend(directory=str(tmp_path)).retrieve("batch_local_missing")
@@ -0,0 +1,144 @@
+"""
+测试模型级联（小模型优先，低置信度时升级到大模型）
+"""
+import json
+import pytest
+from unittest.mock import MagicMock
+from api import llm_client
+from api.llm_client import call_llm, LLMCallStats, cascade_stats
+
+RUBRIC = {"version": "test-v1", "dimensions": {"accuracy": 1}}
+
+
+def _payload(total):
+    return json.dumps({
+        "total_score": total,
+        "dimension_breakdown": {"accuracy": min(total / 5, 2)},
+        "key_points_evaluation": [],
+        "improvement_recommendations": []
+    })
+
+
+@pytest.fixture
+def cascade_env(monkeypatch):
+    monkeypatch.setenv("LLM_CASCADE", "true")
+    monkeypatch.setenv("CASCADE_SMALL_MODEL_ID", "small-model")
+    monkeypatch.setenv("MODEL_ID", "large-model")
+    monkeypatch.setenv("CASCADE_BORDERLINE_SCORES", "6.0")
+    monkeypatch.setenv("CASCADE_BORDERLINE_MARGIN", "0.5")
+    cascade_stats.reset()
+    yield
+    cascade_stats.reset()
+
+
+def _install_models(monkeypatch, outputs):
+    """outputs: model_id -> response content"""
+    calls = []
+    
+    def make_llm(timeout=None, model=None, **kwargs):
+        llm = MagicMock()
+        llm.invoke.side_effect = lambda prompt: (calls.append(model), MagicMock(content=outputs[model]))[1]
+        return llm
+    
+    monkeypatch.setattr(llm_client, "make_llm", make_llm)
+    return calls
+
+
+class TestModelCascade:
+    """测试级联升级策略"""
+    
+    def test_confident_small_result_kept(self, cascade_env, monkeypatch):
+        """测试小模型结果可信时不升级"""
+        calls = _install_models(monkeypatch, {"small-model": _payload(9.0), "large-model": _payload(8.0)})
+        stats = LLMCallStats()
+        
+        result = call_llm("Q", RUBRIC, "answer text", stats=stats)
+        
+        assert result["total_score"] == 9.0
+        assert calls == ["small-model"]
+        assert stats.tier == "small"
+        assert stats.model_id == "small-model"
+    
+    def test_borderline_escalated(self, cascade_env, monkeypatch):
+        """测试临界分数升级到大模型"""
+        calls = _install_models(monkeypatch, {"small-model": _payload(6.2), "large-model": _payload(7.0)})
+        stats = LLMCallStats()
+        
+        result = call_llm("Q", RUBRIC, "answer text", stats=stats)
+        
+        assert result["total_score"] == 7.0
+        assert calls == ["small-model", "large-model"]
+        assert stats.tier == "large"
+        assert stats.escalation_reason == "borderline_score"
+    
+    def test_invalid_small_output_escalated(self, cascade_env, monkeypatch):
+        """测试小模型输出校验失败时升级"""
+        invalid = json.dumps({"total_score": 15})
+        _install_models(monkeypatch, {"small-model": invalid, "large-model": _payload(9.0)})
+        stats = LLMCallStats()
+        
+        call_llm("Q", RUBRIC, "answer text", stats=stats)
+        
+        assert stats.escalation_reason == "validation_failure"
+    
+    def test_small_model_timeout_not_escalated(self, cascade_env, monkeypatch):
+        """测试小模型的服务端超时（非 TimeoutError 子类）直接抛出，不升级"""
+        class APITimeoutError(Exception):
+            pass
+
+        calls = []
+
+        def make_llm(timeout=None, model=None, **kwargs):
+            llm = MagicMock()
+            llm.invoke.side_effect = APITimeoutError("Request timed out.")
+            calls.append(model)
+            return llm
+
+        monkeypatch.setattr(llm_client, "make_llm", make_llm)
+        with pytest.raises(APITimeoutError):
+            call_llm("Q", RUBRIC, "answer text")
+        assert calls == ["small-model"]
+        assert cascade_stats.snapshot()["escalation_reasons"] == {}
+
+    def test_small_model_provider_error_reason(self, cascade_env, monkeypatch):
+        """测试小模型服务端错误以 small_model_error 升级，而不是记为校验失败"""
+        def make_llm(timeout=None, model=None, **kwargs):
+            llm = MagicMock()
+            if model == "small-model":
+                llm.invoke.side_effect = RuntimeError("503 Service Unavailable")
+            else:
+                llm.invoke.return_value = MagicMock(content=_payload(9.0))
+            return llm
+
+        monkeypatch.setattr(llm_client, "make_llm", make_llm)
+        stats = LLMCallStats()
+        call_llm("Q", RUBRIC, "answer text", stats=stats)
+        assert stats.tier == "large"
+        assert stats.escalation_reason == "small_model_error"
+        assert cascade_stats.snapshot()["escalation_reasons"] == {"small_model_error": 1}
+    
+    def test_stats_snapshot(self, cascade_env, monkeypatch):
+        """测试升级率与延迟节省统计"""
+        _install_models(monkeypatch, {"small-model": _payload(9.0), "large-model": _payload(7.0)})
+        call_llm("Q", RUBRIC, "answer text")
+        _install_models(monkeypatch, {"small-model": _payload(6.0), "large-model": _payload(7.0)})
+        call_llm("Q", RUBRIC, "answer text")
+        
+        snapshot = cascade_stats.snapshot()
+        assert snapshot["total_calls"] == 2
+        assert snapshot["escalated_calls"] == 1
+        assert snapshot["escalation_rate"] == 0.5
+        assert snapshot["escalation_reasons"] == {"borderline_score": 1}
+    
+    def test_cascade_disabled_single_tier(self, monkeypatch):
+        """测试未开启级联时直接使用配置模型"""
+        monkeypatch.setenv("LLM_CASCADE", "false")
+        monkeypatch.setenv("MODEL_ID", "large-model")
+        calls = _install_models(monkeypatch, {None: _payload(5.0)})
+        stats = LLMCallStats()
+        
+        call_llm("Q", RUBRIC, "answer text", stats=stats)
+        
+        assert calls == [None]
+        assert stats.tier == "single"
+        assert stats.model_id == "large-model"
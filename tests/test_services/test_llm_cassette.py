@@ -0,0 +1,95 @@
+"""
+测试 LLM 录制/回放
+"""
+import json
+import pytest
+from api.llm_cassette import (
+    Cassette, CassetteMissError, RecordedLLMError, RecordingChatModel, ReplayChatModel,
+    get_cassette, prompt_key, reset_cassettes,
+)
+from api.llm_client import call_llm, LLMCallStats
+from api.llm_stub import StubChatModel, StubLLMError
+from api.rubric_service import TOPIC_DEFAULT, generate_rubric_by_llm
+
+
+@pytest.fixture
+def cassette_file(tmp_path, monkeypatch):
+    path = tmp_path / "llm.jsonl"
+    monkeypatch.setenv("LLM_CASSETTE_PATH", str(path))
+    monkeypatch.setenv("LLM_PROVIDER", "stub")
+    monkeypatch.setenv("STUB_LLM_LATENCY", "fixed:0")
+    monkeypatch.setenv("STUB_LLM_FAILURE_RATE", "0")
+    monkeypatch.setenv("STUB_LLM_MALFORMED_RATE", "0")
+    monkeypatch.delenv("LLM_CASCADE", raising=False)
+    reset_cassettes()
+    yield path
+    reset_cassettes()
+
+
+class TestRecordReplay:
+    """测试通过 make_llm 录制与回放"""
+
+    def test_call_llm_replays_recorded_result(self, cassette_file, monkeypatch):
+        """测试录制的评分结果在回放时完全一致，且无需提供商"""
+        monkeypatch.setenv("LLM_CASSETTE_MODE", "record")
+        recorded = call_llm("Q", TOPIC_DEFAULT["airflow"], "Airflow retries failed tasks.")
+        lines = cassette_file.read_text().splitlines()
+        assert len(lines) == 1
+        assert "latency_ms" in json.loads(lines[0])
+
+        reset_cassettes()
+        monkeypatch.setenv("LLM_CASSETTE_MODE", "replay")
+        monkeypatch.setenv("LLM_PROVIDER", "openai")
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+        stats = LLMCallStats()
+        replayed = call_llm("Q", TOPIC_DEFAULT["airflow"], "Airflow retries failed tasks.", stats=stats)
+        assert replayed["total_score"] == recorded["total_score"]
+        assert replayed["dimension_breakdown"] == recorded["dimension_breakdown"]
+        assert stats.prompt_tokens > 0
+
+    def test_rubric_generation_replay(self, cassette_file, monkeypatch):
+        """测试评分标准生成同样可以回放"""
+        monkeypatch.setenv("LLM_CASSETTE_MODE", "record")
+        recorded = generate_rubric_by_llm("What is Kafka?")
+        reset_cassettes()
+        monkeypatch.setenv("LLM_CASSETTE_MODE", "replay")
+        assert generate_rubric_by_llm("What is Kafka?") == recorded
+
+    def test_replay_miss(self, cassette_file, monkeypatch):
+        """测试回放时缺少录制会报错"""
+        monkeypatch.setenv("LLM_CASSETTE_MODE", "replay")
+        with pytest.raises(CassetteMissError):
+            ReplayChatModel("m", get_cassette(), scale=0).invoke("unknown prompt")
+
+
+class TestCassette:
+    """测试录制文件的键、顺序与延迟"""
+
+    def test_key_includes_model(self):
+        """测试不同模型的相同提示词使用不同的键"""
+        assert prompt_key("a", "prompt") != prompt_key("b", "prompt")
+
+    def test_recordings_replay_in_order(self, tmp_path):
+        """测试同一提示词的多次录制按顺序回放并循环"""
+        cassette = Cassette(str(tmp_path / "c.jsonl"))
+        recorder = RecordingChatModel(StubChatModel(latency="fixed:0", failure_rate=1.0), "m", cassette)
+        with pytest.raises(StubLLMError):
+            recorder.invoke("prompt")
+        recorder.llm = StubChatModel(latency="fixed:0", failure_rate=0.0)
+        first = recorder.invoke("prompt")
+
+        replay = ReplayChatModel("m", Cassette(cassette.path), scale=0)
+        with pytest.raises(RecordedLLMError):
+            replay.invoke("prompt")
+        assert replay.invoke("prompt").content == first.content
+        with pytest.raises(RecordedLLMError):
+            replay.invoke("prompt")
+
+    def test_scaled_latency_timeout(self, tmp_path):
+        """测试按比例放大的延迟超过超时时间时抛出 TimeoutError"""
+        cassette = Cassette(str(tmp_path / "c.jsonl"))
+        cassette.record(prompt_key("m", "p"), "m", "p", 100.0, response=StubChatModel(latency="fixed:0").invoke("p"))
+        with pytest.raises(TimeoutError):
+            ReplayChatModel("m", cassette, timeout=0.01, scale=2.0).invoke("p")
+        assert ReplayChatModel("m", cassette, scale=0).invoke("p").content
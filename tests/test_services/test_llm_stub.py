@@ -0,0 +1,70 @@
+"""
+测试本地桩 LLM
+"""
+import pytest
+from api.llm_client import call_llm, LLMCallStats
+from api.llm_stub import StubChatModel, StubLLMError, LatencyDistribution
+from api.rubric_service import TOPIC_DEFAULT, generate_rubric_by_llm
+
+
+@pytest.fixture
+def stub_provider(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "stub")
+    monkeypatch.setenv("STUB_LLM_LATENCY", "fixed:0")
+    monkeypatch.setenv("STUB_LLM_FAILURE_RATE", "0")
+    monkeypatch.setenv("STUB_LLM_MALFORMED_RATE", "0")
+    monkeypatch.delenv("LLM_CASCADE", raising=False)
+
+
+class TestStubProvider:
+    """测试 LLM_PROVIDER=stub"""
+    
+    def test_call_llm_with_stub(self, stub_provider):
+        """测试桩模型经过完整的 call_llm 流程返回合法结果"""
+        stats = LLMCallStats()
+        result = call_llm("Q", TOPIC_DEFAULT["airflow"], "Airflow retries failed tasks.", stats=stats)
+        assert 0 <= result["total_score"] <= 10
+        assert stats.prompt_tokens > 0
+    
+    def test_compact_output(self, stub_provider, monkeypatch):
+        """测试桩模型支持紧凑输出协议"""
+        monkeypatch.setenv("LLM_OUTPUT_FORMAT", "compact")
+        result = call_llm("Q", TOPIC_DEFAULT["airflow"], "Airflow retries failed tasks.")
+        assert "compact_output" in result
+    
+    def test_rubric_generation(self, stub_provider):
+        """测试桩模型生成评分标准"""
+        rubric = generate_rubric_by_llm("What is Kafka?")
+        assert rubric["key_points"] == ["Core concepts", "Implementation steps", "Common pitfalls"]
+    
+    def test_malformed_output_fails_after_retry(self, stub_provider, monkeypatch):
+        """测试格式错误输出在重试后仍失败"""
+        monkeypatch.setenv("STUB_LLM_MALFORMED_RATE", "1")
+        stats = LLMCallStats()
+        with pytest.raises(ValueError):
+            call_llm("Q", TOPIC_DEFAULT["airflow"], "answer text", stats=stats)
+        assert stats.retries == 1
+
+
+class TestStubChatModel:
+    """测试桩模型的延迟与失败注入"""
+    
+    def test_failure_rate(self):
+        """测试失败率为 1 时抛出模拟错误"""
+        with pytest.raises(StubLLMError):
+            StubChatModel(latency="fixed:0", failure_rate=1.0).invoke("prompt")
+    
+    def test_timeout(self):
+        """测试模拟延迟超过超时时间时抛出 TimeoutError"""
+        with pytest.raises(TimeoutError):
+            StubChatModel(latency="fixed:500", timeout=0.01).invoke("prompt")
+    
+    def test_deterministic_content(self):
+        """测试相同 prompt 返回相同内容"""
+        model = StubChatModel(latency="fixed:0")
+        assert model.invoke("same prompt").content == model.invoke("same prompt").content
+    
+    def test_invalid_distribution(self):
+        """测试非法延迟分布配置"""
+        with pytest.raises(ValueError):
+            LatencyDistribution("gamma:1")
@@ -0,0 +1,70 @@
+"""
+测试进程内指标与 Prometheus 文本格式
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from api import metrics
+from api.metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture(autouse=True)
+def enabled_registry(monkeypatch):
+    monkeypatch.setattr(metrics.registry, "enabled", True)
+
+
+class TestMetricTypes:
+    """测试计数器、仪表和直方图"""
+    
+    def test_counter_render(self):
+        """测试计数器按标签累加并输出 _total"""
+        counter = Counter("demo_requests", "Demo", ("route",))
+        counter.inc(route="/a")
+        counter.inc(2, route="/a")
+        lines = counter.collect()
+        assert "# TYPE demo_requests counter" in lines
+        assert 'demo_requests_total{route="/a"} 3' in lines
+    
+    def test_histogram_buckets_cumulative(self):
+        """测试直方图桶计数为累计值"""
+        histogram = Histogram("demo_seconds", "Demo", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        lines = histogram.collect()
+        assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+        assert 'demo_seconds_bucket{le="1"} 2' in lines
+        assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+        assert "demo_seconds_count 3" in lines
+    
+    def test_gauge_inc_dec(self):
+        """测试仪表增减"""
+        gauge = Gauge("demo_in_flight", "Demo")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        assert gauge.value() == 1
+    
+    def test_label_escaping(self):
+        """测试标签值中的引号被转义"""
+        counter = Counter("demo_escape", "Demo", ("route",))
+        counter.inc(route='a"b')
+        assert 'demo_escape_total{route="a\\"b"} 1' in counter.collect()
+    
+    def test_disabled_is_noop(self, monkeypatch):
+        """测试关闭指标后不记录"""
+        monkeypatch.setattr(metrics.registry, "enabled", False)
+        counter = Counter("demo_disabled", "Demo")
+        counter.inc()
+        assert counter.value() == 0
+
+
+class TestEngineInstrumentation:
+    """测试 SQL 语句计时"""
+    
+    def test_queries_observed_by_operation(self):
+        """测试每条语句按操作类型记录耗时"""
+        engine = create_engine("sqlite://")
+        metrics.instrument_engine(engine)
+        before = metrics.DB_QUERY_DURATION.count(operation="SELECT")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        assert metrics.DB_QUERY_DURATION.count(operation="SELECT") == before + 1
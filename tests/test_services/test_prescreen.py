@@ -0,0 +1,79 @@
+"""
+测试本地词法预筛选
+"""
+import pytest
+from api.prescreen import prescreen_answer, extract_features, tokenize
+from api.rubric_service import TOPIC_DEFAULT
+
+QUESTION = "Briefly describe how to implement reliable dependency management and failure recovery in Airflow."
+RUBRIC = TOPIC_DEFAULT["airflow"]
+
+
+class TestPrescreen:
+    """测试退化答案识别"""
+    
+    def test_normal_answer_passes(self):
+        """测试正常答案不被拦截"""
+        answer = ("I define DAG dependencies explicitly, set retries with exponential backoff, "
+                  "keep tasks idempotent so reruns are safe, and alert on SLA misses.")
+        result = prescreen_answer(QUESTION, RUBRIC, answer)
+        assert result.verdict is None
+        assert result.should_skip_llm is False
+        assert result.features["key_point_coverage"] > 0
+    
+    def test_copied_question(self):
+        """测试复制题目文本"""
+        result = prescreen_answer(QUESTION, RUBRIC, QUESTION)
+        assert result.verdict == "copied_question"
+        assert result.should_skip_llm is True
+        assert result.payload["total_score"] == 0.0
+    
+    def test_repeated_filler(self):
+        """测试重复填充内容"""
+        result = prescreen_answer(QUESTION, RUBRIC, "airflow is good " * 10)
+        assert result.verdict == "gibberish"
+        assert result.should_skip_llm is True
+    
+    def test_symbols_only(self):
+        """测试无文字内容"""
+        result = prescreen_answer(QUESTION, RUBRIC, "?!?!?!...!!!!!!####")
+        assert result.verdict == "gibberish"
+    
+    @pytest.mark.parametrize("answer", ["1024", "O(1)", "3.14", "O(n^2)", "2^10 = 1024", "1, 2, 3, 5, 8, 13"])
+    def test_numeric_and_formula_answers_pass(self, answer):
+        """测试数字、公式类的简短正确答案不被判为无意义内容"""
+        result = prescreen_answer("What is 2 to the power of 10?", RUBRIC, answer)
+        assert result.verdict is None
+    
+    def test_cross_language_not_off_topic(self):
+        """测试与评分标准语言不同的答案不会被判为跑题"""
+        answer = "我会在Airflow中定义任务依赖关系，设置重试次数和指数退避，保证任务幂等，并对SLA超时配置告警，同时用资源池控制并发。"
+        result = prescreen_answer(QUESTION, RUBRIC, answer)
+        assert result.verdict is None
+    
+    def test_canned_payload_matches_rubric(self):
+        """测试预设评分结果覆盖评分标准的维度和要点"""
+        result = prescreen_answer(QUESTION, RUBRIC, QUESTION)
+        assert set(result.payload["dimension_breakdown"]) == set(RUBRIC["dimensions"])
+        assert len(result.payload["key_points_evaluation"]) == len(RUBRIC["key_points"])
+    
+    def test_confidence_threshold(self, monkeypatch):
+        """测试置信度阈值控制是否跳过 LLM"""
+        monkeypatch.setenv("PRESCREEN_MIN_CONFIDENCE", "0.99")
+        result = prescreen_answer(QUESTION, RUBRIC, QUESTION)
+        assert result.verdict == "copied_question"
+        assert result.should_skip_llm is False
+
+
+class TestFeatures:
+    """测试词法特征"""
+    
+    def test_tokenize_cjk(self):
+        """测试中文按字切分"""
+        assert tokenize("数据Airflow") == ["数", "据", "airflow"]
+    
+    def test_question_overlap(self):
+        """测试与题目的重合度"""
+        features = extract_features("What is idempotency?", {}, "Idempotency means reruns give the same result.")
+        assert 0 < features["question_overlap"] < 1
+        assert features["question_coverage"] == 1.0
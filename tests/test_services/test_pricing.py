@@ -0,0 +1,29 @@
+"""
+测试 LLM 价格与成本估算
+"""
+import pytest
+from api.pricing import estimate_cost, price_for
+
+
+class TestPricing:
+    """测试价格查找与成本估算"""
+    
+    def test_model_version_label_resolves(self):
+        """测试 provider:model 形式的 model_version 可以找到价格"""
+        assert price_for("openai:gpt-4o-mini") is not None
+        assert price_for("openrouter:openai/gpt-4o-mini") is not None
+    
+    def test_cached_tokens_discounted(self):
+        """测试缓存命中的 prompt token 按折扣价计算"""
+        pricing = {"m": {"input": 1.0, "cached_input": 0.5, "output": 2.0}}
+        assert estimate_cost("m", 1000, 100, 0, pricing) == pytest.approx(0.0012)
+        assert estimate_cost("m", 1000, 100, 1000, pricing) == pytest.approx(0.0007)
+    
+    def test_unknown_model(self):
+        """测试未配置价格的模型返回 None"""
+        assert estimate_cost("unknown-model", 10, 10) is None
+    
+    def test_pricing_override(self, monkeypatch):
+        """测试通过 LLM_PRICING_JSON 覆盖价格"""
+        monkeypatch.setenv("LLM_PRICING_JSON", '{"custom": {"input": 1.0, "output": 1.0}}')
+        assert estimate_cost("custom", 1_000_000, 0) == pytest.approx(1.0)
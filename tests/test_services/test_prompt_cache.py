@@ -0,0 +1,103 @@
+"""
+测试 prompt 前缀预编译与缓存
+"""
+import pytest
+from unittest.mock import MagicMock
+from api import llm_client
+from api.llm_client import build_prompt, call_llm, LLMCallStats
+from api.prompt_cache import PromptPrefixCache, prompt_prefix_cache, rubric_fingerprint
+from api.rubric_service import TOPIC_DEFAULT
+
+RUBRIC = TOPIC_DEFAULT["airflow"]
+FINGERPRINT = rubric_fingerprint(RUBRIC)
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    prompt_prefix_cache.reset()
+    yield
+    prompt_prefix_cache.reset()
+
+
+class TestPromptLayout:
+    """测试 prompt 布局"""
+    
+    def test_answer_after_static_prefix(self):
+        """测试答案位于共享前缀之后"""
+        prompt_a = build_prompt("Q", RUBRIC, "answer A")
+        prompt_b = build_prompt("Q", RUBRIC, "answer B")
+        prefix_a = prompt_a[:prompt_a.index("answer A")]
+        assert prompt_b.startswith(prefix_a)
+        assert prefix_a.index("OUTPUT FORMAT") < prefix_a.index("RUBRIC") < prefix_a.index("QUESTION")
+    
+    def test_prefix_byte_stable_across_key_order(self):
+        """测试评分标准键顺序不同时前缀字节一致"""
+        reordered = dict(reversed(list(RUBRIC.items())))
+        assert build_prompt("Q", RUBRIC, "x") == build_prompt("Q", reordered, "x")
+
+
+class TestPromptPrefixCache:
+    """测试前缀缓存"""
+    
+    def test_cache_hit(self):
+        """测试相同题目与版本复用前缀"""
+        build_prompt("Q", RUBRIC, "answer A", cache_key=("Q1", "v1", FINGERPRINT))
+        build_prompt("Q", RUBRIC, "answer B", cache_key=("Q1", "v1", FINGERPRINT))
+        snapshot = prompt_prefix_cache.snapshot()
+        assert snapshot["prefix_misses"] == 1
+        assert snapshot["prefix_hits"] == 1
+    
+    def test_invalidate_question(self):
+        """测试按题目失效缓存"""
+        build_prompt("Q", RUBRIC, "a", cache_key=("Q1", "v1", FINGERPRINT))
+        build_prompt("Q", RUBRIC, "a", cache_key=("Q2", "v1", FINGERPRINT))
+        prompt_prefix_cache.invalidate("Q1")
+        assert prompt_prefix_cache.snapshot()["entries"] == 1
+    
+    def test_same_version_different_rubric(self):
+        """测试版本号相同但内容不同的评分标准不复用旧前缀"""
+        changed = {**RUBRIC, "key_points": ["Brand new key point"]}
+        assert rubric_fingerprint(changed) != FINGERPRINT
+        assert rubric_fingerprint(dict(reversed(list(RUBRIC.items())))) == FINGERPRINT
+        build_prompt("Q", RUBRIC, "a", cache_key=("Q1", "manual-v1", FINGERPRINT))
+        prompt = build_prompt("Q", changed, "a", cache_key=("Q1", "manual-v1", rubric_fingerprint(changed)))
+        assert "Brand new key point" in prompt
+        assert prompt_prefix_cache.snapshot()["prefix_misses"] == 2
+    
+    def test_rubric_create_and_activate_invalidate(self, client, sample_question, sample_rubric, auth_headers_teacher):
+        """测试新建与激活评分标准时失效该题目的前缀缓存"""
+        qid = sample_question.question_id
+        build_prompt("Q", RUBRIC, "a", cache_key=(qid, "v1", FINGERPRINT))
+        response = client.post(f"/questions/{qid}/rubrics", json={"version": "v2", "rubric_json": {"key_points": ["x"]}},
+                               headers=auth_headers_teacher)
+        assert response.status_code == 201
+        assert prompt_prefix_cache.snapshot()["entries"] == 0
+        
+        build_prompt("Q", RUBRIC, "a", cache_key=(qid, "v1", FINGERPRINT))
+        response = client.post(f"/rubrics/{response.json()['id']}/activate", headers=auth_headers_teacher)
+        assert response.status_code == 200
+        assert prompt_prefix_cache.snapshot()["entries"] == 0
+    
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的前缀"""
+        cache = PromptPrefixCache(max_size=2, ttl_seconds=60)
+        for key in ("a", "b", "c"):
+            cache.get_or_build(key, lambda: key)
+        assert cache.snapshot()["entries"] == 2
+    
+    def test_provider_cached_tokens_recorded(self, monkeypatch):
+        """测试记录服务端缓存命中的 token 数"""
+        monkeypatch.delenv("LLM_CASCADE", raising=False)
+        resp = MagicMock(content='{"total_score": 5, "dimension_breakdown": {}, "key_points_evaluation": [], "improvement_recommendations": []}')
+        resp.usage_metadata = {"input_tokens": 1200, "output_tokens": 80, "input_token_details": {"cache_read": 1024}}
+        llm = MagicMock()
+        llm.invoke.return_value = resp
+        monkeypatch.setattr(llm_client, "make_llm", lambda **kwargs: llm)
+        stats = LLMCallStats()
+        
+        call_llm("Q", RUBRIC, "answer", stats=stats, prompt_cache_key=("Q1", "v1", FINGERPRINT))
+        
+        assert stats.cached_tokens == 1024
+        snapshot = prompt_prefix_cache.snapshot()
+        assert snapshot["provider_cached_tokens"] == 1024
+        assert snapshot["provider_prompt_tokens"] == 1200
@@ -0,0 +1,91 @@
+"""
+测试慢查询日志与执行计划采集
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from api import query_log as query_log_module
+from api.query_log import QueryLog, normalize_statement, redact_parameters
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setenv("SLOW_QUERY_MS", "0")
+    query_log_module.query_log.reset()
+    engine = create_engine("sqlite://")
+    query_log_module.instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE answers (id INTEGER PRIMARY KEY, question_id TEXT, answer TEXT)"))
+    yield engine
+    query_log_module.query_log.reset()
+
+
+class TestNormalization:
+    """测试语句归一化与参数脱敏"""
+    
+    def test_literals_and_in_lists_collapsed(self):
+        """测试字面量、占位符与 IN 列表被归一化"""
+        a = normalize_statement("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'x'  LIMIT 10")
+        b = normalize_statement("SELECT * FROM t WHERE id IN (?, ?) AND name = 'y' LIMIT 50")
+        assert a == b == "SELECT * FROM t WHERE id IN (?...) AND name = ? LIMIT ?"
+    
+    def test_parameters_redacted(self):
+        """测试参数只保留类型与长度"""
+        assert redact_parameters(("secret answer", 3)) == ["<str len=13>", "<int>"]
+        assert redact_parameters({"answer": "abc"}) == {"answer": "<str len=3>"}
+    
+    def test_bounded_statement_count(self, monkeypatch):
+        """测试聚合的语句数量有上限"""
+        monkeypatch.setattr(query_log_module, "MAX_TRACKED_STATEMENTS", 2)
+        log = QueryLog()
+        for table in ("a", "b", "c"):
+            log.record(f"SELECT * FROM {table}", 1.0, False, "route")
+        assert len(log.snapshot()) == 2
+
+
+class TestSlowQueryCapture:
+    """测试慢查询记录"""
+    
+    def test_slow_select_logged_with_plan(self, engine, caplog):
+        """测试慢查询被记录、参数脱敏并采集执行计划"""
+        with caplog.at_level("WARNING", logger="api.slow_query"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT * FROM answers WHERE question_id = :q"), {"q": "student secret"})
+        
+        item = next(i for i in query_log_module.query_log.snapshot() if "FROM answers" in i["statement"])
+        assert item["slow_count"] == 1
+        assert item["routes"] == {"background": 1}
+        assert item["plan"] and "answers" in " ".join(item["plan"])
+        assert "student secret" not in caplog.text
+        assert "<str len=14>" in caplog.text
+    
+    def test_streamed_select_not_explained(self, engine, monkeypatch):
+        """测试流式读取的慢查询不采集执行计划，且所有行都能读到"""
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO answers (question_id, answer) VALUES (:q, :a)"),
+                         [{"q": "Q1", "a": f"answer {i}"} for i in range(50)])
+
+        def fail_explain(*args, **kwargs):
+            raise AssertionError("EXPLAIN must not run on a streamed connection")
+
+        monkeypatch.setattr(query_log_module, "_explain", fail_explain)
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=10).execute(text("SELECT id, answer FROM answers ORDER BY id"))
+            rows = [row.answer for row in result]
+
+        assert rows == [f"answer {i}" for i in range(50)]
+        item = next(i for i in query_log_module.query_log.snapshot() if "SELECT id, answer FROM answers" in i["statement"])
+        assert item["slow_count"] == 1
+        assert item["plan"] is None
+
+    def test_fast_queries_aggregated_only(self, engine, monkeypatch):
+        """测试未超过阈值的语句只聚合不记录执行计划"""
+        monkeypatch.setenv("SLOW_QUERY_MS", "100000")
+        with engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text(f"SELECT * FROM answers WHERE id = {i}"))
+        
+        items = query_log_module.query_log.snapshot(slow_only=False)
+        item = next(i for i in items if "FROM answers WHERE id" in i["statement"])
+        assert item["count"] == 3
+        assert item["slow_count"] == 0
+        assert item["plan"] is None
@@ -176,11 +176,11 @@ class TestGenerateRubricByLLM:
         mock_response.content = '{"version": "auto-gen-v1", "dimensions": {"accuracy": 1, "structure": 1, "clarity": 1, "business": 1, "language": 1}, "key_points": ["point1"], "common_mistakes": ["mistake1"]}'
         mock_llm.invoke.return_value = mock_response
         
-        # Mock _make_llm 函数
+        # Mock make_llm 函数
         def mock_make_llm():
             return mock_llm
         
-        monkeypatch.setattr("api.llm_client._make_llm", mock_make_llm)
+        monkeypatch.setattr("api.llm_client.make_llm", mock_make_llm)
         
         result = generate_rubric_by_llm("测试题目", "python")
         
@@ -222,7 +222,7 @@ class TestGenerateRubricByLLM:
         def mock_make_llm():
             return mock_llm
         
-        monkeypatch.setattr("api.llm_client._make_llm", mock_make_llm)
+        monkeypatch.setattr("api.llm_client.make_llm", mock_make_llm)
         
         result = generate_rubric_by_llm("测试题目", "python")
         
@@ -0,0 +1,93 @@
+"""
+测试追踪 span、采样与导出
+"""
+import json
+import pytest
+from sqlalchemy import create_engine, text
+from api import tracing
+from api.tracing import InMemorySpanExporter, FileSpanExporter, start_trace, span, parse_traceparent
+
+
+@pytest.fixture
+def exporter():
+    previous_rate, previous_exporter = tracing.config.sample_rate, tracing.config.exporter
+    memory = InMemorySpanExporter()
+    tracing.configure(sample_rate=1.0, exporter=memory)
+    yield memory
+    tracing.configure(sample_rate=previous_rate, exporter=previous_exporter)
+
+
+class TestSampling:
+    """测试采样控制"""
+    
+    def test_disabled_creates_no_spans(self, exporter):
+        """测试采样率为 0 时不创建 span"""
+        tracing.configure(sample_rate=0.0)
+        with start_trace("request") as root:
+            with span("child") as child:
+                assert root is None and child is None
+        assert exporter.spans == []
+    
+    def test_child_outside_trace_is_noop(self, exporter):
+        """测试没有根 span 时子 span 不记录"""
+        with span("orphan") as orphan:
+            assert orphan is None
+        assert exporter.spans == []
+    
+    def test_incoming_unsampled_parent_respected(self, exporter):
+        """测试上游未采样的 traceparent 不被追踪"""
+        header = "00-" + "a" * 32 + "-" + "b" * 16 + "-00"
+        with start_trace("request", header) as root:
+            assert root is None
+
+
+class TestSpans:
+    """测试 span 层级与导出格式"""
+    
+    def test_parent_child_and_traceparent(self, exporter):
+        """测试延续上游 trace，子 span 指向父 span"""
+        header = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+        with start_trace("request", header) as root:
+            with span("child", answer_length=10):
+                pass
+        child, exported_root = exporter.spans
+        assert exported_root.trace_id == "a" * 32
+        assert exported_root.parent_span_id == "b" * 16
+        assert child.parent_span_id == root.span_id
+        assert child.to_otlp()["attributes"] == {"answer_length": 10}
+    
+    def test_error_status(self, exporter):
+        """测试异常时 span 标记为错误"""
+        with pytest.raises(ValueError):
+            with start_trace("request"):
+                raise ValueError("boom")
+        assert exporter.spans[0].to_otlp()["status"]["code"] == "STATUS_CODE_ERROR"
+    
+    def test_parse_traceparent_rejects_invalid(self):
+        """测试非法 traceparent 被忽略"""
+        assert parse_traceparent("garbage") is None
+        assert parse_traceparent("00-" + "0" * 32 + "-" + "b" * 16 + "-01") is None
+    
+    def test_file_exporter_writes_json_lines(self, tmp_path):
+        """测试文件导出器每行写入一个 span"""
+        path = tmp_path / "traces.jsonl"
+        tracing.configure(sample_rate=1.0, exporter=FileSpanExporter(str(path)))
+        try:
+            with start_trace("request"):
+                pass
+        finally:
+            tracing.configure(sample_rate=0.0)
+        record = json.loads(path.read_text().splitlines()[0])
+        assert record["name"] == "request"
+        assert len(record["traceId"]) == 32
+    
+    def test_engine_queries_traced_without_params(self, exporter):
+        """测试 SQL 语句生成子 span 且不记录参数"""
+        engine = create_engine("sqlite://")
+        tracing.instrument_engine(engine)
+        with start_trace("request"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT :secret"), {"secret": "student answer"})
+        db_span = next(s for s in exporter.spans if s.name == "db.query")
+        assert db_span.attributes["db.operation"] == "SELECT"
+        assert "student answer" not in json.dumps(db_span.to_otlp())
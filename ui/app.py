@@ -157,7 +157,9 @@ if page == "Evaluate Answer":
                     st.stop()  # Stop execution, don't send request
             try:
                 with st.spinner("Evaluating..."):
-                    r = requests.post(f"{API_BASE}/evaluate/short-answer", json=payload, headers=get_headers(), timeout=60)
+                    # Give the API a deadline slightly shorter than our own wait so it stops work we would abandon
+                    headers = {**get_headers(), "X-Request-Timeout": "55"}
+                    r = requests.post(f"{API_BASE}/evaluate/short-answer", json=payload, headers=headers, timeout=60)
                 if r.status_code == 200:
                     result = r.json()
                     st.session_state["last_result"] = result
@@ -212,24 +214,37 @@ elif page == "Evaluation List":
     with col4:
         offset = st.number_input("Offset", min_value=0, value=0)
     
-    if st.button("Search", type="primary"):
-        params = {"limit": limit, "offset": offset}
-        if filter_question_id:
-            params["question_id"] = filter_question_id
-        if filter_student_id:
-            params["student_id"] = filter_student_id
-        
+    def load_evaluation_list(params):
         try:
             with st.spinner("Loading..."):
                 r = requests.get(f"{API_BASE}/evaluations", params=params, headers=get_headers(), timeout=10)
             if r.status_code == 200:
                 data = r.json()
                 st.session_state["evaluation_list"] = data
-                st.success(f"Found {data['total']} records")
-            else:
-                st.error(f"API Error: {r.status_code} {r.text}")
+                st.session_state["evaluation_list_params"] = params
+                return data
+            st.error(f"API Error: {r.status_code} {r.text}")
         except Exception as e:
             st.error(f"Request failed: {e}")
+        return None
+    
+    if st.button("Search", type="primary"):
+        params = {"limit": limit, "offset": offset}
+        if filter_question_id:
+            params["question_id"] = filter_question_id
+        if filter_student_id:
+            params["student_id"] = filter_student_id
+        
+        data = load_evaluation_list(params)
+        if data is not None:
+            st.success(f"Found {data['total']} records")
+    
+    # A saved page review reruns the page; reload the same page so scores and the form come from the API
+    saved_message = st.session_state.pop("batch_review_saved", None)
+    if saved_message:
+        if "evaluation_list_params" in st.session_state:
+            load_evaluation_list(st.session_state["evaluation_list_params"])
+        st.success(saved_message)
     
     # Display list
     if "evaluation_list" in st.session_state:
@@ -251,6 +266,71 @@ elif page == "Evaluation List":
                     if st.button(f"View Details", key=f"detail_{item['id']}"):
                         st.session_state["selected_evaluation_id"] = item['id']
                         st.rerun()
+            
+            # Review the whole page at once (teachers only)
+            if user_role == "teacher":
+                st.markdown("---")
+                st.subheader("Review This Page")
+                st.caption("Only approved evaluations and changed scores or notes are saved, together in one request.")
+                
+                with st.form("batch_review_form"):
+                    entries = []
+                    for item in data["items"]:
+                        st.markdown(f"**Evaluation #{item['id']}** - {item['question_id']} / {item['student_id'] or 'N/A'}")
+                        if item.get('student_answer'):
+                            st.text(item['student_answer'])
+                        reviewed = item['final_score'] is not None
+                        initial_score = float(item['final_score']) if reviewed else float(item['auto_score'] or 0.0)
+                        col1, col2, col3 = st.columns([1, 3, 1])
+                        with col1:
+                            score = st.number_input(
+                                "Final Score",
+                                min_value=0.0,
+                                max_value=10.0,
+                                value=initial_score,
+                                step=0.1,
+                                key=f"batch_score_{item['id']}"
+                            )
+                        with col2:
+                            notes = st.text_input("Review Notes", value=item.get('review_notes') or "",
+                                                  key=f"batch_notes_{item['id']}")
+                        with col3:
+                            approved = False if reviewed else st.checkbox("Approve", key=f"batch_approve_{item['id']}")
+                        changed = score != initial_score or (notes or None) != item.get('review_notes')
+                        entries.append((item, score, notes, approved or changed))
+                    
+                    submitted = st.form_submit_button("Save Page Reviews", type="primary")
+                
+                if submitted:
+                    payload_items = [
+                        {"evaluation_id": item['id'], "final_score": score, "review_notes": notes or None}
+                        for item, score, notes, selected in entries
+                        if selected
+                    ]
+                    if not payload_items:
+                        st.info("Nothing to save")
+                    else:
+                        try:
+                            with st.spinner("Saving..."):
+                                r = requests.post(f"{API_BASE}/review/save-batch", json={"items": payload_items},
+                                                  headers=get_headers(), timeout=30)
+                            if r.status_code == 200:
+                                result = r.json()
+                                message = f"Saved {result['saved']} of {result['total']} reviews"
+                                if not result["failed"]:
+                                    st.session_state["batch_review_saved"] = message
+                                else:
+                                    # Keep the failures on screen; the teacher can search again to reload
+                                    st.success(message)
+                                    for row in result["items"]:
+                                        if row["status"] != "saved":
+                                            st.warning(f"Evaluation #{row['evaluation_id']}: {row['error']}")
+                            else:
+                                st.error(f"Save failed: {r.status_code} {r.text}")
+                        except Exception as e:
+                            st.error(f"Request failed: {e}")
+                        if "batch_review_saved" in st.session_state:
+                            st.rerun()
         else:
             st.info("No evaluation results found")
 